@@ -3,20 +3,80 @@ Sistema de Gestão de Dízimos e Ofertas
 Arquitetura Modular com Separação de Responsabilidades
 Otimizado para Desktop e Mobile
 """
+import json
+
 import streamlit as st
-from streamlit_option_menu import option_menu
 
 # Importações dos módulos personalizados
-from config import PAGE_TITLE, PAGE_ICON, LAYOUT
-from database import init_db
-from auth import verificar_login, pode_editar, pode_administrar
+# As páginas (e o menu lateral) são importadas apenas quando exibidas: a
+# tela de login não paga o custo de pandas, PIL e twilio
+from config import PAGE_TITLE, PAGE_ICON, LAYOUT, LOGIN_ORIGEM_IP, SESSAO_DURACAO_SEGUNDOS
+from database import garantir_banco_inicializado
+from outbox_worker import iniciar_trabalhador_outbox
+from auth import (
+    verificar_login, pode_editar, pode_administrar,
+    gerar_token_sessao, validar_token_sessao, LoginBloqueadoError
+)
 from utils import display_logo, exibir_usuario_info
-from modules.visualizar import exibir_pagina_visualizar
-from modules.registrar import exibir_pagina_registrar
-from modules.editar import exibir_pagina_editar
 from mobile_config import aplicar_css_mobile
 
 
+# Cookie com o token de sessão (fora da URL: não vai para o histórico, logs nem Referer)
+COOKIE_SESSAO = "sessao"
+
+
+def iniciar_sessao(usuario_info: dict, token: str):
+    """Guarda o usuário autenticado e o token de sessão na sessão do Streamlit"""
+    st.session_state["usuario"] = usuario_info["usuario"]
+    st.session_state["nome"] = usuario_info["nome"]
+    st.session_state["nivel"] = usuario_info["nivel"]
+    st.session_state["token_sessao"] = token
+
+
+def gravar_cookie_sessao(token: str = "", duracao: int = 0):
+    """
+    Grava (ou, sem token, apaga) o cookie de sessão no navegador
+
+    O Streamlit só lê cookies (st.context.cookies); a gravação é feita por
+    um script na página, com SameSite=Strict e Secure sob HTTPS.
+    """
+    valor = json.dumps(f"{COOKIE_SESSAO}={token}; Max-Age={duracao}; Path=/; SameSite=Strict")
+    st.html(
+        f"<script>document.cookie = {valor} + (location.protocol === 'https:' ? '; Secure' : '');</script>",
+        unsafe_allow_javascript=True
+    )
+
+
+def ip_do_cliente():
+    """
+    IP usado no limite de tentativas por IP, conforme LOGIN_ORIGEM_IP
+
+    Retorna None (limite por IP desligado) com LOGIN_ORIGEM_IP = "nenhum" ou
+    se o IP não estiver disponível.
+    """
+    if LOGIN_ORIGEM_IP == "conexao":
+        return st.context.ip_address
+    if LOGIN_ORIGEM_IP == "x-forwarded-for":
+        # O proxy confiável acrescenta o IP que o contactou ao final da lista
+        encaminhado = st.context.headers.get("X-Forwarded-For") or ""
+        return encaminhado.split(",")[-1].strip() or None
+    return None
+
+
+def restaurar_sessao():
+    """Autentica pela assinatura do token do cookie (após recarregar a página), sem bcrypt"""
+    token = st.context.cookies.get(COOKIE_SESSAO)
+    if not token:
+        return
+    
+    usuario_info = validar_token_sessao(token)
+    if usuario_info:
+        iniciar_sessao(usuario_info, token)
+    else:
+        # Expirado, adulterado, revogado por "Sair" ou emitido antes de uma troca de senha
+        st.session_state["apagar_cookie_sessao"] = True
+
+
 def exibir_tela_login():
     """Exibe a tela de login - otimizado para mobile"""
     # Centralizar conteúdo em mobile
@@ -50,25 +110,19 @@ USER_DIACONO02_HASH = "$2b$12$7rxfZGjQqq9cOnpaiRvRnu9vLhNKmKVAFh2zwEvfC9fdaaqmEf
             usuario = st.text_input("Usuário", placeholder="Digite seu usuário")
             senha = st.text_input("Senha", type="password", placeholder="Digite sua senha")
             
-            st.markdown("""
-            <style>
-            .stFormSubmitButton button {
-                width: 100%;
-                background-color: #4CAF50;
-                color: white;
-                font-weight: bold;
-            }
-            </style>
-            """, unsafe_allow_html=True)
-            
             submitted = st.form_submit_button("🔐 Entrar", type="primary")
             
             if submitted:
-                usuario_info = verificar_login(usuario, senha)
+                try:
+                    usuario_info = verificar_login(usuario, senha, ip_do_cliente())
+                except LoginBloqueadoError as e:
+                    st.error(f"⛔ {e}")
+                    return
+                
                 if usuario_info:
-                    st.session_state["usuario"] = usuario_info["usuario"]
-                    st.session_state["nome"] = usuario_info["nome"]
-                    st.session_state["nivel"] = usuario_info["nivel"]
+                    iniciar_sessao(usuario_info, gerar_token_sessao(usuario_info["usuario"]))
+                    # Cookie gravado no próximo rerun (a página principal): recarregar não pede a senha
+                    st.session_state["gravar_cookie_sessao"] = True
                     st.success(f"✅ Bem-vindo, {usuario_info['nome']}!")
                     st.rerun()
                 else:
@@ -88,6 +142,8 @@ def configurar_menu():
         opcoes_menu.append("Editar")
         icons.append("pencil-square")
     
+    from streamlit_option_menu import option_menu
+    
     with st.sidebar:
         display_logo()
         escolha = option_menu(
@@ -103,6 +159,10 @@ def configurar_menu():
 
 def exibir_pagina_principal():
     """Exibe a página principal após o login"""
+    # Script do cookie fora do rerun do login: um st.rerun logo após o st.html poderia descartá-lo
+    if st.session_state.pop("gravar_cookie_sessao", False):
+        gravar_cookie_sessao(st.session_state["token_sessao"], SESSAO_DURACAO_SEGUNDOS)
+    
     # Exibir informações do usuário no topo
     exibir_usuario_info()
     
@@ -111,12 +171,15 @@ def exibir_pagina_principal():
     
     # Renderizar página selecionada
     if escolha == "Visualizar":
+        from modules.visualizar import exibir_pagina_visualizar
         exibir_pagina_visualizar()
     
     elif escolha == "Registrar" and pode_editar(st.session_state["nivel"]):
+        from modules.registrar import exibir_pagina_registrar
         exibir_pagina_registrar()
     
     elif escolha == "Editar" and pode_administrar(st.session_state["nivel"]):
+        from modules.editar import exibir_pagina_editar
         exibir_pagina_editar()
 
 
@@ -133,11 +196,20 @@ def main():
     # Aplicar CSS responsivo para mobile
     aplicar_css_mobile()
     
-    # Inicializar banco de dados
-    init_db()
+    # Inicializar banco de dados (DDL e migrações apenas na primeira execução do processo)
+    garantir_banco_inicializado()
+    
+    # Thread que envia as confirmações de WhatsApp enfileiradas (uma por processo)
+    iniciar_trabalhador_outbox()
     
     # Verificar estado de autenticação
     if "usuario" not in st.session_state:
+        restaurar_sessao()
+    
+    if "usuario" not in st.session_state:
+        # Após "Sair" ou com um token recusado: apaga o cookie do navegador
+        if st.session_state.pop("apagar_cookie_sessao", False):
+            gravar_cookie_sessao()
         exibir_tela_login()
     else:
         exibir_pagina_principal()
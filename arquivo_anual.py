@@ -0,0 +1,387 @@
+"""
+Arquivo Anual em Parquet
+Move os anos encerrados de lancamentos para arquivos Parquet compactados
+
+Anos encerrados não mudam, mas continuam na tabela lancamentos e pesam em
+toda varredura (obter_lancamentos, exportação, índices, backup e VACUUM).
+arquivar_ano grava as linhas de um ano em lancamentos_<ano>.parquet (zstd,
+na ordem de obter_lancamentos, em grupos de ARQUIVO_LINHAS_POR_GRUPO linhas),
+soma os totais do ano por mês em resumo_arquivado e registra o arquivo no
+manifesto (tabela anos_arquivados) na mesma transação que remove as linhas do
+SQLite. Uma cópia do manifesto fica em manifesto.json, junto dos arquivos.
+
+Leitura dos anos arquivados:
+- database.obter_totais soma resumo_arquivado junto com resumo_diario.
+- database.iterar_lancamentos (e, por ele, a exportação em CSV e o
+  AgregadorTotais) inclui os anos arquivados que cruzam o período pedido:
+  só os arquivos desses anos são abertos e, dentro deles, só os grupos de
+  linhas cujas estatísticas (data mínima e máxima) cruzam o período.
+
+- database.obter_lancamentos, obter_lancamentos_pagina (lista de
+  lançamentos), pesquisar_lancamentos (edição) e buscar_lancamentos (busca
+  de texto, sem o índice FTS5: as palavras são procuradas nas colunas)
+  também intercalam as linhas arquivadas.
+
+Um ano arquivado não aceita novos lançamentos nem edições (todas as gravações
+de database o recusam). pyarrow é importado apenas quando um arquivo é gravado
+ou lido.
+
+Uso:
+    python manutencao_banco.py arquivar 2023
+    python manutencao_banco.py arquivos
+"""
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from datetime import date
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import database
+from config import ARQUIVO_ANUAL_DIRETORIO, ARQUIVO_LINHAS_POR_GRUPO
+from migrations import GATILHOS_RESUMO_DIARIO
+
+# Colunas gravadas: as de obter_lancamentos (admin) e a data de criação
+COLUNAS_ARQUIVO = database.NOMES_COLUNAS_ADMIN + ("created_at",)
+
+_GATILHO_EXCLUSAO = "trg_lancamentos_resumo_delete"
+
+# Linhas antigas sem valor_centavos usam o valor REAL arredondado (como o resumo)
+_CENTAVOS = "COALESCE(valor_centavos, CAST(ROUND(valor * 100) AS INTEGER))"
+
+
+def diretorio_arquivo() -> str:
+    """Pasta dos arquivos Parquet, ao lado do banco de dados em uso"""
+    return os.path.join(os.path.dirname(os.path.abspath(database.DATABASE_NAME)), ARQUIVO_ANUAL_DIRETORIO)
+
+
+def _esquema():
+    """Esquema Arrow dos arquivos (ids e centavos inteiros, demais colunas texto)"""
+    import pyarrow as pa
+
+    inteiros = {"id", "valor_centavos"}
+    return pa.schema([(coluna, pa.int64() if coluna in inteiros else pa.string()) for coluna in COLUNAS_ARQUIVO])
+
+
+def _sha256(caminho: str) -> str:
+    """Hash SHA-256 do arquivo, lido em blocos"""
+    resumo = hashlib.sha256()
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b""):
+            resumo.update(bloco)
+    return resumo.hexdigest()
+
+
+def arquivar_ano(ano: int, tamanho_grupo: int = ARQUIVO_LINHAS_POR_GRUPO) -> dict:
+    """
+    Move os lançamentos de um ano encerrado para um arquivo Parquet
+
+    O banco fica bloqueado para escrita (BEGIN IMMEDIATE) do início ao fim: as
+    linhas gravadas no arquivo são exatamente as removidas. O arquivo é
+    conferido (quantidade de linhas e soma dos valores) antes de qualquer
+    exclusão; se algo falhar, a transação é desfeita e o arquivo, apagado.
+    As linhas saem de lancamentos com o gatilho de exclusão do resumo
+    desligado: o resumo do ano é removido de uma vez e passa para
+    resumo_arquivado.
+
+    Args:
+        ano: Ano encerrado (anterior ao ano atual)
+        tamanho_grupo: Linhas por grupo do Parquet
+
+    Returns:
+        Dicionário com ano, arquivo, linhas, total (centavos) e bytes
+
+    Raises:
+        ValueError: Ano não encerrado, já arquivado, particionado, sem lançamentos ou
+            com um arquivo de mesmo nome fora do manifesto
+    """
+    if ano >= date.today().year:
+        raise ValueError(f"{ano} não está encerrado: apenas anos anteriores a {date.today().year} podem ser arquivados")
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    inicio, fim = f"{ano}-01-01", f"{ano}-12-31"
+    nome_arquivo = f"lancamentos_{ano}.parquet"
+    diretorio = diretorio_arquivo()
+    destino = os.path.join(diretorio, nome_arquivo)
+    temporario = f"{destino}.tmp"
+    esquema = _esquema()
+    os.makedirs(diretorio, exist_ok=True)
+
+    colunas = ", ".join(_CENTAVOS if coluna == "valor_centavos" else coluna for coluna in COLUNAS_ARQUIVO)
+
+    renomeado = False
+    with database.get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM anos_arquivados WHERE ano = ?", (ano,)).fetchone():
+                raise ValueError(f"{ano} já está arquivado em {nome_arquivo}")
+            if conn.execute("SELECT 1 FROM particoes WHERE ano = ?", (ano,)).fetchone():
+                raise ValueError(f"{ano} está em uma partição anual (database.particionar_ano)")
+            if os.path.exists(destino):
+                # Sobra de uma execução interrompida entre a gravação e o commit: nunca é sobrescrita
+                raise ValueError(f"{destino} já existe sem registro no manifesto; confira e remova o arquivo")
+
+            linhas, total, data_inicio, data_fim = conn.execute(f'''
+                SELECT COUNT(*), COALESCE(SUM({_CENTAVOS}), 0), MIN(data), MAX(data)
+                FROM lancamentos
+                WHERE data BETWEEN ? AND ?
+            ''', (inicio, fim)).fetchone()
+            if not linhas:
+                raise ValueError(f"Nenhum lançamento em {ano} para arquivar")
+
+            cursor = conn.execute(f'''
+                SELECT {colunas}
+                FROM lancamentos
+                WHERE data BETWEEN ? AND ?
+                ORDER BY data DESC, id DESC
+            ''', (inicio, fim))
+
+            with pq.ParquetWriter(temporario, esquema, compression="zstd") as escritor:
+                while True:
+                    lote = cursor.fetchmany(tamanho_grupo)
+                    if not lote:
+                        break
+                    arrays = [pa.array(valores, type=campo.type) for valores, campo in zip(zip(*lote), esquema)]
+                    escritor.write_table(pa.Table.from_arrays(arrays, schema=esquema), row_group_size=tamanho_grupo)
+
+            # Confere o arquivo antes de remover qualquer linha
+            gravados = pq.read_table(temporario, columns=["valor_centavos"])["valor_centavos"]
+            if len(gravados) != linhas or (pc.sum(gravados).as_py() or 0) != total:
+                raise ValueError(f"{nome_arquivo} não confere com os lançamentos de {ano}")
+
+            tamanho = os.path.getsize(temporario)
+            conn.execute(f'''
+                INSERT INTO resumo_arquivado (mes, categoria, tipo, usuario, total, quantidade)
+                SELECT substr(data, 1, 7), categoria, tipo, usuario, SUM({_CENTAVOS}), COUNT(*)
+                FROM lancamentos
+                WHERE data BETWEEN ? AND ?
+                GROUP BY substr(data, 1, 7), categoria, tipo, usuario
+            ''', (inicio, fim))
+            conn.execute('''
+                INSERT INTO anos_arquivados (ano, arquivo, linhas, total, data_inicio, data_fim, bytes, sha256)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (ano, nome_arquivo, linhas, total, data_inicio, data_fim, tamanho, _sha256(temporario)))
+
+            conn.execute(f"DROP TRIGGER IF EXISTS {_GATILHO_EXCLUSAO}")
+            conn.execute("DELETE FROM lancamentos WHERE data BETWEEN ? AND ?", (inicio, fim))
+            conn.execute("DELETE FROM resumo_diario WHERE data BETWEEN ? AND ?", (inicio, fim))
+            conn.execute(GATILHOS_RESUMO_DIARIO[_GATILHO_EXCLUSAO])
+
+            # Nome final antes do commit: todo ano registrado no manifesto tem o seu arquivo
+            os.replace(temporario, destino)
+            renomeado = True
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            if renomeado:
+                os.remove(destino)  # Commit falhou: o arquivo criado aqui não tem registro no manifesto
+            raise
+
+    database.invalidar_cache()
+    escrever_manifesto()
+    return {"ano": ano, "arquivo": destino, "linhas": linhas, "total": total, "bytes": tamanho}
+
+
+def listar_anos_arquivados() -> List[Tuple]:
+    """
+    Lê o manifesto dos anos arquivados
+
+    Returns:
+        Lista de (ano, arquivo, linhas, total, data_inicio, data_fim, bytes,
+        sha256, arquivado_em), do ano mais recente ao mais antigo
+    """
+    with database.get_db_connection() as conn:
+        return conn.execute('''
+            SELECT ano, arquivo, linhas, total, data_inicio, data_fim, bytes, sha256, arquivado_em
+            FROM anos_arquivados
+            ORDER BY ano DESC
+        ''').fetchall()
+
+
+def escrever_manifesto() -> str:
+    """
+    Grava manifesto.json (cópia do manifesto com os totais de cada ano por categoria)
+
+    Returns:
+        Caminho do arquivo gravado
+    """
+    with database.get_db_connection() as conn:
+        por_categoria = conn.execute('''
+            SELECT substr(mes, 1, 4), categoria, SUM(total), SUM(quantidade)
+            FROM resumo_arquivado
+            GROUP BY substr(mes, 1, 4), categoria
+        ''').fetchall()
+
+    anos = []
+    for ano, arquivo, linhas, total, data_inicio, data_fim, tamanho, sha256, arquivado_em in listar_anos_arquivados():
+        anos.append({
+            "ano": ano, "arquivo": arquivo, "linhas": linhas, "total_centavos": total,
+            "data_inicio": data_inicio, "data_fim": data_fim, "bytes": tamanho, "sha256": sha256,
+            "arquivado_em": arquivado_em,
+            "por_categoria": {
+                categoria: {"total_centavos": soma, "quantidade": quantidade}
+                for ano_resumo, categoria, soma, quantidade in por_categoria if ano_resumo == str(ano)
+            },
+        })
+
+    caminho = os.path.join(diretorio_arquivo(), "manifesto.json")
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(f"{caminho}.tmp", "w", encoding="utf-8") as arquivo:
+        json.dump({"anos": anos}, arquivo, ensure_ascii=False, indent=2)
+    os.replace(f"{caminho}.tmp", caminho)
+    return caminho
+
+
+def verificar_arquivos() -> List[Tuple[int, str]]:
+    """
+    Confere cada arquivo do manifesto (existência, tamanho e SHA-256)
+
+    Returns:
+        Lista de (ano, problema); vazia quando todos conferem
+    """
+    problemas = []
+    for ano, arquivo, _, _, _, _, tamanho, sha256, _ in listar_anos_arquivados():
+        caminho = os.path.join(diretorio_arquivo(), arquivo)
+        if not os.path.exists(caminho):
+            problemas.append((ano, f"{arquivo} não encontrado"))
+        elif os.path.getsize(caminho) != tamanho or _sha256(caminho) != sha256:
+            problemas.append((ano, f"{arquivo} foi alterado depois de arquivado"))
+    return problemas
+
+
+def grupos_no_periodo(arquivo, data_inicio: Optional[str], data_fim: Optional[str]) -> List[int]:
+    """
+    Grupos de linhas do Parquet que podem ter datas no período
+
+    Usa as estatísticas (mínimo e máximo) da coluna data gravadas em cada
+    grupo: os demais nem são lidos do disco.
+
+    Args:
+        arquivo: pyarrow.parquet.ParquetFile aberto
+        data_inicio: Data inicial no formato YYYY-MM-DD (inclusive)
+        data_fim: Data final no formato YYYY-MM-DD (inclusive)
+    """
+    metadados = arquivo.metadata
+    indice_data = arquivo.schema_arrow.get_field_index("data")
+    grupos = []
+
+    for grupo in range(metadados.num_row_groups):
+        estatisticas = metadados.row_group(grupo).column(indice_data).statistics
+        if estatisticas is not None and estatisticas.has_min_max:
+            if data_inicio and estatisticas.max < data_inicio:
+                continue
+            if data_fim and estatisticas.min > data_fim:
+                continue
+        grupos.append(grupo)
+
+    return grupos
+
+
+def _sem_acentos(texto: str) -> str:
+    """Minúsculas sem acentos, como o tokenizador do índice FTS5 (unicode61 remove_diacritics)"""
+    decomposto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(caractere for caractere in decomposto if not unicodedata.combining(caractere))
+
+
+def _condicao_palavras(tabela, palavras: Sequence[str]):
+    """
+    Máscara das linhas em que cada palavra é início de uma palavra de nome, email ou celular
+
+    Mesmo resultado da consulta FTS5 de database.buscar_lancamentos ("joa"*
+    para cada palavra, todas obrigatórias), sem índice: as colunas são
+    normalizadas e comparadas por expressão regular.
+    """
+    import pyarrow.compute as pc
+
+    colunas = [pc.replace_substring_regex(pc.utf8_normalize(pc.utf8_lower(tabela[coluna]), "NFKD"), r"\p{Mn}", "")
+               for coluna in ("nome", "email", "celular")]
+    mascara = None
+    for palavra in palavras:
+        padrao = r"(^|[^\p{L}\p{N}])" + re.escape(_sem_acentos(palavra))
+        encontrada = None
+        for coluna in colunas:
+            achou = pc.match_substring_regex(coluna, padrao)
+            # Coluna vazia (NULL) não impede a palavra de estar em outra
+            encontrada = achou if encontrada is None else pc.or_kleene(encontrada, achou)
+        mascara = encontrada if mascara is None else pc.and_(mascara, encontrada)
+    return mascara
+
+
+def iterar_arquivados(arquivos: Sequence[str], colunas: Sequence[str], usuario: Optional[str] = None,
+                      data_inicio: Optional[str] = None, data_fim: Optional[str] = None,
+                      categorias: Optional[Sequence[str]] = None, tamanho_lote: int = 1000,
+                      nome: Optional[str] = None, valor_centavos: Optional[int] = None,
+                      id_lancamento: Optional[int] = None, palavras: Sequence[str] = ()) -> Iterator[Tuple]:
+    """
+    Percorre os lançamentos arquivados que atendem aos filtros
+
+    Os arquivos são lidos na ordem recebida e cada um já está na ordem de
+    obter_lancamentos (data e id decrescentes). Apenas os grupos de linhas do
+    período são lidos (grupos_no_periodo); os demais filtros são aplicados
+    sobre as colunas, antes de criar as tuplas.
+
+    Args:
+        arquivos: Nomes dos arquivos (manifesto), do ano mais recente ao mais antigo
+        colunas: Colunas de cada tupla, na ordem
+        usuario: Apenas os lançamentos deste usuário (padrão: todos)
+        data_inicio: Data inicial no formato YYYY-MM-DD (inclusive)
+        data_fim: Data final no formato YYYY-MM-DD (inclusive)
+        categorias: Apenas estas categorias (padrão: todas)
+        tamanho_lote: Tuplas criadas por vez
+        nome: Início do nome, sem diferenciar maiúsculas ASCII (como o LIKE
+            de database.pesquisar_lancamentos)
+        valor_centavos: Valor exato em centavos
+        id_lancamento: ID exato do lançamento
+        palavras: Palavras da busca de texto (_condicao_palavras)
+
+    Yields:
+        Tuplas com os dados dos lançamentos
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    lidas = list(dict.fromkeys([*colunas, "id", "data", "usuario", "categoria", "nome", "valor_centavos",
+                                *(("email", "celular") if palavras else ())]))
+
+    for nome_arquivo in arquivos:
+        arquivo = pq.ParquetFile(os.path.join(diretorio_arquivo(), nome_arquivo), memory_map=True)
+
+        for grupo in grupos_no_periodo(arquivo, data_inicio, data_fim):
+            tabela = arquivo.read_row_group(grupo, columns=lidas)
+
+            condicoes = []
+            if data_inicio:
+                condicoes.append(pc.greater_equal(tabela["data"], data_inicio))
+            if data_fim:
+                condicoes.append(pc.less_equal(tabela["data"], data_fim))
+            if usuario:
+                condicoes.append(pc.equal(tabela["usuario"], usuario))
+            if categorias:
+                condicoes.append(pc.is_in(tabela["categoria"], value_set=pa.array(list(categorias), pa.string())))
+            if nome:
+                prefixo = pc.ascii_lower(pa.scalar(nome, pa.string())).as_py()
+                condicoes.append(pc.starts_with(pc.ascii_lower(tabela["nome"]), prefixo))
+            if valor_centavos is not None:
+                condicoes.append(pc.equal(tabela["valor_centavos"], valor_centavos))
+            if id_lancamento is not None:
+                condicoes.append(pc.equal(tabela["id"], id_lancamento))
+            if palavras:
+                condicoes.append(_condicao_palavras(tabela, palavras))
+
+            if condicoes:
+                mascara = condicoes[0]
+                for condicao in condicoes[1:]:
+                    mascara = pc.and_(mascara, condicao)
+                tabela = tabela.filter(mascara)
+
+            tabela = tabela.select(list(colunas))
+            for inicio in range(0, tabela.num_rows, tamanho_lote):
+                fatia = tabela.slice(inicio, tamanho_lote)
+                yield from zip(*(coluna.to_pylist() for coluna in fatia.columns))
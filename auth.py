@@ -2,9 +2,100 @@
 Módulo de Autenticação e Autorização
 Sistema Seguro com Hash de Senhas usando Bcrypt
 """
+import base64
+import hashlib
+import hmac
+import math
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturoTimeoutError
 from typing import Optional, Dict
+
 import bcrypt
-from config import USUARIOS_HASHES, NIVEIS_ACESSO, NOMES_USUARIOS
+from config import (
+    USUARIOS_HASHES, NIVEIS_ACESSO, NOMES_USUARIOS,
+    LOGIN_THREADS, LOGIN_FILA_MAXIMA, LOGIN_TIMEOUT_SEGUNDOS,
+    LOGIN_TENTATIVAS_USUARIO, LOGIN_TENTATIVAS_IP, LOGIN_JANELA_SEGUNDOS,
+    SESSAO_SEGREDO, SESSAO_DURACAO_SEGUNDOS
+)
+from database import sessao_revogada, revogar_sessao
+
+
+class LoginBloqueadoError(Exception):
+    """Tentativa de login recusada sem verificar a senha (excesso de falhas ou servidor ocupado)"""
+
+
+class LimitadorTentativas:
+    """
+    Conta as falhas de login por chave (usuário ou IP) em uma janela deslizante
+
+    Ao atingir o limite, a chave fica bloqueada até a falha mais antiga sair
+    da janela. Um login bem-sucedido limpa as falhas da chave.
+    """
+
+    def __init__(self, limite: int, janela: float = LOGIN_JANELA_SEGUNDOS):
+        self.limite = limite
+        self.janela = janela
+        self._falhas: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def _descartar_antigas(self, chave: str, agora: float) -> Optional[deque]:
+        falhas = self._falhas.get(chave)
+        if falhas is None:
+            return None
+        while falhas and falhas[0] <= agora - self.janela:
+            falhas.popleft()
+        if not falhas:
+            del self._falhas[chave]
+            return None
+        return falhas
+
+    def segundos_bloqueado(self, chave: str) -> float:
+        """Segundos até a chave poder tentar de novo (0 se não estiver bloqueada)"""
+        agora = time.monotonic()
+        with self._lock:
+            falhas = self._descartar_antigas(chave, agora)
+            if falhas is None or len(falhas) < self.limite:
+                return 0.0
+            return falhas[-self.limite] + self.janela - agora
+
+    def registrar_falha(self, chave: str):
+        """Conta uma tentativa com senha errada"""
+        agora = time.monotonic()
+        with self._lock:
+            falhas = self._descartar_antigas(chave, agora)
+            if falhas is None:
+                falhas = self._falhas[chave] = deque()
+            falhas.append(agora)
+            # Mantém só o necessário para decidir o bloqueio
+            while len(falhas) > self.limite:
+                falhas.popleft()
+
+    def limpar(self, chave: str):
+        """Esquece as falhas da chave (após login bem-sucedido)"""
+        with self._lock:
+            self._falhas.pop(chave, None)
+
+
+# Limites compartilhados entre as sessões do processo
+limitador_usuarios = LimitadorTentativas(LOGIN_TENTATIVAS_USUARIO)
+limitador_ips = LimitadorTentativas(LOGIN_TENTATIVAS_IP)
+
+# bcrypt libera o GIL: as verificações rodam em paralelo fora da thread do script,
+# limitadas a LOGIN_THREADS núcleos mesmo com muitos logins ao mesmo tempo
+_pool_bcrypt = ThreadPoolExecutor(max_workers=LOGIN_THREADS, thread_name_prefix="bcrypt")
+_vagas_bcrypt = threading.BoundedSemaphore(LOGIN_THREADS + LOGIN_FILA_MAXIMA)
+
+# Sem segredo configurado, os tokens valem só neste processo (até reiniciar; outro worker recusa)
+_segredo_sessao = (SESSAO_SEGREDO or "").encode('utf-8')
+if not _segredo_sessao:
+    print("⚠️ SESSION_SECRET não configurado: usando um segredo aleatório. As sessões "
+          "deixam de valer a cada reinício do servidor e não valem entre processos.", file=sys.stderr)
+    _segredo_sessao = os.urandom(32)
 
 
 def verificar_senha_hash(senha: str, hash_armazenado: str) -> bool:
@@ -30,19 +121,61 @@ def verificar_senha_hash(senha: str, hash_armazenado: str) -> bool:
         return False
 
 
-def verificar_login(usuario: str, senha: str) -> Optional[Dict[str, str]]:
+def _verificar_senha_no_pool(senha: str, hash_armazenado: str) -> bool:
+    """
+    Executa verificar_senha_hash em uma thread do pool de bcrypt
+
+    Raises:
+        LoginBloqueadoError: Fila de verificações cheia ou resultado demorou demais
+    """
+    if not _vagas_bcrypt.acquire(blocking=False):
+        raise LoginBloqueadoError("Muitos acessos ao mesmo tempo. Aguarde alguns segundos e tente novamente.")
+
+    try:
+        futuro = _pool_bcrypt.submit(verificar_senha_hash, senha, hash_armazenado)
+    except Exception:
+        _vagas_bcrypt.release()
+        raise
+    futuro.add_done_callback(lambda _: _vagas_bcrypt.release())
+
+    try:
+        return futuro.result(timeout=LOGIN_TIMEOUT_SEGUNDOS)
+    except FuturoTimeoutError:
+        raise LoginBloqueadoError("O servidor está ocupado. Tente novamente em instantes.")
+
+
+def verificar_login(usuario: str, senha: str, ip: Optional[str] = None) -> Optional[Dict[str, str]]:
     """
     Verifica as credenciais do usuário usando hash bcrypt
     
+    O hash é verificado no pool de bcrypt. Usuários e IPs com falhas demais
+    na janela LOGIN_JANELA_SEGUNDOS são recusados antes do hash.
+    
     Args:
         usuario: Nome de usuário
         senha: Senha do usuário em texto plano
+        ip: Endereço IP do cliente (para o limite por IP); None desliga o
+            limite por IP nesta tentativa (IP desconhecido ou proxy não configurado)
     
     Returns:
         Dict com informações do usuário se válido, None caso contrário
+    
+    Raises:
+        LoginBloqueadoError: Tentativas em excesso ou servidor ocupado
     """
+    # Sem IP, uma chave comum ("desconhecido") deixaria qualquer cliente bloquear todos os outros
+    espera = limitador_usuarios.segundos_bloqueado(usuario)
+    if ip:
+        espera = max(espera, limitador_ips.segundos_bloqueado(ip))
+    if espera > 0:
+        raise LoginBloqueadoError(
+            f"Muitas tentativas de login sem sucesso. Tente novamente em {math.ceil(espera / 60)} minuto(s)."
+        )
+
     # Verifica se o usuário existe
     if usuario not in USUARIOS_HASHES:
+        if ip:
+            limitador_ips.registrar_falha(ip)
         return None
     
     # Obtém o hash armazenado
@@ -54,16 +187,112 @@ def verificar_login(usuario: str, senha: str) -> Optional[Dict[str, str]]:
         return None
     
     # Verifica a senha
-    if verificar_senha_hash(senha, hash_armazenado):
-        return {
-            "usuario": usuario,
-            "nome": NOMES_USUARIOS.get(usuario, usuario),
-            "nivel": NIVEIS_ACESSO.get(usuario, "visualizador")
-        }
+    if _verificar_senha_no_pool(senha, hash_armazenado):
+        limitador_usuarios.limpar(usuario)
+        return _informacoes_usuario(usuario)
     
+    limitador_usuarios.registrar_falha(usuario)
+    if ip:
+        limitador_ips.registrar_falha(ip)
     return None
 
 
+def _informacoes_usuario(usuario: str) -> Dict[str, str]:
+    """Dados do usuário guardados na sessão"""
+    return {
+        "usuario": usuario,
+        "nome": NOMES_USUARIOS.get(usuario, usuario),
+        "nivel": NIVEIS_ACESSO.get(usuario, "visualizador")
+    }
+
+
+# ============================================
+# TOKEN DE SESSÃO
+# ============================================
+
+def _assinar(usuario: str, jti: str, expira_em: int) -> str:
+    """
+    Assinatura HMAC-SHA256 de usuário + identificador do token + validade
+
+    O hash da senha entra na chave: trocar a senha invalida os tokens emitidos.
+    """
+    chave = _segredo_sessao + (USUARIOS_HASHES.get(usuario) or "").encode('utf-8')
+    mensagem = f"{usuario}.{jti}.{expira_em}".encode('utf-8')
+    assinatura = hmac.new(chave, mensagem, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(assinatura).rstrip(b"=").decode('ascii')
+
+
+def gerar_token_sessao(usuario: str) -> str:
+    """
+    Emite o token de sessão após um login bem-sucedido
+    
+    Formato: usuario.jti.expira_em.assinatura, com jti aleatório (válido
+    por SESSAO_DURACAO_SEGUNDOS ou até encerrar_sessao com este token)
+    """
+    jti = secrets.token_urlsafe(12)
+    expira_em = int(time.time()) + SESSAO_DURACAO_SEGUNDOS
+    return f"{usuario}.{jti}.{expira_em}.{_assinar(usuario, jti, expira_em)}"
+
+
+def _ler_token_sessao(token: Optional[str]) -> Optional[tuple]:
+    """
+    Confere formato, validade e assinatura do token (sem consultar o banco)
+
+    Returns:
+        (usuario, jti, expira_em) ou None se o token não vale
+    """
+    try:
+        usuario, jti, expira_em, assinatura = token.rsplit(".", 3)
+        expira_em = int(expira_em)
+    except (AttributeError, ValueError):
+        return None
+
+    if expira_em < time.time() or not USUARIOS_HASHES.get(usuario):
+        return None
+
+    # Em bytes: compare_digest recusa (TypeError) str com caracteres não ASCII vindos do cookie
+    if not hmac.compare_digest(assinatura.encode('utf-8'), _assinar(usuario, jti, expira_em).encode('ascii')):
+        return None
+
+    return usuario, jti, expira_em
+
+
+def validar_token_sessao(token: Optional[str]) -> Optional[Dict[str, str]]:
+    """
+    Valida o token de sessão sem recalcular o bcrypt
+    
+    Args:
+        token: Token emitido por gerar_token_sessao
+    
+    Returns:
+        Dict com informações do usuário se o token for válido, None caso contrário
+    """
+    lido = _ler_token_sessao(token)
+    if lido is None:
+        return None
+
+    # Revogado por "Sair" depois da emissão (None: erro ao consultar, recusa)
+    usuario, jti, _ = lido
+    if sessao_revogada(jti) is not False:
+        return None
+
+    return _informacoes_usuario(usuario)
+
+
+def encerrar_sessao(token: Optional[str]) -> bool:
+    """
+    Revoga o token de sessão deste aparelho (botão "Sair")
+
+    Os outros aparelhos conectados com o mesmo usuário continuam válidos.
+    Sem a revogação, uma cópia do cookie valeria até o token expirar.
+    """
+    lido = _ler_token_sessao(token)
+    if lido is None:
+        return True  # Token inválido ou expirado: nada a revogar
+    _, jti, expira_em = lido
+    return revogar_sessao(jti, expira_em)
+
+
 def tem_permissao(nivel_acesso: str, permissao_requerida: str) -> bool:
     """
     Verifica se o nível de acesso tem a permissão necessária
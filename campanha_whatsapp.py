@@ -0,0 +1,286 @@
+"""
+Campanhas de WhatsApp em Massa
+Envia uma mensagem (agradecimento mensal, aviso de evento) a todos os contribuintes com celular
+
+Roda fora do Streamlit, para que uma campanha longa não ocupe o servidor.
+O progresso de cada destinatário fica no banco: uma execução interrompida
+continua de onde parou com o comando "enviar".
+
+Uso:
+    python campanha_whatsapp.py criar --nome "Agradecimento outubro" --mensagem "Olá {primeiro_nome}! ..."
+    python campanha_whatsapp.py criar --nome "Culto de gratidão" --arquivo mensagem.txt
+    python campanha_whatsapp.py enviar 1 [--threads 4] [--repetir-falhas] [--simular]
+    python campanha_whatsapp.py status 1
+    python campanha_whatsapp.py listar
+
+Campos disponíveis na mensagem: {nome} e {primeiro_nome}
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import database
+from whatsapp_service import WhatsAppService, obter_whatsapp_service
+
+# Destinatários lidos do banco e enviados ao pool de threads por vez
+LOTE_CAMPANHA = 100
+
+# Threads de envio (sobrepõem a latência HTTP; a taxa é limitada pelo WhatsAppService)
+THREADS_CAMPANHA = 4
+
+
+def normalizar_celular(codigo_area: Optional[str], celular: Optional[str]) -> Optional[str]:
+    """
+    Normaliza DDD + celular para 11 dígitos (ex.: "11987654321")
+
+    Aceita números gravados com formatação ou com o código do país (55).
+
+    Returns:
+        Número normalizado, ou None se não for um celular brasileiro válido
+    """
+    numeros = ''.join(filter(str.isdigit, f"{codigo_area or ''}{celular or ''}"))
+
+    if len(numeros) == 13 and numeros.startswith("55"):
+        numeros = numeros[2:]
+
+    if len(numeros) != 11 or numeros[2] != "9":
+        return None
+    return numeros
+
+
+def renderizar_mensagem(modelo: str, nome: str) -> str:
+    """Preenche os campos {nome} e {primeiro_nome} do modelo"""
+    nome = nome.strip()
+    return modelo.format_map({"nome": nome, "primeiro_nome": nome.split()[0] if nome else ""})
+
+
+def criar_campanha(nome: str, modelo: str) -> Tuple[int, int]:
+    """
+    Cria a campanha e seleciona os destinatários
+
+    Os contatos são lidos em lotes do mais recente para o mais antigo; cada
+    número normalizado entra uma única vez, com o nome do lançamento mais
+    recente.
+
+    Returns:
+        (id da campanha, quantidade de destinatários)
+    """
+    renderizar_mensagem(modelo, "Teste")  # Campo desconhecido falha aqui, antes de gravar
+
+    campanha_id = database.criar_campanha(nome, modelo)
+
+    vistos = set()
+    lote = []
+    total = 0
+    for nome_contato, codigo_area, celular in database.iterar_contatos():
+        telefone = normalizar_celular(codigo_area, celular)
+        if telefone is None or telefone in vistos:
+            continue
+
+        vistos.add(telefone)
+        lote.append((telefone, nome_contato))
+        if len(lote) >= LOTE_CAMPANHA:
+            total += database.adicionar_destinatarios_campanha(campanha_id, lote)
+            lote = []
+
+    if lote:
+        total += database.adicionar_destinatarios_campanha(campanha_id, lote)
+
+    return campanha_id, total
+
+
+def enviar_campanha(campanha_id: int, threads: int = THREADS_CAMPANHA, simular: bool = False,
+                    servico: Optional[WhatsAppService] = None) -> dict:
+    """
+    Envia a mensagem aos destinatários pendentes da campanha
+
+    Os pendentes são lidos em lotes de LOTE_CAMPANHA e enviados por um pool
+    de `threads` threads; o limite de taxa e as novas tentativas ficam a cargo
+    do WhatsAppService. O resultado de cada destinatário é gravado assim que
+    o envio termina. Se o disjuntor do serviço abrir, a execução para e os
+    destinatários restantes continuam pendentes.
+
+    Args:
+        campanha_id: ID da campanha
+        threads: Envios simultâneos
+        simular: Apenas monta as mensagens, sem enviar nem alterar o progresso
+        servico: Serviço usado no envio (padrão: a instância global)
+
+    Returns:
+        Dicionário com enviados, falhas, segundos e mensagens_por_segundo
+    """
+    campanha = database.obter_campanha(campanha_id)
+    if campanha is None:
+        raise ValueError(f"Campanha {campanha_id} não encontrada.")
+    modelo = campanha[2]
+    whatsapp_service = servico or obter_whatsapp_service()
+
+    contagem = {"enviados": 0, "falhas": 0}
+    lock = threading.Lock()
+    interromper = threading.Event()
+
+    def enviar(telefone: str, nome: str):
+        if interromper.is_set():
+            return
+
+        mensagem = renderizar_mensagem(modelo, nome)
+        if simular:
+            print(f"  [simulação] {telefone}: {mensagem[:60]!r}")
+            sucesso, resultado = True, "simulação"
+        else:
+            sucesso, resultado = whatsapp_service.enviar_mensagem_personalizada(telefone, mensagem)
+
+            if not sucesso and whatsapp_service.disjuntor.estado != "fechado":
+                # API fora do ar: mantém o destinatário pendente para a próxima execução
+                with lock:
+                    if not interromper.is_set():
+                        interromper.set()
+                        print(f"⏸️ Envios suspensos pelo disjuntor: {resultado}")
+                return
+
+            database.registrar_envio_campanha(campanha_id, telefone, sucesso, resultado)
+
+        with lock:
+            contagem["enviados" if sucesso else "falhas"] += 1
+
+    inicio = time.perf_counter()
+    ultimo_telefone = ""
+
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="campanha") as executor:
+        while not interromper.is_set():
+            pendentes = database.obter_destinatarios_pendentes(campanha_id, ultimo_telefone, LOTE_CAMPANHA)
+            if not pendentes:
+                break
+
+            # Um lote por vez: no máximo LOTE_CAMPANHA envios em andamento
+            list(executor.map(lambda destinatario: enviar(*destinatario), pendentes))
+            ultimo_telefone = pendentes[-1][0]
+
+            decorrido = time.perf_counter() - inicio
+            processados = contagem["enviados"] + contagem["falhas"]
+            print(
+                f"📤 {processados} processado(s): {contagem['enviados']} enviado(s), "
+                f"{contagem['falhas']} falha(s) - {processados / decorrido:.1f} msg/s"
+            )
+
+    segundos = time.perf_counter() - inicio
+    processados = contagem["enviados"] + contagem["falhas"]
+
+    if not simular and not interromper.is_set() and database.resumo_campanha(campanha_id)["pendente"] == 0:
+        database.concluir_campanha(campanha_id)
+
+    return {
+        **contagem,
+        "segundos": segundos,
+        "mensagens_por_segundo": processados / segundos if segundos else 0.0,
+    }
+
+
+# ============================================
+# LINHA DE COMANDO
+# ============================================
+
+def comando_criar(args) -> int:
+    """Cria a campanha a partir de --mensagem ou --arquivo"""
+    if args.arquivo:
+        with open(args.arquivo, encoding="utf-8") as arquivo:
+            modelo = arquivo.read().strip()
+    else:
+        modelo = args.mensagem
+
+    try:
+        campanha_id, total = criar_campanha(args.nome, modelo)
+    except (KeyError, ValueError, IndexError) as e:
+        print(f"❌ Modelo de mensagem inválido: {e}. Campos disponíveis: {{nome}}, {{primeiro_nome}}")
+        return 1
+
+    print(f"✅ Campanha {campanha_id} criada com {total} destinatário(s).")
+    print(f"💡 Para enviar: python campanha_whatsapp.py enviar {campanha_id}")
+    return 0
+
+
+def comando_enviar(args) -> int:
+    """Envia (ou retoma) a campanha"""
+    if not args.simular and not obter_whatsapp_service().enabled:
+        print("❌ Serviço WhatsApp não habilitado. Configure as credenciais Twilio.")
+        return 1
+
+    if args.repetir_falhas:
+        print(f"🔁 {database.reabrir_falhas_campanha(args.campanha)} falha(s) voltaram para a fila.")
+
+    try:
+        resultado = enviar_campanha(args.campanha, threads=args.threads, simular=args.simular)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    print("\n" + "=" * 60)
+    print(
+        f"✅ {resultado['enviados']} enviado(s), {resultado['falhas']} falha(s) em "
+        f"{resultado['segundos']:.1f}s ({resultado['mensagens_por_segundo']:.2f} msg/s)"
+    )
+    return comando_status(args)
+
+
+def comando_status(args) -> int:
+    """Mostra o progresso da campanha"""
+    campanha = database.obter_campanha(args.campanha)
+    if campanha is None:
+        print(f"❌ Campanha {args.campanha} não encontrada.")
+        return 1
+
+    resumo = database.resumo_campanha(args.campanha)
+    situacao = f"concluída em {campanha[4]}" if campanha[4] else "em andamento"
+    print(f"📋 Campanha {campanha[0]} - {campanha[1]} ({situacao})")
+    print(f"   Pendentes: {resumo['pendente']} | Enviados: {resumo['enviado']} | Falhas: {resumo['erro']}")
+    return 0
+
+
+def comando_listar(args) -> int:
+    """Lista as campanhas criadas"""
+    campanhas = database.listar_campanhas()
+    if not campanhas:
+        print("ℹ️ Nenhuma campanha criada ainda.")
+        return 0
+
+    for campanha_id, nome, criada_em, concluida_em in campanhas:
+        situacao = f"concluída em {concluida_em}" if concluida_em else "em andamento"
+        print(f"{campanha_id:4} | {nome} | criada em {criada_em} | {situacao}")
+    return 0
+
+
+def main() -> int:
+    """Função principal - interpreta os argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(description="Campanhas de WhatsApp para os contribuintes")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    criar = subparsers.add_parser("criar", help="Cria uma campanha e seleciona os destinatários")
+    criar.add_argument("--nome", required=True, help="Nome da campanha")
+    origem = criar.add_mutually_exclusive_group(required=True)
+    origem.add_argument("--mensagem", help="Texto da mensagem ({nome}, {primeiro_nome})")
+    origem.add_argument("--arquivo", help="Arquivo UTF-8 com o texto da mensagem")
+    criar.set_defaults(func=comando_criar)
+
+    enviar = subparsers.add_parser("enviar", help="Envia ou retoma uma campanha")
+    enviar.add_argument("campanha", type=int, help="ID da campanha")
+    enviar.add_argument("--threads", type=int, default=THREADS_CAMPANHA, help="Envios simultâneos")
+    enviar.add_argument("--repetir-falhas", action="store_true", help="Tenta de novo os destinatários com erro")
+    enviar.add_argument("--simular", action="store_true", help="Mostra as mensagens sem enviar")
+    enviar.set_defaults(func=comando_enviar)
+
+    status = subparsers.add_parser("status", help="Mostra o progresso de uma campanha")
+    status.add_argument("campanha", type=int, help="ID da campanha")
+    status.set_defaults(func=comando_status)
+
+    subparsers.add_parser("listar", help="Lista as campanhas").set_defaults(func=comando_listar)
+
+    args = parser.parse_args()
+    database.garantir_banco_inicializado()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,9 +2,20 @@
 Módulo de Configurações do Sistema
 """
 import os
+import sys
+
+# Arquivos de secrets lidos pelo Streamlit (pasta do projeto e pasta do usuário)
+_ARQUIVOS_SECRETS = (
+    os.path.join(".streamlit", "secrets.toml"),
+    os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml"),
+)
 
 # Tenta importar streamlit para uso de secrets (Streamlit Cloud)
+# Os scripts de linha de comando (importação, exportação, manutenção) só pagam
+# a importação do streamlit se houver um arquivo de secrets para ler
 try:
+    if "streamlit" not in sys.modules and not any(os.path.exists(c) for c in _ARQUIVOS_SECRETS):
+        raise ImportError("streamlit não carregado e sem secrets.toml")
     import streamlit as st
     USE_STREAMLIT_SECRETS = hasattr(st, 'secrets') and len(st.secrets) > 0
 except (ImportError, FileNotFoundError):
@@ -65,12 +76,66 @@ NOMES_USUARIOS = {
     "diacono02": "Diácono02"
 }
 
+# Verificação das senhas (bcrypt custo 12: ~250 ms de CPU por tentativa)
+LOGIN_THREADS = 2  # Verificações bcrypt simultâneas no processo
+LOGIN_FILA_MAXIMA = 8  # Verificações aguardando uma thread; além disso o login é recusado
+LOGIN_TIMEOUT_SEGUNDOS = 15  # Espera máxima pelo resultado da verificação
+LOGIN_TENTATIVAS_USUARIO = 5  # Falhas por usuário dentro da janela antes do bloqueio
+LOGIN_TENTATIVAS_IP = 20  # Falhas por endereço IP dentro da janela antes do bloqueio
+LOGIN_JANELA_SEGUNDOS = 300  # Janela de contagem das falhas
+# Origem do IP para o limite por IP: "conexao" (padrão; IP da conexão), "x-forwarded-for"
+# (último endereço do cabeçalho, acrescentado por um proxy reverso confiável) ou "nenhum" (sem limite
+# por IP). Atrás de um proxy, o IP da conexão é o do proxy: use "x-forwarded-for", senão todos os
+# clientes dividem o mesmo limite
+LOGIN_ORIGEM_IP = (os.getenv('LOGIN_ORIGEM_IP') or "conexao").strip().lower()
+
+# Token de sessão assinado (HMAC-SHA256) guardado em um cookie (SameSite=Strict), nunca na URL:
+# recarregar a página não exige nova senha. "Sair" revoga só o token deste aparelho (sessoes_revogadas)
+# Configure SESSION_SECRET: sem ele, cada processo gera um segredo aleatório (com aviso no log) e
+# as sessões deixam de valer a cada reinício e entre workers
+SESSAO_SEGREDO = get_secret('SESSION_SECRET', 'passwords') or get_secret('SESSION_SECRET')
+SESSAO_DURACAO_SEGUNDOS = 2 * 60 * 60  # Validade do token
+
 # ============================================
 # CONFIGURAÇÕES DO BANCO DE DADOS
 # ============================================
 
 DATABASE_NAME = "dizimos_ofertas.db"
 
+# Quantidade de lançamentos por página na tabela de visualização
+TAMANHO_PAGINA = 50
+
+# Máximo de resultados exibidos na busca da página Editar
+LIMITE_BUSCA_EDICAO = 20
+
+# Máximo de resultados da busca por contribuinte na página Visualizar
+LIMITE_BUSCA_TEXTO = 100
+
+# Linhas da planilha lidas, validadas e gravadas por vez na importação histórica
+IMPORTACAO_LINHAS_POR_LOTE = 50000
+
+# Linhas lidas do banco por vez na exportação em CSV
+EXPORTACAO_LINHAS_POR_LOTE = 5000
+
+# Arquivo dos anos encerrados em Parquet (pasta relativa à do banco de dados)
+ARQUIVO_ANUAL_DIRETORIO = "arquivo_anual"
+ARQUIVO_LINHAS_POR_GRUPO = 50000  # Linhas por grupo do Parquet (menor grupo lido em uma consulta por período)
+
+# Partições anuais: anos encerrados em arquivos SQLite próprios, anexados (ATTACH) sob demanda
+PARTICOES_DIRETORIO = "particoes"  # Pasta relativa à do banco de dados
+PARTICOES_POR_CONSULTA = 8  # Partições anexadas ao mesmo tempo (o SQLite permite 10 bancos anexados)
+
+# Pool de conexões SQLite (reutilizadas entre reruns e sessões)
+DB_POOL_TAMANHO = 5  # Máximo de conexões abertas simultaneamente
+DB_POOL_TIMEOUT = 10  # Segundos aguardando uma conexão livre
+DB_BUSY_TIMEOUT_MS = 5000  # Espera do SQLite quando o banco está bloqueado
+DB_CACHE_SIZE_KB = 8192  # Cache de páginas por conexão (8 MB)
+DB_MMAP_SIZE = 64 * 1024 * 1024  # Leitura via memória mapeada (64 MB)
+DB_RETENTATIVAS_LOCK = 3  # Novas tentativas de escrita após "database is locked"
+
+# Cache das leituras (invalidado a cada escrita; as de outros processos, pelo PRAGMA data_version)
+CACHE_LEITURAS_MAX = 256  # Máximo de consultas diferentes guardadas
+
 # ============================================
 # CONFIGURAÇÕES DA APLICAÇÃO
 # ============================================
@@ -80,6 +145,11 @@ PAGE_ICON = "💰"
 LAYOUT = "wide"
 LOGO_PATH = "./imagem/igrejadechomai.jpg"
 
+# Versões reduzidas da logo geradas uma vez por processo (larguras em pixels)
+LOGO_LARGURAS = (120, 240, 360)
+LOGO_DENSIDADE_PIXELS = 2  # Telas de alta densidade: pixels da imagem por pixel exibido
+LOGO_QUALIDADE = 80  # Qualidade JPEG das versões reduzidas
+
 # ============================================
 # CATEGORIAS E TIPOS
 # ============================================
@@ -109,6 +179,26 @@ TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN', 'seu_auth_token_aqui')
 # Número WhatsApp Twilio (formato: whatsapp:+14155238886)
 TWILIO_WHATSAPP_NUMBER = os.getenv('TWILIO_WHATSAPP_NUMBER', 'whatsapp:+14155238886')
 
+# Endereço alternativo da API Twilio (opcional - ex.: servidor simulado em testes)
+TWILIO_API_URL = os.getenv('TWILIO_API_URL') or None
+
+# Proteções do envio (WhatsAppService)
+WHATSAPP_TAXA_MENSAGENS = float(os.getenv('WHATSAPP_TAXA_MENSAGENS', '1'))  # Mensagens/segundo por número remetente
+WHATSAPP_RAJADA = 1  # Mensagens que podem sair de uma vez antes de aplicar a taxa
+WHATSAPP_TIMEOUT_SEGUNDOS = 10  # Tempo máximo de cada requisição HTTP ao Twilio
+WHATSAPP_TENTATIVAS = 4  # Tentativas por mensagem em erros temporários (429, 5xx, rede)
+WHATSAPP_ESPERA_BASE_SEGUNDOS = 0.5  # Espera antes da 2ª tentativa (dobra a cada falha, com variação aleatória)
+WHATSAPP_ESPERA_MAXIMA_SEGUNDOS = 8  # Limite da espera entre tentativas
+WHATSAPP_DISJUNTOR_FALHAS = 5  # Falhas temporárias seguidas que suspendem os envios
+WHATSAPP_DISJUNTOR_PAUSA_SEGUNDOS = 60  # Tempo de suspensão antes de testar a API novamente
+
+# Fila de envio (outbox) - as confirmações são enviadas em segundo plano
+OUTBOX_INTERVALO_SEGUNDOS = 5  # Intervalo entre verificações da fila
+OUTBOX_LOTE = 10  # Mensagens reservadas por vez
+OUTBOX_MAX_TENTATIVAS = 5  # Após isso a mensagem fica com status "erro"
+OUTBOX_ESPERA_BASE_SEGUNDOS = 30  # Espera antes da 2ª tentativa (dobra a cada falha)
+OUTBOX_TEMPO_RESERVA_SEGUNDOS = 300  # Mensagem "enviando" volta à fila após esse tempo
+
 # Mensagem padrão pode ser personalizada
 WHATSAPP_MENSAGEM_PADRAO = """
 🙏 *Ministério Dechonai*
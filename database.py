@@ -1,20 +1,903 @@
 """
 Módulo de Gerenciamento do Banco de Dados
 """
+import functools
+import heapq
+import itertools
+import os
+import queue
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
-from typing import List, Tuple, Optional
-from config import DATABASE_NAME
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Optional
+from config import (
+    DATABASE_NAME,
+    DB_POOL_TAMANHO,
+    DB_POOL_TIMEOUT,
+    DB_BUSY_TIMEOUT_MS,
+    DB_CACHE_SIZE_KB,
+    DB_MMAP_SIZE,
+    DB_RETENTATIVAS_LOCK,
+    CACHE_LEITURAS_MAX,
+    OUTBOX_MAX_TENTATIVAS,
+    OUTBOX_ESPERA_BASE_SEGUNDOS,
+    OUTBOX_TEMPO_RESERVA_SEGUNDOS,
+    PARTICOES_DIRETORIO,
+    PARTICOES_POR_CONSULTA
+)
+from migrations import (
+    aplicar_migracoes, GATILHOS_FTS, GATILHOS_RESUMO_DIARIO, SQL_CRIAR_FTS, SQL_RESUMO_DIARIO_ESPERADO
+)
+
+
+# Controle de inicialização única por processo (ver garantir_banco_inicializado)
+_banco_inicializado = False
+_lock_inicializacao = threading.Lock()
+
+
+# ============================================
+# POOL DE CONEXÕES
+# ============================================
+
+def _configurar_conexao(conn: sqlite3.Connection):
+    """
+    Aplica os PRAGMAs de desempenho uma única vez por conexão
+
+    - journal_mode=WAL: leitores não bloqueiam o escritor (persistente no arquivo)
+    - synchronous=NORMAL: seguro com WAL e evita um fsync por commit
+    - busy_timeout: espera o lock ser liberado em vez de falhar na hora
+    - cache_size / mmap_size: mantêm as páginas quentes em memória
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA cache_size=-{int(DB_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size={int(DB_MMAP_SIZE)}")
+
+
+class _Conexao(sqlite3.Connection):
+    """Conexão do pool, com o último PRAGMA data_version lido (_conferir_escritas_externas)"""
+    data_version: Optional[int] = None
+
+
+class PoolConexoes:
+    """
+    Pool limitado de conexões SQLite reutilizáveis
+
+    As conexões são criadas sob demanda até o limite `tamanho` e devolvidas
+    a uma fila LIFO (a mais recente tende a estar com o cache aquecido).
+    Quando todas estão em uso, a chamada aguarda até `timeout` segundos.
+
+    Estatísticas expostas em estatisticas():
+    - conexoes_criadas: conexões abertas desde a criação do pool
+    - reutilizacoes: pedidos atendidos por uma conexão já aberta (hits)
+    - esperas: pedidos que precisaram aguardar uma conexão livre
+    - tempo_espera_ms: tempo total aguardando conexões livres
+    - esgotamentos: pedidos que desistiram após o timeout
+    - retentativas_lock: escritas repetidas após "database is locked"
+    - descartadas: conexões fechadas por erro
+    """
+    
+    def __init__(self, caminho: str, tamanho: int = DB_POOL_TAMANHO,
+                 timeout: float = DB_POOL_TIMEOUT):
+        self.caminho = caminho
+        self.tamanho = tamanho
+        self.timeout = timeout
+        self._livres = queue.LifoQueue()
+        self._abertas = 0
+        self._lock = threading.Lock()
+        self._estatisticas = {
+            "conexoes_criadas": 0,
+            "reutilizacoes": 0,
+            "esperas": 0,
+            "tempo_espera_ms": 0.0,
+            "esgotamentos": 0,
+            "retentativas_lock": 0,
+            "descartadas": 0
+        }
+    
+    def _incrementar(self, chave: str, valor=1):
+        with self._lock:
+            self._estatisticas[chave] += valor
+    
+    def _criar_conexao(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.caminho,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,  # Uma thread por vez, garantido pelo pool
+            factory=_Conexao
+        )
+        _configurar_conexao(conn)
+        self._incrementar("conexoes_criadas")
+        return conn
+    
+    def obter(self) -> sqlite3.Connection:
+        """Retira uma conexão do pool (criando ou aguardando, se necessário)"""
+        try:
+            conn = self._livres.get_nowait()
+            self._incrementar("reutilizacoes")
+            return conn
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            pode_criar = self._abertas < self.tamanho
+            if pode_criar:
+                self._abertas += 1
+        
+        if pode_criar:
+            try:
+                return self._criar_conexao()
+            except Exception:
+                with self._lock:
+                    self._abertas -= 1
+                raise
+        
+        self._incrementar("esperas")
+        inicio = time.perf_counter()
+        try:
+            conn = self._livres.get(timeout=self.timeout)
+        except queue.Empty:
+            self._incrementar("esgotamentos")
+            raise sqlite3.OperationalError(
+                f"Pool de conexões esgotado ({self.tamanho} em uso por mais de {self.timeout}s)"
+            )
+        finally:
+            self._incrementar("tempo_espera_ms", (time.perf_counter() - inicio) * 1000)
+        
+        self._incrementar("reutilizacoes")
+        return conn
+    
+    def devolver(self, conn: sqlite3.Connection, descartar: bool = False):
+        """Devolve a conexão ao pool (ou a fecha, se estiver em estado inválido)"""
+        if descartar:
+            self._incrementar("descartadas")
+            with self._lock:
+                self._abertas -= 1
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            return
+        
+        self._livres.put(conn)
+    
+    def registrar_retentativa_lock(self):
+        """Contabiliza uma escrita repetida por causa de bloqueio do banco"""
+        self._incrementar("retentativas_lock")
+    
+    def fechar(self):
+        """Fecha todas as conexões livres do pool"""
+        while True:
+            try:
+                conn = self._livres.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._abertas -= 1
+            conn.close()
+    
+    def estatisticas(self) -> dict:
+        """Retorna uma cópia das estatísticas do pool"""
+        with self._lock:
+            return {
+                **self._estatisticas,
+                "tamanho": self.tamanho,
+                "abertas": self._abertas,
+                "livres": self._livres.qsize()
+            }
+
+
+_pool: Optional[PoolConexoes] = None
+_lock_pool = threading.Lock()
+
+
+def _obter_pool() -> PoolConexoes:
+    """Retorna o pool do banco atual, criando-o na primeira chamada"""
+    global _pool
+    
+    pool = _pool
+    if pool is not None and pool.caminho == DATABASE_NAME:
+        return pool
+    
+    with _lock_pool:
+        if _pool is None or _pool.caminho != DATABASE_NAME:
+            if _pool is not None:
+                _pool.fechar()
+            _pool = PoolConexoes(DATABASE_NAME)
+        return _pool
+
+
+def fechar_conexoes():
+    """Fecha as conexões do pool (ex.: antes de substituir o arquivo do banco)"""
+    global _pool
+    
+    with _lock_pool:
+        if _pool is not None:
+            _pool.fechar()
+            _pool = None
+
+
+def estatisticas_pool() -> dict:
+    """Retorna as estatísticas do pool de conexões (para dimensionamento)"""
+    return _obter_pool().estatisticas()
 
 
 @contextmanager
 def get_db_connection():
-    """Context manager para gerenciar conexões com o banco de dados"""
-    conn = sqlite3.connect(DATABASE_NAME)
+    """
+    Context manager para gerenciar conexões com o banco de dados
+    
+    A conexão vem do pool e é devolvida ao final. Uma transação deixada
+    aberta (erro antes do commit) é desfeita antes da devolução.
+    """
+    pool = _obter_pool()
+    conn = pool.obter()
+    descartar = False
     try:
         yield conn
     finally:
-        conn.close()
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                descartar = True
+        pool.devolver(conn, descartar)
+
+
+def _erro_de_bloqueio(erro: sqlite3.OperationalError) -> bool:
+    """Indica se o erro é transitório de concorrência (locked / busy)"""
+    mensagem = str(erro).lower()
+    return "locked" in mensagem or "busy" in mensagem
+
+
+def _executar_transacao(operacao: Callable[[sqlite3.Connection], object],
+                        anos: Iterable[Optional[int]] = (), imediata: bool = False):
+    """
+    Executa uma operação de escrita em transação, com novas tentativas
+
+    Se o banco continuar bloqueado após o busy_timeout, a transação inteira
+    é repetida (com espera crescente) até DB_RETENTATIVAS_LOCK vezes.
+    Após o commit, o cache de leituras é invalidado.
+
+    Args:
+        operacao: Função que recebe a conexão e executa os comandos (sem commit)
+        anos: Partições anexadas (com os gatilhos do resumo) antes da operação
+            e mantidas até o commit - ATTACH e DETACH não podem acontecer
+            dentro da transação. None (arquivo principal) é ignorado.
+        imediata: Reserva a escrita (BEGIN IMMEDIATE) antes da operação, para
+            operações que leem e depois gravam com base no que leram
+
+    Returns:
+        O retorno da operação
+    """
+    anos = sorted({ano for ano in anos if ano is not None})
+    for tentativa in range(DB_RETENTATIVAS_LOCK + 1):
+        try:
+            with get_db_connection() as conn, _particoes_anexadas(conn, anos):
+                if imediata:
+                    conn.execute("BEGIN IMMEDIATE")
+                resultado = operacao(conn)
+                conn.commit()
+            invalidar_cache()
+            return resultado
+        except sqlite3.OperationalError as e:
+            if not _erro_de_bloqueio(e) or tentativa == DB_RETENTATIVAS_LOCK:
+                raise
+            _obter_pool().registrar_retentativa_lock()
+            time.sleep(0.05 * (2 ** tentativa))
+
+
+# ============================================
+# CACHE DE LEITURAS
+# ============================================
+
+# Cada escrita incrementa a versão dos dados; entradas de versões anteriores
+# são descartadas. Escritas de outros processos (CLI) são percebidas pelo
+# PRAGMA data_version, conferido a cada consulta ao cache.
+_versao_dados = 0
+_cache_leituras: "OrderedDict[tuple, tuple]" = OrderedDict()
+_lock_cache = threading.Lock()
+_estatisticas_cache = {"acertos": 0, "falhas": 0, "invalidacoes": 0, "escritas_externas": 0}
+
+
+def _conferir_escritas_externas():
+    """
+    Invalida o cache se outra conexão gravou no banco desde a última conferência
+
+    PRAGMA data_version muda, para uma conexão, a cada commit de outra conexão
+    (deste ou de outro processo) no arquivo principal; as escritas nas
+    partições também alteram o arquivo principal (resumo_diario). Cada conexão
+    do pool guarda o último valor lido; a primeira leitura de uma conexão nova
+    também invalida, pois não há valor anterior para comparar.
+    """
+    with get_db_connection() as conn:
+        versao = conn.execute("PRAGMA data_version").fetchone()[0]
+        alterado = versao != conn.data_version
+        conn.data_version = versao
+
+    if alterado:
+        invalidar_cache()
+        with _lock_cache:
+            _estatisticas_cache["escritas_externas"] += 1
+
+
+def _em_cache(funcao):
+    """
+    Decorator que guarda o resultado de uma função de leitura
+
+    A chave inclui o banco, a função e todos os argumentos (usuário, nível de
+    acesso, cursor da página, filtros). Um rerun sem escritas só lê o PRAGMA
+    data_version (_conferir_escritas_externas), sem consultar as tabelas. Os
+    resultados são compartilhados: não devem ser modificados.
+    """
+    @functools.wraps(funcao)
+    def wrapper(*args, **kwargs):
+        chave = (DATABASE_NAME, funcao.__name__, args, tuple(sorted(kwargs.items())))
+        _conferir_escritas_externas()
+        
+        with _lock_cache:
+            item = _cache_leituras.get(chave)
+            if item is not None and item[0] == _versao_dados:
+                _cache_leituras.move_to_end(chave)
+                _estatisticas_cache["acertos"] += 1
+                return item[1]
+            _estatisticas_cache["falhas"] += 1
+            versao = _versao_dados
+        
+        resultado = funcao(*args, **kwargs)
+        
+        with _lock_cache:
+            # Só guarda se nenhuma escrita aconteceu durante a leitura
+            if versao == _versao_dados:
+                _cache_leituras[chave] = (versao, resultado)
+                _cache_leituras.move_to_end(chave)
+                while len(_cache_leituras) > CACHE_LEITURAS_MAX:
+                    _cache_leituras.popitem(last=False)
+        
+        return resultado
+    
+    return wrapper
+
+
+def invalidar_cache():
+    """Descarta as leituras em cache (chamada após cada escrita)"""
+    global _versao_dados
+    
+    with _lock_cache:
+        _versao_dados += 1
+        _cache_leituras.clear()
+        _estatisticas_cache["invalidacoes"] += 1
+
+
+def estatisticas_cache() -> dict:
+    """Retorna acertos, falhas e tamanho do cache de leituras"""
+    with _lock_cache:
+        consultas = _estatisticas_cache["acertos"] + _estatisticas_cache["falhas"]
+        return {
+            **_estatisticas_cache,
+            "entradas": len(_cache_leituras),
+            "versao_dados": _versao_dados,
+            "taxa_acerto": _estatisticas_cache["acertos"] / consultas if consultas else 0.0
+        }
+
+
+# ============================================
+# PARTIÇÕES ANUAIS (ATTACH)
+# ============================================
+
+# Colunas copiadas entre o arquivo principal e as partições (lista explícita:
+# a visão UNION ALL não depende da ordem física das colunas em cada arquivo)
+_COLUNAS_PARTICAO = (
+    "id, data, nome, valor, valor_centavos, tipo, categoria, usuario, "
+    "email, codigo_area, celular, operadora, created_at"
+)
+
+# Visão temporária (da conexão) com o arquivo principal e as partições anexadas
+_VISAO_PARTICOES = "lancamentos_particionados"
+
+
+def diretorio_particoes() -> str:
+    """Pasta dos arquivos de partição, ao lado do banco de dados em uso"""
+    return os.path.join(os.path.dirname(os.path.abspath(DATABASE_NAME)), PARTICOES_DIRETORIO)
+
+
+def _esquema_particao(ano: int) -> str:
+    """Nome do banco anexado (ATTACH ... AS p2023)"""
+    return f"p{int(ano)}"
+
+
+def _caminho_particao(ano: int) -> str:
+    return os.path.join(diretorio_particoes(), f"lancamentos_{int(ano)}.db")
+
+
+def _tabela_lancamentos(ano: Optional[int]) -> str:
+    """Tabela de lancamentos que guarda o ano (partição ou arquivo principal)"""
+    return f"{_esquema_particao(ano)}.lancamentos" if ano is not None else "main.lancamentos"
+
+
+def _tabela_leitura(anos: List[int]) -> str:
+    """Origem das leituras: a visão UNION ALL quando há partições anexadas"""
+    return f"temp.{_VISAO_PARTICOES}" if anos else "lancamentos"
+
+
+def _anos_particionados(conn: sqlite3.Connection, data_inicio: Optional[str] = None,
+                        data_fim: Optional[str] = None) -> List[int]:
+    """Anos com partição própria que cruzam o período, do mais recente ao mais antigo"""
+    return [ano for ano, in conn.execute(
+        "SELECT ano FROM particoes WHERE ano BETWEEN ? AND ? ORDER BY ano DESC",
+        (int(data_inicio[:4]) if data_inicio else 0, int(data_fim[:4]) if data_fim else 9999)
+    )]
+
+
+def _particao_da_data(conn: sqlite3.Connection, data: str) -> Optional[int]:
+    """Roteador: ano da partição que recebe um lançamento nesta data (None: arquivo principal)"""
+    ano = int(data[:4])
+    return ano if conn.execute("SELECT 1 FROM particoes WHERE ano = ?", (ano,)).fetchall() else None
+
+
+class _RotaAlterada(Exception):
+    """O arquivo do lançamento mudou (particionar_ano) entre a escolha da rota e a gravação"""
+
+
+# Escolhas de rota antes de desistir da gravação (cada particionar_ano muda a rota uma vez)
+_TENTATIVAS_ROTA = 3
+
+
+def _anos_arquivados_em(conn: sqlite3.Connection, anos: Iterable[int]) -> List[int]:
+    """Quais destes anos estão arquivados em Parquet (arquivo_anual), em ordem"""
+    anos = sorted(set(anos))
+    if not anos:
+        return []
+    return [ano for ano, in conn.execute(
+        f"SELECT ano FROM anos_arquivados WHERE ano IN ({', '.join('?' * len(anos))}) ORDER BY ano", anos
+    )]
+
+
+def _recusar_anos_arquivados(conn: sqlite3.Connection, anos: Iterable[int]):
+    """
+    Regra única de todas as gravações: não há lançamentos novos em ano arquivado
+
+    O arquivo Parquet do ano é fechado; um lançamento gravado no banco ficaria
+    fora dele (e de resumo_arquivado) para sempre.
+
+    Raises:
+        ValueError: Algum dos anos está arquivado
+    """
+    arquivados = _anos_arquivados_em(conn, anos)
+    if arquivados:
+        raise ValueError(f"Lançamentos em ano(s) arquivado(s) em Parquet: {', '.join(map(str, arquivados))}")
+
+
+def anos_arquivados(anos: Iterable[int]) -> List[int]:
+    """
+    Quais destes anos estão arquivados em Parquet (não aceitam lançamentos)
+
+    Para a interface avisar antes de gravar; as gravações conferem de novo
+    (_recusar_anos_arquivados).
+    """
+    with get_db_connection() as conn:
+        return _anos_arquivados_em(conn, anos)
+
+
+def _arquivos_no_periodo(conn: sqlite3.Connection, data_inicio: Optional[str],
+                         data_fim: Optional[str]) -> List[str]:
+    """Arquivos Parquet dos anos arquivados que cruzam o período, do mais recente ao mais antigo"""
+    return [arquivo for arquivo, in conn.execute('''
+        SELECT arquivo FROM anos_arquivados
+        WHERE data_fim >= :data_inicio AND data_inicio <= :data_fim
+        ORDER BY ano DESC
+    ''', {"data_inicio": data_inicio or "", "data_fim": data_fim or "9999-12-31"})]
+
+
+def _ler_arquivados(arquivos: List[str], usuario: Optional[str], nivel_acesso: str,
+                    data_inicio: Optional[str] = None, data_fim: Optional[str] = None,
+                    colunas: Optional[Tuple[str, ...]] = None, **filtros) -> Iterator[Tuple]:
+    """
+    Lançamentos arquivados em Parquet com a visibilidade de obter_lancamentos
+
+    Na ordem de obter_lancamentos (data e ID decrescentes); os filtros vão
+    para arquivo_anual.iterar_arquivados. Sem colunas, as de obter_lancamentos.
+    """
+    from arquivo_anual import iterar_arquivados
+
+    admin = not usuario or nivel_acesso == "admin"
+    if colunas is None:
+        colunas = NOMES_COLUNAS_ADMIN if admin else NOMES_COLUNAS_USUARIO
+    return iterar_arquivados(arquivos, colunas, None if admin else usuario, data_inicio, data_fim, **filtros)
+
+
+def _gatilhos_particao(ano: int) -> dict:
+    """
+    Gatilhos TEMP que mantêm resumo_diario a partir da tabela da partição
+
+    Gatilhos gravados em um banco só alcançam as tabelas desse banco; os
+    TEMP, criados na conexão, alcançam o resumo do arquivo principal.
+    """
+    esquema = _esquema_particao(ano)
+    return {
+        f"{esquema}_{nome}": ddl.replace("CREATE TRIGGER IF NOT EXISTS ", f"CREATE TEMP TRIGGER IF NOT EXISTS {esquema}_")
+                                .replace(" ON lancamentos", f" ON {esquema}.lancamentos")
+        for nome, ddl in GATILHOS_RESUMO_DIARIO.items()
+    }
+
+
+@contextmanager
+def _particoes_anexadas(conn: sqlite3.Connection, anos: Iterable[int], gatilhos: bool = True):
+    """
+    Anexa (ATTACH) as partições dos anos à conexão enquanto o bloco executa
+
+    Cria a visão temporária lancamentos_particionados (arquivo principal +
+    partições, UNION ALL): com ORDER BY data, id o SQLite intercala os índices
+    de cada arquivo sem ordenar. Com gatilhos, as escritas nas partições
+    atualizam resumo_diario. Deve ser usado fora de transação; no fim, uma
+    transação não concluída é desfeita e as partições são desanexadas.
+    """
+    anos = list(anos)
+    anexadas = []
+    try:
+        for ano in anos:
+            caminho = _caminho_particao(ano)
+            if not os.path.exists(caminho):
+                raise sqlite3.OperationalError(f"Partição de {ano} não encontrada: {caminho}")
+            esquema = _esquema_particao(ano)
+            conn.execute(f"ATTACH DATABASE ? AS {esquema}", (caminho,))
+            anexadas.append(ano)
+            conn.execute(f"PRAGMA {esquema}.synchronous=NORMAL")
+            if gatilhos:
+                for ddl in _gatilhos_particao(ano).values():
+                    conn.execute(ddl)
+
+        if anos:
+            partes = [f"SELECT {_COLUNAS_PARTICAO} FROM {_tabela_lancamentos(ano)}" for ano in [None, *anos]]
+            conn.execute(f"DROP VIEW IF EXISTS temp.{_VISAO_PARTICOES}")
+            conn.execute(f"CREATE TEMP VIEW {_VISAO_PARTICOES} AS {' UNION ALL '.join(partes)}")
+        yield
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        if anos:
+            conn.execute(f"DROP VIEW IF EXISTS temp.{_VISAO_PARTICOES}")
+        for ano in anexadas:
+            for nome in _gatilhos_particao(ano):
+                conn.execute(f"DROP TRIGGER IF EXISTS temp.{nome}")
+            conn.execute(f"DETACH DATABASE {_esquema_particao(ano)}")
+
+
+def _segmentos_particoes(anos: List[int], data_inicio: Optional[str],
+                         data_fim: Optional[str]) -> List[Tuple[List[int], Optional[str], Optional[str]]]:
+    """
+    Divide o período em faixas de datas decrescentes com até PARTICOES_POR_CONSULTA partições
+
+    Cada faixa é lida com as suas partições anexadas (e o arquivo principal);
+    juntas, as faixas cobrem o período inteiro, na ordem de data decrescente.
+    Com poucas partições, é uma faixa só: o próprio período.
+
+    Returns:
+        Lista de (anos anexados, data inicial, data final)
+    """
+    grupos = [anos[posicao:posicao + PARTICOES_POR_CONSULTA]
+              for posicao in range(0, len(anos), PARTICOES_POR_CONSULTA)] or [[]]
+    segmentos = []
+    fim = data_fim
+
+    for posicao, grupo in enumerate(grupos):
+        if posicao == len(grupos) - 1:
+            segmentos.append((grupo, data_inicio, fim))
+        else:
+            inicio = f"{grupo[-1]}-01-01"
+            segmentos.append((grupo, max(inicio, data_inicio) if data_inicio else inicio, fim))
+            fim = f"{grupo[-1] - 1}-12-31"
+
+    return segmentos
+
+
+def _reservar_ids(conn: sqlite3.Connection, quantidade: int) -> range:
+    """
+    Reserva IDs na sequência AUTOINCREMENT de lancamentos (arquivo principal)
+
+    Os lançamentos gravados nas partições também recebem o ID daqui, então
+    nenhum ID se repete entre os arquivos. Deve ser chamada em transação.
+    """
+    linha = conn.execute(
+        "UPDATE sqlite_sequence SET seq = seq + ? WHERE name = 'lancamentos' RETURNING seq", (quantidade,)
+    ).fetchall()
+    if linha:
+        ultimo = linha[0][0]
+    else:
+        ultimo = conn.execute("SELECT COALESCE(MAX(id), 0) FROM main.lancamentos").fetchone()[0] + quantidade
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('lancamentos', ?)", (ultimo,))
+    return range(ultimo - quantidade + 1, ultimo + 1)
+
+
+def _buscar_em_particoes(conn: sqlite3.Connection, id_lancamento: int) -> Optional[Tuple[int, Tuple]]:
+    """
+    Procura um lançamento pelo ID nas partições (busca pela chave primária em cada uma)
+
+    Returns:
+        (ano da partição, tupla no formato de obter_lancamento_por_id) ou None
+    """
+    anos = _anos_particionados(conn)
+
+    for posicao in range(0, len(anos), PARTICOES_POR_CONSULTA):
+        grupo = anos[posicao:posicao + PARTICOES_POR_CONSULTA]
+        with _particoes_anexadas(conn, grupo, gatilhos=False):
+            linhas = conn.execute(" UNION ALL ".join(
+                f"SELECT {ano}, {_COLUNAS_ADMIN} FROM {_tabela_lancamentos(ano)} WHERE id = :id" for ano in grupo
+            ), {"id": id_lancamento}).fetchall()
+        if linhas:
+            return linhas[0][0], linhas[0][1:]
+
+    return None
+
+
+def _copias_lancamento(conn: sqlite3.Connection, id_lancamento: int) -> List[Tuple[Optional[int], str]]:
+    """
+    Arquivos que têm o lançamento, com a data gravada em cada um
+
+    Normalmente um só. Uma mudança de arquivo interrompida (ver
+    _concluir_movimentacao) deixa a cópia no arquivo errado ou nos dois.
+
+    Returns:
+        Lista de (ano da partição ou None para o arquivo principal, data)
+    """
+    copias = [(None, data) for data, in conn.execute(
+        "SELECT data FROM main.lancamentos WHERE id = ?", (id_lancamento,))]
+    anos = _anos_particionados(conn)
+
+    for posicao in range(0, len(anos), PARTICOES_POR_CONSULTA):
+        grupo = anos[posicao:posicao + PARTICOES_POR_CONSULTA]
+        with _particoes_anexadas(conn, grupo, gatilhos=False):
+            copias.extend(conn.execute(" UNION ALL ".join(
+                f"SELECT {ano}, data FROM {_tabela_lancamentos(ano)} WHERE id = :id" for ano in grupo
+            ), {"id": id_lancamento}).fetchall())
+
+    return copias
+
+
+def _localizar_lancamento(conn: sqlite3.Connection, id_lancamento: int) -> Tuple[bool, Optional[int]]:
+    """
+    Onde está o lançamento
+
+    Com cópias em dois arquivos (mudança de arquivo interrompida), vale a do
+    arquivo do ano da sua data.
+
+    Returns:
+        (True, None) no arquivo principal, (True, ano) em uma partição,
+        (False, None) se não existe
+    """
+    copias = _copias_lancamento(conn, id_lancamento)
+    if not copias:
+        return False, None
+
+    for ano, data in copias:
+        if _particao_da_data(conn, data) == ano:
+            return True, ano
+    return True, copias[0][0]
+
+
+def _arquivo_do_lancamento(conn: sqlite3.Connection, id_lancamento: int,
+                           data_atual: Optional[str] = None) -> Tuple[bool, Optional[int]]:
+    """
+    Arquivo do lançamento para uma edição ou exclusão, sem percorrer todas as partições
+
+    Com a data atual (já lida pela página), consulta só o arquivo do ano
+    dela; sem ela, ou se o lançamento não estiver lá, o arquivo principal e
+    depois as partições, parando no primeiro que tiver o ID. Cópias em dois
+    arquivos (mudança interrompida) ficam para concluir_movimentacoes.
+
+    Returns:
+        (True, None) no arquivo principal, (True, ano) em uma partição,
+        (False, None) se não existe
+    """
+    if data_atual:
+        ano = _particao_da_data(conn, data_atual)
+        with _particoes_anexadas(conn, [ano] if ano is not None else [], gatilhos=False):
+            if conn.execute(f"SELECT 1 FROM {_tabela_lancamentos(ano)} WHERE id = ?", (id_lancamento,)).fetchall():
+                return True, ano
+
+    if conn.execute("SELECT 1 FROM main.lancamentos WHERE id = ?", (id_lancamento,)).fetchall():
+        return True, None
+    encontrado = _buscar_em_particoes(conn, id_lancamento)
+    return (True, encontrado[0]) if encontrado else (False, None)
+
+
+def _copiar_lancamento(id_lancamento: int, origem: Optional[int], destino: Optional[int]):
+    """Passo 2 da mudança de arquivo: grava no destino a cópia do lançamento na origem"""
+    def copiar(conn):
+        conn.execute(f"DELETE FROM {_tabela_lancamentos(destino)} WHERE id = ?", (id_lancamento,))
+        conn.execute(f'''
+            INSERT INTO {_tabela_lancamentos(destino)} ({_COLUNAS_PARTICAO})
+            SELECT {_COLUNAS_PARTICAO} FROM {_tabela_lancamentos(origem)} WHERE id = ?
+        ''', (id_lancamento,))
+
+    _executar_transacao(copiar, [origem, destino])
+
+
+def _remover_copia(id_lancamento: int, origem: Optional[int]):
+    """Passo 3 da mudança de arquivo (e exclusão): remove o lançamento de um arquivo"""
+    _executar_transacao(
+        lambda conn: conn.execute(f"DELETE FROM {_tabela_lancamentos(origem)} WHERE id = ?", (id_lancamento,)),
+        [origem]
+    )
+
+
+def _concluir_movimentacao(id_lancamento: int) -> Tuple[bool, Optional[int]]:
+    """
+    Deixa o lançamento só no arquivo do ano da sua data
+
+    Uma mudança de arquivo tem três passos, cada um uma transação que altera
+    um só arquivo (com WAL, um commit que altera dois arquivos não é atômico
+    entre eles): 1) os novos valores são gravados no arquivo atual
+    (atualizar_lancamento); 2) o lançamento é copiado para o arquivo do ano;
+    3) a cópia antiga é removida. Interrompida, a mudança deixa o lançamento
+    no arquivo errado ou nos dois, com os mesmos valores: esta função
+    refaz os passos 2 e 3, e pode ser repetida.
+
+    Returns:
+        (encontrado, ano da partição onde ficou ou None para o arquivo principal)
+    """
+    with get_db_connection() as conn:
+        copias = _copias_lancamento(conn, id_lancamento)
+        if not copias:
+            return False, None
+        # Fica a cópia que já está no arquivo do seu ano; sem ela, vai para o ano da data
+        roteadas = [ano for ano, data in copias if _particao_da_data(conn, data) == ano]
+        destino = roteadas[0] if roteadas else _particao_da_data(conn, copias[0][1])
+    origens = [ano for ano, _ in copias if ano != destino]
+
+    if len(origens) == len(copias):
+        _copiar_lancamento(id_lancamento, origens[0], destino)
+
+    for origem in origens:
+        _remover_copia(id_lancamento, origem)
+
+    return True, destino
+
+
+def concluir_movimentacoes() -> int:
+    """
+    Termina as mudanças de arquivo interrompidas (lançamentos no arquivo errado)
+
+    Anos particionados que ainda têm lançamentos no arquivo principal passam
+    por particionar_ano; lançamentos de outro ano dentro de uma partição, por
+    _concluir_movimentacao.
+
+    Returns:
+        Quantidade de lançamentos movidos para o arquivo do seu ano
+    """
+    with get_db_connection() as conn:
+        anos = _anos_particionados(conn)
+        no_principal = [ano for ano in anos if conn.execute(
+            "SELECT 1 FROM main.lancamentos WHERE data BETWEEN ? AND ? LIMIT 1", (f"{ano}-01-01", f"{ano}-12-31")
+        ).fetchall()]
+        fora_do_ano = []
+        for ano in anos:
+            with _particoes_anexadas(conn, [ano], gatilhos=False):
+                fora_do_ano.extend(id_lancamento for id_lancamento, in conn.execute(
+                    f"SELECT id FROM {_tabela_lancamentos(ano)} WHERE data < ? OR data > ?",
+                    (f"{ano}-01-01", f"{ano}-12-31")
+                ))
+
+    movidos = sum(particionar_ano(ano) for ano in no_principal)
+    for id_lancamento in fora_do_ano:
+        _concluir_movimentacao(id_lancamento)
+    return movidos + len(fora_do_ano)
+
+
+def particionar_ano(ano: int) -> int:
+    """
+    Move os lançamentos de um ano encerrado para a partição do ano
+
+    Cria particoes/lancamentos_<ano>.db com a mesma tabela e os mesmos índices
+    de lancamentos (se ainda não existir) e registra o ano em particoes: daí
+    em diante, inclusões, edições e exclusões desse ano vão para a partição.
+    resumo_diario não muda (continua cobrindo o ano). A partição tem o seu
+    próprio índice de texto completo (lancamentos_fts), lido por
+    buscar_lancamentos junto com o do arquivo principal.
+
+    A cópia e a remoção são transações separadas, cada uma alterando um só
+    arquivo (com WAL, um commit que altera dois arquivos não é atômico entre
+    eles). Se a remoção não acontecer, o ano fica repetido nos dois arquivos
+    até particionar_ano ser executado de novo. Pode ser repetida a qualquer
+    momento (ex.: depois de uma carga histórica no arquivo principal).
+
+    Args:
+        ano: Ano encerrado (anterior ao ano atual)
+
+    Returns:
+        Quantidade de lançamentos movidos
+
+    Raises:
+        ValueError: Ano atual (ou futuro) ou arquivado em Parquet
+    """
+    if ano >= datetime.today().year:
+        raise ValueError(f"{ano} não está encerrado: o ano atual fica no arquivo principal")
+
+    inicio, fim = f"{ano}-01-01", f"{ano}-12-31"
+    caminho = _caminho_particao(ano)
+
+    with get_db_connection() as conn:
+        if conn.execute("SELECT 1 FROM anos_arquivados WHERE ano = ?", (ano,)).fetchall():
+            raise ValueError(f"{ano} está arquivado em Parquet (arquivo_anual)")
+
+        tabela = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'lancamentos'").fetchone()[0]
+        indices = [sql for sql, in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'lancamentos' AND sql IS NOT NULL"
+        )]
+
+        os.makedirs(diretorio_particoes(), exist_ok=True)
+        particao = sqlite3.connect(caminho)
+        try:
+            particao.execute("PRAGMA journal_mode=WAL")
+            # IDs vêm da sequência do arquivo principal (_reservar_ids): sem AUTOINCREMENT
+            particao.execute(re.sub(r"^CREATE TABLE\s+", "CREATE TABLE IF NOT EXISTS ", tabela).replace(" AUTOINCREMENT", ""))
+            for sql in indices:
+                particao.execute(re.sub(r"^CREATE (UNIQUE )?INDEX\s+", r"CREATE \1INDEX IF NOT EXISTS ", sql))
+            # Índice de texto completo próprio, mantido pelos gatilhos do arquivo
+            # (também quando anexado); partições anteriores a ele são indexadas agora
+            tinha_fts = particao.execute("SELECT 1 FROM sqlite_master WHERE name = 'lancamentos_fts'").fetchall()
+            particao.execute(SQL_CRIAR_FTS)
+            if not tinha_fts:
+                particao.execute("INSERT INTO lancamentos_fts (lancamentos_fts) VALUES ('rebuild')")
+            for ddl in GATILHOS_FTS.values():
+                particao.execute(ddl)
+            particao.commit()
+        finally:
+            particao.close()
+
+        with _particoes_anexadas(conn, [ano], gatilhos=False):
+            destino = _tabela_lancamentos(ano)
+
+            # 1) Cópia: só a partição é alterada
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(f'''
+                INSERT OR IGNORE INTO {destino} ({_COLUNAS_PARTICAO})
+                SELECT {_COLUNAS_PARTICAO} FROM main.lancamentos WHERE data BETWEEN ? AND ?
+            ''', (inicio, fim))
+            conn.commit()
+
+            # 2) Remoção e registro: só o arquivo principal é alterado (o resumo fica como está)
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DROP TRIGGER IF EXISTS trg_lancamentos_resumo_delete")
+            movidos = conn.execute(f'''
+                DELETE FROM main.lancamentos
+                WHERE data BETWEEN ? AND ? AND id IN (SELECT id FROM {destino})
+            ''', (inicio, fim)).rowcount
+            conn.execute(GATILHOS_RESUMO_DIARIO["trg_lancamentos_resumo_delete"])
+            conn.execute("INSERT OR IGNORE INTO particoes (ano, arquivo) VALUES (?, ?)",
+                         (ano, os.path.basename(caminho)))
+            conn.commit()
+
+    invalidar_cache()
+    return movidos
+
+
+def verificar_particoes() -> List[Tuple[int, str, int, int, str]]:
+    """
+    Confere cada partição registrada (uma por vez, com PRAGMA quick_check)
+
+    Returns:
+        Lista de (ano, caminho, lançamentos, bytes, resultado do quick_check)
+    """
+    resultados = []
+    with get_db_connection() as conn:
+        for ano in _anos_particionados(conn):
+            caminho = _caminho_particao(ano)
+            if not os.path.exists(caminho):
+                resultados.append((ano, caminho, 0, 0, "arquivo não encontrado"))
+                continue
+            with _particoes_anexadas(conn, [ano], gatilhos=False):
+                esquema = _esquema_particao(ano)
+                verificacao = conn.execute(f"PRAGMA {esquema}.quick_check").fetchall()
+                linhas = conn.execute(f"SELECT COUNT(*) FROM {esquema}.lancamentos").fetchall()[0][0]
+            resultados.append((ano, caminho, linhas, os.path.getsize(caminho),
+                               "; ".join(resultado for resultado, in verificacao)))
+    return resultados
 
 
 def init_db():
@@ -25,7 +908,8 @@ def init_db():
     - id: Identificador único auto-incrementado
     - data: Data do lançamento
     - nome: Nome do contribuinte
-    - valor: Valor da contribuição
+    - valor: Valor da contribuição em reais (REAL, mantido por compatibilidade)
+    - valor_centavos: Valor exato em centavos (INTEGER, criado pela migração 2)
     - tipo: Tipo de pagamento (Dinheiro, Cartão, etc)
     - categoria: Categoria da contribuição (Dízimo, Oferta, Visitante)
     - usuario: Usuário que registrou o lançamento
@@ -54,19 +938,57 @@ def init_db():
             )
         ''')
         conn.commit()
+        
+        # Índices e demais alterações de esquema versionadas
+        aplicar_migracoes(conn)
+
+
+def garantir_banco_inicializado():
+    """
+    Executa init_db uma única vez por processo
+
+    O Streamlit reexecuta o script a cada interação; esta função evita que cada
+    rerun abra uma conexão, rode DDL e faça commit. É segura entre threads
+    (sessões simultâneas): apenas a primeira chamada executa init_db.
+    """
+    global _banco_inicializado
+    
+    if _banco_inicializado:
+        return
+    
+    with _lock_inicializacao:
+        if not _banco_inicializado:
+            init_db()
+            _banco_inicializado = True
 
 
-def adicionar_lancamento(data: str, nome: str, valor: float, tipo: str, 
+def adicionar_lancamento(data: str, nome: str, valor_centavos: int, tipo: str, 
                         categoria: str, usuario: str, email: str = None,
                         telefone: str = None, codigo_area: str = None, 
-                        celular: str = None, operadora: str = None) -> bool:
+                        celular: str = None, operadora: str = None,
+                        enviar_whatsapp: bool = False) -> bool:
     """
     Adiciona um novo lançamento ao banco de dados
     
+    Com enviar_whatsapp, a confirmação é colocada na fila (outbox) na mesma
+    transação; o envio acontece depois, em segundo plano (outbox_worker.py).
+    
+    Em um ano particionado, o lançamento vai para a partição e o resumo
+    diário e a outbox ficam no arquivo principal. Com WAL, esse commit não
+    é atômico entre os dois arquivos: uma queda durante o commit pode deixar
+    resumo_diario diferente dos lançamentos (python manutencao_banco.py
+    reparar-particoes confere e reconstrói) ou uma confirmação sem
+    lançamento (o worker a cancela). O ID é reservado antes, em transação
+    própria, para nunca se repetir entre os arquivos. A partição do ano é
+    conferida de novo com a escrita reservada (BEGIN IMMEDIATE): se
+    particionar_ano registrou o ano nesse meio tempo, a rota é refeita.
+    
+    Datas de anos arquivados em Parquet são recusadas (_recusar_anos_arquivados).
+    
     Args:
         data: Data do lançamento no formato YYYY-MM-DD
         nome: Nome do contribuinte
-        valor: Valor da contribuição
+        valor_centavos: Valor da contribuição em centavos
         tipo: Tipo de pagamento
         categoria: Categoria da contribuição
         usuario: Usuário que está registrando
@@ -75,6 +997,7 @@ def adicionar_lancamento(data: str, nome: str, valor: float, tipo: str,
         codigo_area: Código de área do celular (compatibilidade)
         celular: Número do celular sem DDD (compatibilidade)
         operadora: Operadora do celular (compatibilidade)
+        enviar_whatsapp: Enfileira a confirmação por WhatsApp para o telefone
     
     Returns:
         True se adicionado com sucesso, False caso contrário
@@ -89,24 +1012,265 @@ def adicionar_lancamento(data: str, nome: str, valor: float, tipo: str,
                 codigo_area = numeros[:2]
                 celular = numeros[2:]
         
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO lancamentos 
-                (data, nome, valor, tipo, categoria, usuario, email, codigo_area, celular, operadora) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (data, nome, valor, tipo, categoria, usuario, email, codigo_area, celular, operadora))
-            conn.commit()
-        return True
+        def inserir(conn):
+            _recusar_anos_arquivados(conn, [int(data[:4])])
+            # Com a escrita reservada (imediata), particionar_ano não muda a rota até o commit
+            if _particao_da_data(conn, data) != ano:
+                raise _RotaAlterada()
+            cursor = conn.execute(f'''
+                INSERT INTO {_tabela_lancamentos(ano)} 
+                (id, data, nome, valor, valor_centavos, tipo, categoria, usuario, email, codigo_area, celular, operadora) 
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (id_lancamento, data, nome, valor_centavos / 100, valor_centavos, tipo, categoria, usuario,
+                  email, codigo_area, celular, operadora))
+            
+            if enviar_whatsapp and telefone:
+                conn.execute(
+                    "INSERT INTO outbox (lancamento_id, telefone, proxima_tentativa) VALUES (?, ?, ?)",
+                    (cursor.lastrowid, telefone, time.time())
+                )
+        
+        for _ in range(_TENTATIVAS_ROTA):
+            # Ano com partição própria: grava no arquivo do ano, com ID da sequência
+            # principal reservado antes, em transação só do arquivo principal
+            with get_db_connection() as conn:
+                ano = _particao_da_data(conn, data)
+            id_lancamento = _executar_transacao(lambda conn: _reservar_ids(conn, 1)[0]) if ano is not None else None
+
+            try:
+                _executar_transacao(inserir, [ano], imediata=True)
+                return True
+            except _RotaAlterada:
+                continue
+        raise _RotaAlterada(f"o arquivo do ano {data[:4]} mudou durante a gravação")
     except Exception as e:
         print(f"Erro ao adicionar lançamento: {e}")
         return False
 
 
+def adicionar_lancamentos_lote(lancamentos: List[Tuple], usuario: str) -> Optional[List[int]]:
+    """
+    Adiciona vários lançamentos em uma única transação
+
+    Todos os INSERTs saem de um executemany; as confirmações por WhatsApp
+    pedidas entram na outbox na mesma transação. Ou todos os lançamentos são
+    gravados, ou nenhum - exceto se uma queda interromper o commit de um lote
+    com anos particionados (mesma limitação de adicionar_lancamento). Um
+    lançamento em ano arquivado em Parquet recusa o lote inteiro.
+
+    Args:
+        lancamentos: Tuplas (data, nome, valor_centavos, tipo, categoria,
+            email, telefone, enviar_whatsapp), já validadas
+        usuario: Usuário que está registrando
+
+    Returns:
+        IDs dos lançamentos criados, na ordem recebida, ou None em caso de erro
+    """
+    if not lancamentos:
+        return []
+
+    linhas = []
+    for data, nome, valor_centavos, tipo, categoria, email, telefone, _ in lancamentos:
+        numeros = ''.join(filter(str.isdigit, telefone or ""))
+        codigo_area, celular = (numeros[:2], numeros[2:]) if len(numeros) >= 11 else (None, None)
+        linhas.append((data, nome, valor_centavos / 100, valor_centavos, tipo, categoria, usuario,
+                       email, codigo_area, celular))
+
+    try:
+        # Cada lançamento vai para a partição do seu ano, se houver, ou para o arquivo principal
+        with get_db_connection() as conn:
+            particionados = set(_anos_particionados(conn))
+        destinos = [int(linha[0][:4]) if int(linha[0][:4]) in particionados else None for linha in linhas]
+        # Com partições, os IDs são reservados antes (ver adicionar_lancamento)
+        reservados = (_executar_transacao(lambda conn: list(_reservar_ids(conn, len(linhas))))
+                      if any(destino is not None for destino in destinos) else None)
+
+        def inserir(conn):
+            # Com a escrita reservada (imediata), os IDs novos saem de uma vez da sequência
+            _recusar_anos_arquivados(conn, {int(linha[0][:4]) for linha in linhas})
+            ids = reservados or list(_reservar_ids(conn, len(linhas)))
+
+            for destino in dict.fromkeys(destinos):
+                conn.executemany(f'''
+                    INSERT INTO {_tabela_lancamentos(destino)}
+                    (id, data, nome, valor, valor_centavos, tipo, categoria, usuario, email, codigo_area, celular)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [(id_lancamento, *linha)
+                      for id_lancamento, linha, ano in zip(ids, linhas, destinos) if ano == destino])
+
+            agora = time.time()
+            conn.executemany(
+                "INSERT INTO outbox (lancamento_id, telefone, proxima_tentativa) VALUES (?, ?, ?)",
+                [(id_lancamento, lancamento[6], agora)
+                 for id_lancamento, lancamento in zip(ids, lancamentos) if lancamento[7] and lancamento[6]]
+            )
+            return ids
+
+        return _executar_transacao(inserir, destinos, imediata=True)
+    except Exception as e:
+        print(f"Erro ao adicionar lote de lançamentos: {e}")
+        return None
+
+
+# Gatilhos de inclusão desligados durante a carga em massa (resumo e texto
+# completo são atualizados de uma vez no fim)
+_GATILHOS_INCLUSAO = {
+    "trg_lancamentos_resumo_insert": GATILHOS_RESUMO_DIARIO["trg_lancamentos_resumo_insert"],
+    "trg_lancamentos_fts_insert": GATILHOS_FTS["trg_lancamentos_fts_insert"],
+}
+
+
+def carregar_lancamentos_em_massa(lotes: Iterable[List[Tuple]], usuario: str) -> Optional[int]:
+    """
+    Importa um grande volume de lançamentos (carga histórica)
+
+    Cada lote vai primeiro para uma tabela temporária da conexão, sem índices
+    nem gatilhos, com um commit por lote. No fim, uma única transação copia
+    tudo para lancamentos (em ordem de data) com os gatilhos de inclusão e os
+    índices secundários removidos, recria os índices, soma as linhas novas em
+    resumo_diario e no índice de texto completo e restaura os gatilhos. Uma
+    carga interrompida não deixa nenhuma linha em lancamentos.
+
+    Anos arquivados em Parquet são recusados (o arquivo do ano é fechado).
+    Linhas de anos particionados são movidas para a partição do ano depois
+    da carga (particionar_ano); se a mudança falhar, ficam no arquivo
+    principal, continuam nas leituras e são movidas na próxima execução.
+
+    Args:
+        lotes: Iterável de listas de tuplas (data, nome, valor_centavos, tipo,
+            categoria, email, codigo_area, celular), já validadas
+        usuario: Usuário registrado nos lançamentos importados
+
+    Returns:
+        Quantidade de lançamentos importados, ou None em caso de erro do banco
+        (erros de leitura dos lotes são propagados, sem gravar nada)
+
+    Raises:
+        ValueError: Lançamentos em ano arquivado em Parquet (nada é gravado)
+    """
+    try:
+        with get_db_connection() as conn:
+            conn.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS importacao (
+                    data TEXT, nome TEXT, valor_centavos INTEGER, tipo TEXT,
+                    categoria TEXT, email TEXT, codigo_area TEXT, celular TEXT
+                )
+            ''')
+            conn.execute("DELETE FROM temp.importacao")
+            conn.commit()
+
+            try:
+                for lote in lotes:
+                    conn.executemany("INSERT INTO temp.importacao VALUES (?, ?, ?, ?, ?, ?, ?, ?)", lote)
+                    conn.commit()
+
+                conn.execute("BEGIN IMMEDIATE")
+                anos_carga = "SELECT DISTINCT CAST(substr(data, 1, 4) AS INTEGER) FROM temp.importacao"
+                _recusar_anos_arquivados(conn, [ano for ano, in conn.execute(anos_carga)])
+                particionados = [ano for ano, in conn.execute(
+                    f"SELECT ano FROM particoes WHERE ano IN ({anos_carga}) ORDER BY ano")]
+
+                ultimo_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM lancamentos").fetchone()[0]
+                indices = conn.execute('''
+                    SELECT name, sql FROM sqlite_master
+                    WHERE type = 'index' AND tbl_name = 'lancamentos' AND sql IS NOT NULL
+                ''').fetchall()
+
+                for nome in _GATILHOS_INCLUSAO:
+                    conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+                for nome, _ in indices:
+                    conn.execute(f"DROP INDEX {nome}")
+
+                importados = conn.execute('''
+                    INSERT INTO lancamentos
+                    (data, nome, valor, valor_centavos, tipo, categoria, usuario, email, codigo_area, celular)
+                    SELECT data, nome, valor_centavos / 100.0, valor_centavos, tipo, categoria, ?,
+                           email, codigo_area, celular
+                    FROM temp.importacao
+                    ORDER BY data
+                ''', (usuario,)).rowcount
+
+                for _, sql in indices:
+                    conn.execute(sql)
+
+                conn.execute('''
+                    INSERT INTO resumo_diario (data, categoria, tipo, usuario, total, quantidade)
+                    SELECT data, categoria, tipo, usuario, SUM(valor_centavos), COUNT(*)
+                    FROM lancamentos
+                    WHERE id > ?
+                    GROUP BY data, categoria, tipo, usuario
+                    ON CONFLICT (data, categoria, tipo, usuario) DO UPDATE SET
+                        total = total + excluded.total,
+                        quantidade = quantidade + excluded.quantidade
+                ''', (ultimo_id,))
+                conn.execute('''
+                    INSERT INTO lancamentos_fts (rowid, nome, email, celular)
+                    SELECT id, nome, email, celular FROM lancamentos WHERE id > ?
+                ''', (ultimo_id,))
+
+                for sql in _GATILHOS_INCLUSAO.values():
+                    conn.execute(sql)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                conn.execute("DROP TABLE IF EXISTS temp.importacao")
+                conn.commit()
+
+        invalidar_cache()
+    except sqlite3.Error as e:
+        print(f"Erro na carga em massa de lançamentos: {e}")
+        return None
+
+    # Anos particionados: as linhas novas seguem para o arquivo do ano (como em adicionar_lancamento)
+    for ano in particionados:
+        try:
+            particionar_ano(ano)
+        except (ValueError, OSError, sqlite3.Error) as e:
+            print(f"⚠️ Lançamentos de {ano} ficaram no arquivo principal ({e}). "
+                  f"Execute: python manutencao_banco.py particionar {ano}")
+    return importados
+
+
+# Consultas de leitura frequentes - mantidas em constantes para que
+# verificar_planos_consulta analise exatamente o SQL usado pela aplicação
+# O índice 3 das tuplas retornadas é sempre o valor em centavos (int)
+_COLUNAS_USUARIO = "id, data, nome, valor_centavos, tipo, categoria, email, codigo_area, celular, operadora"
+_COLUNAS_ADMIN = "id, data, nome, valor_centavos, tipo, categoria, usuario, email, codigo_area, celular, operadora"
+
+# Nomes das colunas das tuplas acima (para montar DataFrames)
+NOMES_COLUNAS_USUARIO = tuple(_COLUNAS_USUARIO.split(", "))
+NOMES_COLUNAS_ADMIN = tuple(_COLUNAS_ADMIN.split(", "))
+
+_SQL_LANCAMENTOS_USUARIO = f'''
+    SELECT {_COLUNAS_USUARIO}
+    FROM lancamentos 
+    WHERE usuario = ? 
+    ORDER BY data DESC, id DESC
+'''
+
+_SQL_LANCAMENTOS_TODOS = f'''
+    SELECT {_COLUNAS_ADMIN}
+    FROM lancamentos 
+    ORDER BY data DESC, id DESC
+'''
+
+_SQL_LANCAMENTO_POR_ID = f'''
+    SELECT {_COLUNAS_ADMIN}
+    FROM lancamentos 
+    WHERE id = ?
+'''
+
+
+@_em_cache
 def obter_lancamentos(usuario: Optional[str] = None, nivel_acesso: str = "visualizador") -> List[Tuple]:
     """
     Obtém lançamentos do banco de dados com base no usuário e nível de acesso
     
+    Com partições anuais ou anos arquivados em Parquet, as linhas vêm de
+    iterar_lancamentos (mesma ordem, todos os arquivos).
+    
     Args:
         usuario: Nome de usuário para filtrar (opcional)
         nivel_acesso: Nível de acesso do usuário (visualizador, editor, admin)
@@ -115,76 +1279,681 @@ def obter_lancamentos(usuario: Optional[str] = None, nivel_acesso: str = "visual
         Lista de tuplas com os dados dos lançamentos
     """
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        
-        if usuario and nivel_acesso != "admin":
-            cursor.execute('''
-                SELECT id, data, nome, valor, tipo, categoria, email, codigo_area, celular, operadora
-                FROM lancamentos 
-                WHERE usuario = ? 
-                ORDER BY data DESC, id DESC
-            ''', (usuario,))
+        if not conn.execute("SELECT 1 FROM particoes UNION ALL SELECT 1 FROM anos_arquivados LIMIT 1").fetchall():
+            cursor = conn.cursor()
+            
+            if usuario and nivel_acesso != "admin":
+                cursor.execute(_SQL_LANCAMENTOS_USUARIO, (usuario,))
+            else:
+                cursor.execute(_SQL_LANCAMENTOS_TODOS)
+            
+            return cursor.fetchall()
+
+    return list(iterar_lancamentos(usuario, nivel_acesso))
+
+
+def _sql_lancamentos_filtrados(usuario: Optional[str], nivel_acesso: str, data_inicio: Optional[str],
+                               data_fim: Optional[str], categorias: Optional[Tuple[str, ...]],
+                               tabela: str = "lancamentos") -> Tuple[str, dict]:
+    """Monta o SQL e os parâmetros de iterar_lancamentos (visibilidade de obter_lancamentos + filtros)"""
+    colunas = _COLUNAS_USUARIO if usuario and nivel_acesso != "admin" else _COLUNAS_ADMIN
+
+    filtro, params = _filtro_usuario(usuario, nivel_acesso)
+    condicoes = [filtro[len("WHERE "):]] if filtro else []
+
+    if data_inicio:
+        condicoes.append("data >= :data_inicio")
+        params["data_inicio"] = data_inicio
+
+    if data_fim:
+        condicoes.append("data <= :data_fim")
+        params["data_fim"] = data_fim
+
+    if categorias:
+        nomes = [f":categoria{posicao}" for posicao in range(len(categorias))]
+        condicoes.append(f"categoria IN ({', '.join(nomes)})")
+        params.update(zip((nome[1:] for nome in nomes), categorias))
+
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+
+    sql = f'''
+        SELECT {colunas}
+        FROM {tabela}
+        {where}
+        ORDER BY data DESC, id DESC
+    '''
+    return sql, params
+
+
+def iterar_lancamentos(usuario: Optional[str] = None, nivel_acesso: str = "visualizador",
+                       tamanho_lote: int = 1000, data_inicio: Optional[str] = None,
+                       data_fim: Optional[str] = None, categorias: Optional[Tuple[str, ...]] = None
+                       ) -> Iterator[Tuple]:
+    """
+    Percorre os lançamentos sem carregar a tabela inteira na memória
+
+    Mesmas linhas e ordem de obter_lancamentos, lidas em lotes (fetchmany).
+    Usado com totais.AgregadorTotais para agregar em uma única passada e
+    pela exportação em CSV (exportar_lancamentos).
+
+    Os anos com partição própria que cruzam o período são anexados e lidos
+    pela visão UNION ALL (_particoes_anexadas); os arquivados em Parquet
+    (arquivo_anual) também são lidos, intercalados na mesma ordem.
+
+    Args:
+        usuario: Nome de usuário para filtrar (opcional)
+        nivel_acesso: Nível de acesso do usuário (visualizador, editor, admin)
+        tamanho_lote: Linhas lidas do banco por vez
+        data_inicio: Data inicial no formato YYYY-MM-DD (inclusive)
+        data_fim: Data final no formato YYYY-MM-DD (inclusive)
+        categorias: Apenas estas categorias (padrão: todas)
+
+    Yields:
+        Tuplas com os dados dos lançamentos
+    """
+    with get_db_connection() as conn:
+        arquivos = _arquivos_no_periodo(conn, data_inicio, data_fim)
+        anos = _anos_particionados(conn, data_inicio, data_fim)
+
+        def ler_sqlite():
+            # Faixas em ordem de data decrescente: concatenadas, mantêm a ordem
+            for grupo, inicio, fim in _segmentos_particoes(anos, data_inicio, data_fim):
+                with _particoes_anexadas(conn, grupo, gatilhos=False):
+                    sql, params = _sql_lancamentos_filtrados(
+                        usuario, nivel_acesso, inicio, fim, categorias, _tabela_leitura(grupo)
+                    )
+                    cursor = conn.execute(sql, params)
+                    try:
+                        while True:
+                            linhas = cursor.fetchmany(tamanho_lote)
+                            if not linhas:
+                                break
+                            yield from linhas
+                    finally:
+                        cursor.close()
+
+        linhas = ler_sqlite()
+        try:
+            if not arquivos:
+                yield from linhas
+                return
+
+            arquivados = _ler_arquivados(arquivos, usuario, nivel_acesso, data_inicio, data_fim,
+                                         categorias=categorias, tamanho_lote=tamanho_lote)
+            yield from heapq.merge(linhas, arquivados, key=lambda linha: (linha[1], linha[0]), reverse=True)
+        finally:
+            # Desanexa as partições antes de a conexão voltar ao pool
+            linhas.close()
+
+
+def obter_lancamentos_dataframe(usuario: Optional[str] = None, nivel_acesso: str = "visualizador"):
+    """
+    Lê os lançamentos direto do cursor para um DataFrame (pd.read_sql)
+
+    Mesmas linhas e ordem de obter_lancamentos, mas em colunas, sem criar
+    uma tupla Python por lançamento. Para análises e exportações grandes;
+    pandas é importado apenas aqui. Com anos arquivados em Parquet, as
+    linhas vêm de iterar_lancamentos.
+
+    Args:
+        usuario: Nome de usuário para filtrar (opcional)
+        nivel_acesso: Nível de acesso do usuário (visualizador, editor, admin)
+
+    Returns:
+        DataFrame com as colunas de NOMES_COLUNAS_ADMIN ou NOMES_COLUNAS_USUARIO
+    """
+    import pandas as pd
+
+    with get_db_connection() as conn:
+        arquivados = bool(_arquivos_no_periodo(conn, None, None))
+        anos = _anos_particionados(conn)
+        if anos and not arquivados:
+            partes = []
+            for grupo, inicio, fim in _segmentos_particoes(anos, None, None):
+                with _particoes_anexadas(conn, grupo, gatilhos=False):
+                    sql, params = _sql_lancamentos_filtrados(usuario, nivel_acesso, inicio, fim, None,
+                                                             _tabela_leitura(grupo))
+                    partes.append(pd.read_sql(sql, conn, params=params))
+            return pd.concat(partes, ignore_index=True)
+
+        if not arquivados:
+            if usuario and nivel_acesso != "admin":
+                return pd.read_sql(_SQL_LANCAMENTOS_USUARIO, conn, params=(usuario,))
+            return pd.read_sql(_SQL_LANCAMENTOS_TODOS, conn)
+
+    colunas = NOMES_COLUNAS_USUARIO if usuario and nivel_acesso != "admin" else NOMES_COLUNAS_ADMIN
+    return pd.DataFrame.from_records(iterar_lancamentos(usuario, nivel_acesso), columns=list(colunas))
+
+
+def _sql_pagina(usuario: Optional[str], nivel_acesso: str,
+                cursor_pagina: Optional[Tuple[str, int]], tamanho_pagina: int,
+                direcao: str, data_inicio: Optional[str] = None, data_fim: Optional[str] = None,
+                tabela: str = "lancamentos") -> Tuple[str, dict]:
+    """Monta o SQL e os parâmetros de obter_lancamentos_pagina (data_inicio/data_fim: faixa de partições)"""
+    if direcao not in ("proxima", "anterior"):
+        raise ValueError(f"Direção inválida: {direcao}")
+
+    colunas = _COLUNAS_USUARIO if usuario and nivel_acesso != "admin" else _COLUNAS_ADMIN
+
+    filtro, params = _filtro_usuario(usuario, nivel_acesso)
+    condicoes = [filtro[len("WHERE "):]] if filtro else []
+
+    if direcao == "proxima":
+        ordem = "data DESC, id DESC"
+        if cursor_pagina:
+            condicoes.append("(data, id) < (:cursor_data, :cursor_id)")
+    else:
+        ordem = "data ASC, id ASC"
+        if cursor_pagina:
+            condicoes.append("(data, id) > (:cursor_data, :cursor_id)")
+
+    if cursor_pagina:
+        params["cursor_data"], params["cursor_id"] = cursor_pagina
+
+    if data_inicio:
+        condicoes.append("data >= :data_inicio")
+        params["data_inicio"] = data_inicio
+
+    if data_fim:
+        condicoes.append("data <= :data_fim")
+        params["data_fim"] = data_fim
+
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    params["limite"] = tamanho_pagina + 1
+
+    sql = f'''
+        SELECT {colunas}
+        FROM {tabela}
+        {where}
+        ORDER BY {ordem}
+        LIMIT :limite
+    '''
+    return sql, params
+
+
+@_em_cache
+def obter_lancamentos_pagina(usuario: Optional[str] = None, nivel_acesso: str = "visualizador",
+                             cursor_pagina: Optional[Tuple[str, int]] = None,
+                             tamanho_pagina: int = 50,
+                             direcao: str = "proxima") -> Tuple[List[Tuple], bool]:
+    """
+    Obtém uma página de lançamentos usando paginação por cursor (keyset)
+
+    A ordenação é a mesma de obter_lancamentos (data DESC, id DESC). Em vez de
+    OFFSET, a consulta parte do cursor (data, id) de uma linha já exibida, de
+    modo que o custo depende apenas do tamanho da página.
+
+    Com partições anuais, as faixas de anos do lado pedido do cursor são
+    lidas em ordem (decrescente em "proxima", crescente em "anterior") até
+    completar a página. Os anos arquivados em Parquet que ainda podem entrar
+    na página (entre o cursor e a última linha lida do SQLite) são lidos
+    depois e intercalados.
+
+    Args:
+        usuario: Nome de usuário para filtrar (opcional)
+        nivel_acesso: Nível de acesso do usuário (visualizador, editor, admin)
+        cursor_pagina: Tupla (data, id) de referência; None para a primeira página
+        tamanho_pagina: Quantidade máxima de lançamentos retornados
+        direcao: "proxima" (linhas após o cursor) ou "anterior" (linhas antes dele)
+
+    Returns:
+        (linhas, tem_mais): linhas na ordem de exibição e se existem mais
+        lançamentos na direção pedida
+    """
+    # O cursor limita as faixas: em "proxima" só datas até a dele, em "anterior" a partir dela
+    data_inicio = cursor_pagina[0] if cursor_pagina and direcao == "anterior" else None
+    data_fim = cursor_pagina[0] if cursor_pagina and direcao == "proxima" else None
+    linhas = []
+
+    with get_db_connection() as conn:
+        segmentos = _segmentos_particoes(_anos_particionados(conn, data_inicio, data_fim), data_inicio, data_fim)
+        if direcao == "anterior":
+            segmentos.reverse()
+
+        for grupo, inicio, fim in segmentos:
+            with _particoes_anexadas(conn, grupo, gatilhos=False):
+                sql, params = _sql_pagina(usuario, nivel_acesso, cursor_pagina, tamanho_pagina - len(linhas),
+                                          direcao, inicio, fim, _tabela_leitura(grupo))
+                linhas.extend(conn.execute(sql, params).fetchall())
+            if len(linhas) > tamanho_pagina:
+                break
+
+        # Com a página cheia, arquivos além da linha que sobra não mudam a página
+        sobra = linhas[tamanho_pagina][1] if len(linhas) > tamanho_pagina else None
+        if direcao == "proxima":
+            arquivos = _arquivos_no_periodo(conn, sobra, data_fim)
         else:
-            cursor.execute('''
-                SELECT id, data, nome, valor, tipo, categoria, usuario, email, codigo_area, celular, operadora
-                FROM lancamentos 
-                ORDER BY data DESC, id DESC
-            ''')
-        
-        return cursor.fetchall()
+            arquivos = _arquivos_no_periodo(conn, data_inicio, sobra)
+
+    if arquivos:
+        def chave(linha):
+            return linha[1], linha[0]
+
+        if direcao == "proxima":
+            arquivados = (linha for linha in _ler_arquivados(arquivos, usuario, nivel_acesso, sobra, data_fim)
+                          if not cursor_pagina or chave(linha) < tuple(cursor_pagina))
+            linhas = list(itertools.islice(heapq.merge(linhas, arquivados, key=chave, reverse=True),
+                                           tamanho_pagina + 1))
+        else:
+            # Cada arquivo está em ordem decrescente: lidos do ano mais antigo ao mais recente,
+            # os seguintes não entram na página depois que um arquivo a completa
+            arquivados = []
+            for arquivo in reversed(arquivos):
+                arquivados.extend(
+                    linha for linha in _ler_arquivados([arquivo], usuario, nivel_acesso, data_inicio, sobra)
+                    if not cursor_pagina or chave(linha) > tuple(cursor_pagina)
+                )
+                if len(arquivados) > tamanho_pagina:
+                    break
+            arquivados = heapq.nsmallest(tamanho_pagina + 1, arquivados, key=chave)
+            linhas = list(heapq.merge(linhas, arquivados, key=chave))[:tamanho_pagina + 1]
+
+    tem_mais = len(linhas) > tamanho_pagina
+    linhas = linhas[:tamanho_pagina]
+    if direcao == "anterior":
+        linhas.reverse()
+
+    return linhas, tem_mais
+
+
+def _sql_pesquisa(nome: Optional[str], data_inicio: Optional[str], data_fim: Optional[str],
+                  valor_centavos: Optional[int], id_lancamento: Optional[int],
+                  limite: int, tabela: str = "lancamentos") -> Tuple[str, dict]:
+    """Monta o SQL e os parâmetros de pesquisar_lancamentos"""
+    condicoes = []
+    params = {"limite": limite}
+
+    if id_lancamento is not None:
+        condicoes.append("id = :id")
+        params["id"] = id_lancamento
+
+    if nome:
+        # Prefixo com % e _ escapados - usa o índice nome COLLATE NOCASE
+        prefixo = nome.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        condicoes.append("nome LIKE :nome ESCAPE '\\'")
+        params["nome"] = f"{prefixo}%"
+
+    if data_inicio:
+        condicoes.append("data >= :data_inicio")
+        params["data_inicio"] = data_inicio
+
+    if data_fim:
+        condicoes.append("data <= :data_fim")
+        params["data_fim"] = data_fim
+
+    if valor_centavos is not None:
+        condicoes.append("valor_centavos = :valor_centavos")
+        params["valor_centavos"] = valor_centavos
+
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    ordem = "nome COLLATE NOCASE, id" if nome else "data DESC, id DESC"
+
+    sql = f'''
+        SELECT id, data, nome, valor_centavos
+        FROM {tabela}
+        {where}
+        ORDER BY {ordem}
+        LIMIT :limite
+    '''
+    return sql, params
+
+
+# COLLATE NOCASE do SQLite: apenas as letras ASCII são igualadas
+_NOCASE = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+@_em_cache
+def pesquisar_lancamentos(nome: Optional[str] = None, data_inicio: Optional[str] = None,
+                          data_fim: Optional[str] = None, valor_centavos: Optional[int] = None,
+                          id_lancamento: Optional[int] = None, limite: int = 20) -> List[Tuple]:
+    """
+    Pesquisa lançamentos por nome, período, valor e/ou ID (consulta indexada)
+
+    Retorna apenas as colunas necessárias para escolher um lançamento; o
+    registro completo deve ser lido depois com obter_lancamento_por_id.
+    Inclui as partições anuais e os anos arquivados em Parquet que cruzam o
+    período (todos, sem período); os arquivados não podem ser editados
+    (anos_arquivados).
+
+    Args:
+        nome: Início do nome do contribuinte (sem diferenciar maiúsculas)
+        data_inicio: Data inicial no formato YYYY-MM-DD (inclusive)
+        data_fim: Data final no formato YYYY-MM-DD (inclusive)
+        valor_centavos: Valor exato em centavos
+        id_lancamento: ID exato do lançamento
+        limite: Máximo de resultados retornados
+
+    Returns:
+        Lista de tuplas (id, data, nome, valor_centavos)
+    """
+    resultados = []
+
+    with get_db_connection() as conn:
+        segmentos = _segmentos_particoes(_anos_particionados(conn, data_inicio, data_fim), data_inicio, data_fim)
+        for grupo, inicio, fim in segmentos:
+            with _particoes_anexadas(conn, grupo, gatilhos=False):
+                sql, params = _sql_pesquisa(nome, inicio, fim, valor_centavos, id_lancamento, limite,
+                                            _tabela_leitura(grupo))
+                resultados.extend(conn.execute(sql, params).fetchall())
+            if not nome and len(resultados) >= limite:
+                break  # Faixas em ordem de data decrescente: as seguintes são mais antigas
+        arquivos = _arquivos_no_periodo(conn, data_inicio, data_fim)
+
+    if arquivos:
+        arquivados = _ler_arquivados(arquivos, None, "admin", data_inicio, data_fim,
+                                     ("id", "data", "nome", "valor_centavos"), nome=nome,
+                                     valor_centavos=valor_centavos, id_lancamento=id_lancamento)
+        if nome:
+            resultados.extend(heapq.nsmallest(
+                limite, arquivados, key=lambda linha: (linha[2].translate(_NOCASE), linha[0])
+            ))
+        else:
+            # Já em ordem de data decrescente: bastam as primeiras
+            resultados.extend(itertools.islice(arquivados, limite))
+            resultados.sort(key=lambda linha: (linha[1], linha[0]), reverse=True)
+
+    if nome and (len(segmentos) > 1 or arquivos):
+        resultados.sort(key=lambda linha: (linha[2].translate(_NOCASE), linha[0]))
+    return resultados[:limite]
+
+
+def _consulta_fts(texto: str) -> str:
+    """
+    Converte o texto digitado em uma consulta FTS5 segura
+
+    Cada palavra vira um prefixo entre aspas ("joa"*), e todas precisam
+    aparecer (AND implícito). Operadores digitados pelo usuário são ignorados.
+    """
+    palavras = re.findall(r"\w+", texto)
+    return " ".join(f'"{palavra}"*' for palavra in palavras)
+
+
+def _sql_busca_texto(consulta: str, limite: int, usuario: Optional[str],
+                     nivel_acesso: str, esquemas: Optional[List[str]] = None) -> Tuple[str, dict]:
+    """
+    Monta o SQL e os parâmetros de buscar_lancamentos
+
+    Com esquemas (arquivo principal e partições anexadas), consulta o índice
+    de texto completo de cada arquivo e junta os resultados (UNION ALL) em
+    ordem de data e ID decrescentes: o rank de um índice não se compara com
+    o de outro.
+    """
+    colunas = _COLUNAS_USUARIO if usuario and nivel_acesso != "admin" else _COLUNAS_ADMIN
+    filtro, params = _filtro_usuario(usuario, nivel_acesso)
+
+    if esquemas is None:
+        sql = f'''
+            WITH encontrados AS (
+                SELECT rowid AS id_encontrado, rank
+                FROM lancamentos_fts
+                WHERE lancamentos_fts MATCH :consulta
+            )
+            SELECT {colunas}
+            FROM encontrados
+            JOIN lancamentos ON lancamentos.id = encontrados.id_encontrado
+            {filtro}
+            ORDER BY encontrados.rank, data DESC, id DESC
+            LIMIT :limite
+        '''
+        return sql, {"consulta": consulta, "limite": limite, **params}
+
+    # MATCH usa o nome da tabela sem o esquema (o FROM já escolhe o arquivo). CROSS JOIN
+    # mantém o índice de texto na frente: com JOIN, o planejador pode percorrer os
+    # lançamentos do usuário e executar o MATCH uma vez para cada um
+    partes = [f'''
+            SELECT {colunas}
+            FROM (
+                SELECT rowid AS id_encontrado
+                FROM {esquema}.lancamentos_fts
+                WHERE lancamentos_fts MATCH :consulta
+            ) AS encontrados
+            CROSS JOIN {esquema}.lancamentos ON {esquema}.lancamentos.id = encontrados.id_encontrado
+            {filtro}
+        ''' for esquema in esquemas]
+    sql = f'''
+        SELECT * FROM ({' UNION ALL '.join(partes)})
+        ORDER BY data DESC, id DESC
+        LIMIT :limite
+    '''
+    return sql, {"consulta": consulta, "limite": limite, **params}
+
+
+@_em_cache
+def buscar_lancamentos(texto: str, limite: int = 100, usuario: Optional[str] = None,
+                       nivel_acesso: str = "visualizador") -> List[Tuple]:
+    """
+    Busca lançamentos por contribuinte usando o índice FTS5
+
+    Procura em nome, email e celular, sem diferenciar maiúsculas nem acentos
+    ("Joao" encontra "João"). Cada palavra é tratada como prefixo. Os anos
+    com partição própria são procurados no índice de cada partição, em
+    grupos de até PARTICOES_POR_CONSULTA arquivos anexados; os anos
+    arquivados em Parquet, sem índice, pelas mesmas palavras nas colunas
+    (arquivo_anual.iterar_arquivados). Com partições ou anos arquivados, os
+    resultados vêm por data (a relevância só vale dentro de um arquivo).
+
+    Args:
+        texto: Texto digitado na busca
+        limite: Máximo de resultados
+        usuario: Nome de usuário para filtrar (opcional)
+        nivel_acesso: Nível de acesso do usuário (visualizador, editor, admin)
+
+    Returns:
+        Lista de tuplas no mesmo formato de obter_lancamentos, das mais
+        relevantes para as menos relevantes (com partições ou anos
+        arquivados, das mais recentes para as mais antigas)
+    """
+    consulta = _consulta_fts(texto)
+    if not consulta:
+        return []
+
+    with get_db_connection() as conn:
+        anos = _anos_particionados(conn)
+        arquivos = _arquivos_no_periodo(conn, None, None)
+        if not anos and not arquivos:
+            sql, params = _sql_busca_texto(consulta, limite, usuario, nivel_acesso)
+            return conn.execute(sql, params).fetchall()
+
+        encontrados = []
+        for posicao, (grupo, _, _) in enumerate(_segmentos_particoes(anos, None, None)):
+            # O arquivo principal entra só no primeiro grupo
+            esquemas = (["main"] if posicao == 0 else []) + [_esquema_particao(ano) for ano in grupo]
+            with _particoes_anexadas(conn, grupo, gatilhos=False):
+                sql, params = _sql_busca_texto(consulta, limite, usuario, nivel_acesso, esquemas)
+                encontrados.extend(conn.execute(sql, params).fetchall())
+
+    if arquivos:
+        # Já em ordem de data decrescente: bastam os primeiros
+        encontrados.extend(itertools.islice(
+            _ler_arquivados(arquivos, usuario, nivel_acesso, palavras=re.findall(r"\w+", texto)), limite
+        ))
+
+    # Mesma ordem do SQL entre os grupos: data e ID decrescentes
+    encontrados.sort(key=lambda linha: (linha[1], linha[0]), reverse=True)
+    return encontrados[:limite]
+
+
+def _filtro_usuario(usuario: Optional[str], nivel_acesso: str) -> Tuple[str, dict]:
+    """
+    Monta a cláusula WHERE de visibilidade usada pelas consultas de leitura
+
+    Mesma regra de obter_lancamentos: admin vê tudo, demais níveis
+    veem apenas os lançamentos que registraram.
+    """
+    if usuario and nivel_acesso != "admin":
+        return "WHERE usuario = :usuario", {"usuario": usuario}
+    return "", {}
+
+
+def _sql_totais(usuario: Optional[str], nivel_acesso: str,
+                hoje: str, mes: str) -> Tuple[str, dict]:
+    """
+    Monta o SQL e os parâmetros de obter_totais
+
+    Lê a tabela resumo_diario (mantida por gatilhos), que tem uma linha por
+    dia/categoria/tipo/usuário - muito menor que lancamentos - e os totais
+    mensais dos anos arquivados em Parquet (resumo_arquivado). O mês
+    (YYYY-MM) de resumo_arquivado nunca é igual a :hoje nem ao mês atual.
+    """
+    filtro, params = _filtro_usuario(usuario, nivel_acesso)
+
+    sql = f'''
+        SELECT
+            COALESCE(SUM(total), 0),
+            COALESCE(SUM(CASE WHEN data = :hoje THEN total END), 0),
+            COALESCE(SUM(CASE WHEN substr(data, 1, 7) = :mes THEN total END), 0),
+            COALESCE(SUM(CASE WHEN categoria = 'Dízimo' THEN total END), 0),
+            COALESCE(SUM(CASE WHEN categoria = 'Oferta' THEN total END), 0),
+            COALESCE(SUM(CASE WHEN categoria = 'Visitante' THEN total END), 0),
+            COALESCE(SUM(CASE WHEN substr(data, 1, 7) = :mes AND categoria = 'Dízimo' THEN total END), 0),
+            COALESCE(SUM(CASE WHEN substr(data, 1, 7) = :mes AND categoria = 'Oferta' THEN total END), 0),
+            COALESCE(SUM(CASE WHEN substr(data, 1, 7) = :mes AND categoria = 'Visitante' THEN total END), 0)
+        FROM (
+            SELECT data, categoria, usuario, total FROM resumo_diario
+            UNION ALL
+            SELECT mes, categoria, usuario, total FROM resumo_arquivado
+        )
+        {filtro}
+    '''
+    return sql, {"hoje": hoje, "mes": mes, **params}
+
+
+@_em_cache
+def obter_totais(usuario: Optional[str] = None, nivel_acesso: str = "visualizador",
+                 hoje: Optional[str] = None, mes: Optional[str] = None) -> dict:
+    """
+    Calcula os totais financeiros diretamente no SQLite
+
+    Retorna o mesmo dicionário de utils.calcular_totais, mas em uma única
+    consulta agregada, sem carregar os lançamentos para o Python.
+    Os totais são somas inteiras exatas, em centavos.
+
+    Args:
+        usuario: Nome de usuário para filtrar (opcional)
+        nivel_acesso: Nível de acesso do usuário (visualizador, editor, admin)
+        hoje: Data de referência no formato YYYY-MM-DD (padrão: hoje)
+        mes: Mês de referência no formato YYYY-MM (padrão: mês atual)
+
+    Returns:
+        Dicionário com os totais calculados (em centavos)
+    """
+    hoje = hoje or datetime.today().strftime("%Y-%m-%d")
+    mes = mes or datetime.today().strftime("%Y-%m")
+    sql, params = _sql_totais(usuario, nivel_acesso, hoje, mes)
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        linha = cursor.fetchone()
+
+    chaves = (
+        "total_geral", "total_dia", "total_mes",
+        "total_dizimo_geral", "total_oferta_geral", "total_visitante_geral",
+        "total_dizimo_mes", "total_oferta_mes", "total_visitante_mes"
+    )
+    return dict(zip(chaves, linha))
 
 
 def atualizar_lancamento(id_lancamento: int, data: str, nome: str, 
-                        valor: float, tipo: str, categoria: str,
+                        valor_centavos: int, tipo: str, categoria: str,
                         email: str = None, codigo_area: str = None,
-                        celular: str = None, operadora: str = None) -> bool:
+                        celular: str = None, operadora: str = None,
+                        data_atual: Optional[str] = None) -> bool:
     """
     Atualiza um lançamento existente
     
+    Se a nova data for de um ano com outro arquivo (partição ou arquivo
+    principal), o lançamento muda de arquivo em transações de um arquivo
+    cada (_copiar_lancamento e _remover_copia). Como em adicionar_lancamento,
+    a rota é conferida de novo na transação da gravação. Uma nova data em ano
+    arquivado em Parquet é recusada.
+    
     Args:
         id_lancamento: ID do lançamento a ser atualizado
         data: Nova data do lançamento
         nome: Novo nome do contribuinte
-        valor: Novo valor da contribuição
+        valor_centavos: Novo valor da contribuição em centavos
         tipo: Novo tipo de pagamento
         categoria: Nova categoria
         email: Novo email (opcional)
         codigo_area: Novo código de área (opcional)
         celular: Novo número de celular (opcional)
         operadora: Nova operadora (opcional)
+        data_atual: Data gravada antes da edição (opcional; localiza o
+            arquivo do lançamento sem procurar nas partições)
     
     Returns:
         True se atualizado com sucesso, False caso contrário
     """
+    valores = {
+        "id": id_lancamento, "data": data, "nome": nome, "valor": valor_centavos / 100,
+        "valor_centavos": valor_centavos, "tipo": tipo, "categoria": categoria,
+        "email": email, "codigo_area": codigo_area, "celular": celular, "operadora": operadora
+    }
+
+    def gravar(conn):
+        _recusar_anos_arquivados(conn, [int(data[:4])])
+        # Com a escrita reservada (imediata), particionar_ano não muda a rota até o commit
+        if _particao_da_data(conn, data) != destino:
+            raise _RotaAlterada()
+        alterados = conn.execute(f'''
+            UPDATE {_tabela_lancamentos(origem)} 
+            SET data = :data, nome = :nome, valor = :valor, valor_centavos = :valor_centavos,
+                tipo = :tipo, categoria = :categoria, email = :email, codigo_area = :codigo_area,
+                celular = :celular, operadora = :operadora
+            WHERE id = :id
+        ''', valores).rowcount
+        # Movido para a partição do ano depois de localizado (ou excluído): localiza de novo
+        if not alterados:
+            raise _RotaAlterada()
+
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE lancamentos 
-                SET data = ?, nome = ?, valor = ?, tipo = ?, categoria = ?,
-                    email = ?, codigo_area = ?, celular = ?, operadora = ?
-                WHERE id = ?
-            ''', (data, nome, valor, tipo, categoria, email, codigo_area, celular, operadora, id_lancamento))
-            conn.commit()
+        for _ in range(_TENTATIVAS_ROTA):
+            with get_db_connection() as conn:
+                encontrado, origem = _arquivo_do_lancamento(conn, id_lancamento, data_atual)
+                destino = _particao_da_data(conn, data)
+            if not encontrado:
+                return True
+
+            try:
+                _executar_transacao(gravar, [origem], imediata=True)
+                break
+            except _RotaAlterada:
+                continue
+        else:
+            raise _RotaAlterada(f"o arquivo do lançamento {id_lancamento} mudou durante a gravação")
+
+        # A nova data pertence a outro arquivo: o lançamento muda de arquivo com o mesmo ID
+        if destino != origem:
+            _copiar_lancamento(id_lancamento, origem, destino)
+            _remover_copia(id_lancamento, origem)
         return True
     except Exception as e:
         print(f"Erro ao atualizar lançamento: {e}")
         return False
 
 
-def excluir_lancamento(id_lancamento: int) -> bool:
-    """Exclui um lançamento do banco de dados"""
+def excluir_lancamento(id_lancamento: int, data_atual: Optional[str] = None) -> bool:
+    """
+    Exclui um lançamento do banco de dados
+
+    Args:
+        id_lancamento: ID do lançamento a ser excluído
+        data_atual: Data gravada do lançamento (opcional; localiza o arquivo
+            do lançamento sem procurar nas partições)
+    """
     try:
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM lancamentos WHERE id = ?', (id_lancamento,))
-            conn.commit()
+            encontrado, origem = _arquivo_do_lancamento(conn, id_lancamento, data_atual)
+        if encontrado:
+            _remover_copia(id_lancamento, origem)
         return True
     except Exception as e:
         print(f"Erro ao excluir lançamento: {e}")
         return False
 
 
+@_em_cache
 def obter_lancamento_por_id(id_lancamento: int) -> Optional[Tuple]:
     """
     Obtém um lançamento específico pelo ID
@@ -197,9 +1966,560 @@ def obter_lancamento_por_id(id_lancamento: int) -> Optional[Tuple]:
     """
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, data, nome, valor, tipo, categoria, usuario, email, codigo_area, celular, operadora
-            FROM lancamentos 
+        cursor.execute(_SQL_LANCAMENTO_POR_ID, (id_lancamento,))
+        lancamento = cursor.fetchone()
+        if lancamento is None:
+            encontrado = _buscar_em_particoes(conn, id_lancamento)
+            lancamento = encontrado[1] if encontrado else None
+        return lancamento
+
+
+# ============================================
+# SESSÕES
+# ============================================
+
+def sessao_revogada(jti: str) -> Optional[bool]:
+    """
+    Indica se o token de sessão foi revogado ("Sair")
+
+    Lida sem o cache de leituras: uma revogação feita por outro processo
+    vale na hora. Em caso de erro retorna None (o token é recusado).
+    """
+    try:
+        with get_db_connection() as conn:
+            return bool(conn.execute("SELECT 1 FROM sessoes_revogadas WHERE jti = ?", (jti,)).fetchall())
+    except Exception as e:
+        print(f"Erro ao consultar a revogação da sessão: {e}")
+        return None
+
+
+def revogar_sessao(jti: str, expira_em: int) -> bool:
+    """
+    Revoga um token de sessão até a sua expiração
+
+    Os tokens já expirados são esquecidos na mesma transação: a tabela
+    guarda só revogações que ainda importam.
+    """
+    def revogar(conn):
+        conn.execute("DELETE FROM sessoes_revogadas WHERE expira_em < ?", (int(time.time()),))
+        conn.execute("INSERT OR IGNORE INTO sessoes_revogadas (jti, expira_em) VALUES (?, ?)", (jti, expira_em))
+
+    try:
+        _executar_transacao(revogar)
+        return True
+    except Exception as e:
+        print(f"Erro ao revogar a sessão: {e}")
+        return False
+
+
+# ============================================
+# OUTBOX DE CONFIRMAÇÕES (WHATSAPP)
+# ============================================
+
+def _dados_para_confirmacao(conn: sqlite3.Connection, ids_lancamentos: List[int]) -> Dict[int, Tuple]:
+    """
+    Nome, valor, categoria e data dos lançamentos, no arquivo principal e nas partições
+
+    Uma consulta por faixa de partições anexadas, pela visão UNION ALL (busca
+    pela chave primária em cada arquivo).
+
+    Returns:
+        Dict id -> (nome, valor_centavos, categoria, data); lançamentos excluídos ficam de fora
+    """
+    dados = {}
+    if not ids_lancamentos:
+        return dados
+
+    marcadores = ", ".join("?" * len(ids_lancamentos))
+    for grupo, _, _ in _segmentos_particoes(_anos_particionados(conn), None, None):
+        with _particoes_anexadas(conn, grupo, gatilhos=False):
+            dados.update((id_lancamento, tuple(linha)) for id_lancamento, *linha in conn.execute(f'''
+                SELECT id, nome, valor_centavos, categoria, data
+                FROM {_tabela_leitura(grupo)}
+                WHERE id IN ({marcadores})
+            ''', ids_lancamentos))
+    return dados
+
+
+def reservar_mensagens_outbox(limite: int) -> List[Tuple]:
+    """
+    Reserva as próximas mensagens da fila para envio
+
+    A seleção e a marcação como "enviando" acontecem na mesma transação
+    (BEGIN IMMEDIATE), então dois trabalhadores nunca pegam a mesma mensagem.
+    Uma reserva não concluída (processo interrompido) expira após
+    OUTBOX_TEMPO_RESERVA_SEGUNDOS e a mensagem volta a ser elegível.
+    Os dados dos lançamentos (inclusive os das partições anuais) são lidos
+    depois, de uma vez, por _dados_para_confirmacao.
+
+    Args:
+        limite: Máximo de mensagens reservadas
+
+    Returns:
+        Lista de (id, telefone, tentativas, nome, valor_centavos, categoria, data).
+        nome é None quando o lançamento foi excluído antes do envio.
+    """
+    agora = time.time()
+
+    def reservar(conn):
+        mensagens = conn.execute('''
+            SELECT id, telefone, tentativas + 1, lancamento_id
+            FROM outbox
+            WHERE status IN ('pendente', 'enviando')
+              AND proxima_tentativa <= ?
+            ORDER BY proxima_tentativa
+            LIMIT ?
+        ''', (agora, limite)).fetchall()
+
+        conn.executemany(
+            "UPDATE outbox SET status = 'enviando', tentativas = tentativas + 1, "
+            "proxima_tentativa = ? WHERE id = ?",
+            [(agora + OUTBOX_TEMPO_RESERVA_SEGUNDOS, mensagem[0]) for mensagem in mensagens]
+        )
+        return mensagens
+
+    mensagens = _executar_transacao(reservar, imediata=True)
+
+    # Fora da reserva: as partições são anexadas fora de transação
+    with get_db_connection() as conn:
+        dados = _dados_para_confirmacao(conn, sorted({mensagem[3] for mensagem in mensagens}))
+    return [(id_mensagem, telefone, tentativas, *dados.get(id_lancamento, (None, None, None, None)))
+            for id_mensagem, telefone, tentativas, id_lancamento in mensagens]
+
+
+def concluir_mensagem_outbox(id_mensagem: int, sucesso: bool, resultado: str,
+                             tentativas: int, repetir: bool = True) -> bool:
+    """
+    Registra o resultado do envio de uma mensagem reservada
+
+    Uma falha volta para a fila com espera crescente (OUTBOX_ESPERA_BASE_SEGUNDOS,
+    dobrando a cada tentativa) até OUTBOX_MAX_TENTATIVAS; depois disso, ou com
+    repetir=False, a mensagem fica com status "erro" (ou "cancelado" se o
+    lançamento não existe mais).
+
+    Args:
+        id_mensagem: ID da mensagem na outbox
+        sucesso: Se o envio foi concluído
+        resultado: Retorno do serviço (SID ou mensagem de erro)
+        tentativas: Quantidade de tentativas já feitas (incluindo esta)
+        repetir: Se uma falha pode ser tentada novamente
+
+    Returns:
+        True se atualizado com sucesso, False caso contrário
+    """
+    try:
+        if sucesso:
+            sql = '''
+                UPDATE outbox SET status = 'enviado', resultado = ?,
+                       enviado_em = datetime('now', 'localtime')
+                WHERE id = ?
+            '''
+            params = (resultado, id_mensagem)
+        elif repetir and tentativas < OUTBOX_MAX_TENTATIVAS:
+            espera = OUTBOX_ESPERA_BASE_SEGUNDOS * (2 ** (tentativas - 1))
+            sql = "UPDATE outbox SET status = 'pendente', resultado = ?, proxima_tentativa = ? WHERE id = ?"
+            params = (resultado, time.time() + espera, id_mensagem)
+        else:
+            # O lançamento pode estar em uma partição anual: procura em todos os arquivos
+            with get_db_connection() as conn:
+                linha = conn.execute("SELECT lancamento_id FROM outbox WHERE id = ?", (id_mensagem,)).fetchone()
+                existe = linha is not None and _localizar_lancamento(conn, linha[0])[0]
+            sql = "UPDATE outbox SET status = ?, resultado = ? WHERE id = ?"
+            params = ("erro" if existe else "cancelado", resultado, id_mensagem)
+
+        _executar_transacao(lambda conn: conn.execute(sql, params))
+        return True
+    except Exception as e:
+        print(f"Erro ao atualizar mensagem da outbox: {e}")
+        return False
+
+
+def adiar_mensagem_outbox(id_mensagem: int, resultado: str, segundos: float) -> bool:
+    """
+    Devolve uma mensagem reservada à fila sem gastar a tentativa
+
+    Para envios que nem chegaram à API (disjuntor aberto): a mensagem volta
+    a ficar pendente depois de `segundos`, com a contagem de tentativas de
+    antes da reserva.
+
+    Args:
+        id_mensagem: ID da mensagem na outbox
+        resultado: Motivo do adiamento
+        segundos: Espera até a próxima tentativa
+
+    Returns:
+        True se atualizado com sucesso, False caso contrário
+    """
+    try:
+        _executar_transacao(lambda conn: conn.execute('''
+            UPDATE outbox SET status = 'pendente', resultado = ?, proxima_tentativa = ?,
+                   tentativas = MAX(tentativas - 1, 0)
             WHERE id = ?
-        ''', (id_lancamento,))
-        return cursor.fetchone()
+        ''', (resultado, time.time() + segundos, id_mensagem)))
+        return True
+    except Exception as e:
+        print(f"Erro ao adiar mensagem da outbox: {e}")
+        return False
+
+
+@_em_cache
+def obter_status_whatsapp(ids_lancamentos: Tuple[int, ...]) -> dict:
+    """
+    Obtém o status da confirmação por WhatsApp de cada lançamento
+
+    Args:
+        ids_lancamentos: IDs dos lançamentos (tupla, para servir de chave do cache)
+
+    Returns:
+        Dicionário {id_lancamento: (status, resultado)} com a mensagem mais
+        recente de cada lançamento; lançamentos sem mensagem ficam de fora
+    """
+    if not ids_lancamentos:
+        return {}
+
+    marcadores = ", ".join("?" * len(ids_lancamentos))
+    with get_db_connection() as conn:
+        linhas = conn.execute(
+            f"SELECT lancamento_id, status, resultado FROM outbox "
+            f"WHERE lancamento_id IN ({marcadores}) ORDER BY id",
+            ids_lancamentos
+        ).fetchall()
+
+    return {lancamento_id: (status, resultado) for lancamento_id, status, resultado in linhas}
+
+
+def estatisticas_outbox() -> dict:
+    """Retorna a quantidade de mensagens da outbox por status"""
+    with get_db_connection() as conn:
+        linhas = conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+
+    contagem = {status: 0 for status in ("pendente", "enviando", "enviado", "erro", "cancelado")}
+    contagem.update(dict(linhas))
+    return contagem
+
+
+# ============================================
+# CAMPANHAS DE WHATSAPP
+# ============================================
+
+def iterar_contatos(tamanho_lote: int = 500) -> Iterator[Tuple]:
+    """
+    Percorre os contatos com celular, do lançamento mais recente ao mais antigo
+
+    Lê em lotes (fetchmany) para não carregar a tabela inteira na memória.
+    Os anos com partição própria são lidos pela visão UNION ALL
+    (_particoes_anexadas), em faixas de datas decrescentes como em
+    iterar_lancamentos. O mesmo número aparece uma vez por lançamento; a
+    deduplicação fica com quem consome (ver campanha_whatsapp.py).
+
+    Args:
+        tamanho_lote: Linhas lidas do banco por vez
+
+    Yields:
+        (nome, codigo_area, celular)
+    """
+    with get_db_connection() as conn:
+        for grupo, inicio, fim in _segmentos_particoes(_anos_particionados(conn), None, None):
+            condicoes = ["celular IS NOT NULL", "celular <> ''"]
+            params = {}
+            if inicio:
+                condicoes.append("data >= :data_inicio")
+                params["data_inicio"] = inicio
+            if fim:
+                condicoes.append("data <= :data_fim")
+                params["data_fim"] = fim
+
+            with _particoes_anexadas(conn, grupo, gatilhos=False):
+                cursor = conn.execute(f'''
+                    SELECT nome, codigo_area, celular
+                    FROM {_tabela_leitura(grupo)}
+                    WHERE {' AND '.join(condicoes)}
+                    ORDER BY data DESC, id DESC
+                ''', params)
+                try:
+                    while True:
+                        linhas = cursor.fetchmany(tamanho_lote)
+                        if not linhas:
+                            break
+                        yield from linhas
+                finally:
+                    cursor.close()
+
+
+def criar_campanha(nome: str, modelo: str) -> int:
+    """
+    Cria uma campanha de WhatsApp
+
+    Args:
+        nome: Nome da campanha (ex.: "Agradecimento outubro")
+        modelo: Texto da mensagem, com campos como {nome} e {primeiro_nome}
+
+    Returns:
+        ID da campanha criada
+    """
+    return _executar_transacao(
+        lambda conn: conn.execute(
+            "INSERT INTO campanhas (nome, modelo) VALUES (?, ?)", (nome, modelo)
+        ).lastrowid
+    )
+
+
+def adicionar_destinatarios_campanha(campanha_id: int, destinatarios: List[Tuple[str, str]]) -> int:
+    """
+    Adiciona destinatários (telefone normalizado, nome) a uma campanha
+
+    Números já presentes na campanha são ignorados.
+
+    Returns:
+        Quantidade de destinatários novos
+    """
+    def inserir(conn):
+        antes = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO campanha_destinatarios (campanha_id, telefone, nome) VALUES (?, ?, ?)",
+            [(campanha_id, telefone, nome) for telefone, nome in destinatarios]
+        )
+        return conn.total_changes - antes
+
+    return _executar_transacao(inserir)
+
+
+def obter_campanha(campanha_id: int) -> Optional[Tuple]:
+    """Retorna (id, nome, modelo, criada_em, concluida_em) ou None"""
+    with get_db_connection() as conn:
+        return conn.execute(
+            "SELECT id, nome, modelo, criada_em, concluida_em FROM campanhas WHERE id = ?",
+            (campanha_id,)
+        ).fetchone()
+
+
+def listar_campanhas() -> List[Tuple]:
+    """Retorna as campanhas (id, nome, criada_em, concluida_em), da mais recente à mais antiga"""
+    with get_db_connection() as conn:
+        return conn.execute(
+            "SELECT id, nome, criada_em, concluida_em FROM campanhas ORDER BY id DESC"
+        ).fetchall()
+
+
+def obter_destinatarios_pendentes(campanha_id: int, apos_telefone: str = "",
+                                  limite: int = 100) -> List[Tuple[str, str]]:
+    """
+    Próximo lote de destinatários pendentes, em ordem de telefone
+
+    Paginação por chave (telefone > apos_telefone): cada lote é uma consulta
+    curta, sem manter uma leitura aberta durante o envio.
+
+    Returns:
+        Lista de (telefone, nome)
+    """
+    with get_db_connection() as conn:
+        return conn.execute('''
+            SELECT telefone, nome FROM campanha_destinatarios
+            WHERE campanha_id = ? AND telefone > ? AND status = 'pendente'
+            ORDER BY telefone
+            LIMIT ?
+        ''', (campanha_id, apos_telefone, limite)).fetchall()
+
+
+def registrar_envio_campanha(campanha_id: int, telefone: str, sucesso: bool, resultado: str) -> bool:
+    """Grava o resultado do envio para um destinatário da campanha"""
+    try:
+        _executar_transacao(lambda conn: conn.execute('''
+            UPDATE campanha_destinatarios
+            SET status = ?, resultado = ?,
+                enviado_em = CASE WHEN ? THEN datetime('now', 'localtime') END
+            WHERE campanha_id = ? AND telefone = ?
+        ''', ("enviado" if sucesso else "erro", resultado, sucesso, campanha_id, telefone)))
+        return True
+    except Exception as e:
+        print(f"Erro ao registrar envio da campanha: {e}")
+        return False
+
+
+def reabrir_falhas_campanha(campanha_id: int) -> int:
+    """Volta os destinatários com erro para pendente; retorna quantos"""
+    return _executar_transacao(
+        lambda conn: conn.execute(
+            "UPDATE campanha_destinatarios SET status = 'pendente' WHERE campanha_id = ? AND status = 'erro'",
+            (campanha_id,)
+        ).rowcount
+    )
+
+
+def concluir_campanha(campanha_id: int) -> None:
+    """Marca a campanha como concluída (nenhum destinatário pendente)"""
+    _executar_transacao(lambda conn: conn.execute(
+        "UPDATE campanhas SET concluida_em = datetime('now', 'localtime') WHERE id = ?",
+        (campanha_id,)
+    ))
+
+
+def resumo_campanha(campanha_id: int) -> dict:
+    """Quantidade de destinatários da campanha por status"""
+    with get_db_connection() as conn:
+        linhas = conn.execute(
+            "SELECT status, COUNT(*) FROM campanha_destinatarios WHERE campanha_id = ? GROUP BY status",
+            (campanha_id,)
+        ).fetchall()
+
+    contagem = {"pendente": 0, "enviado": 0, "erro": 0}
+    contagem.update(dict(linhas))
+    return contagem
+
+
+# Faixa de datas (:inicio/:fim, None = sem limite) de uma leitura de resumo por partições
+_PERIODO_RESUMO = "(:inicio IS NULL OR data >= :inicio) AND (:fim IS NULL OR data <= :fim)"
+
+
+def _sql_resumo_esperado(tabela: str) -> str:
+    """SQL_RESUMO_DIARIO_ESPERADO lendo a tabela (ou visão) informada, na faixa :inicio/:fim"""
+    return SQL_RESUMO_DIARIO_ESPERADO.replace("FROM lancamentos", f"FROM {tabela} WHERE {_PERIODO_RESUMO}")
+
+
+def verificar_resumo_diario() -> List[Tuple]:
+    """
+    Compara resumo_diario com os totais recalculados a partir de lancamentos
+
+    Inclui as partições anuais, anexadas em faixas de até PARTICOES_POR_CONSULTA.
+
+    Returns:
+        Lista de divergências (data, categoria, tipo, usuario, total_esperado,
+        quantidade_esperada, total_atual, quantidade_atual). Lista vazia
+        significa que os gatilhos mantiveram o resumo correto.
+    """
+    divergencias = []
+
+    with get_db_connection() as conn:
+        for grupo, inicio, fim in _segmentos_particoes(_anos_particionados(conn), None, None):
+            with _particoes_anexadas(conn, grupo, gatilhos=False):
+                divergencias.extend(conn.execute(f'''
+                    WITH esperado AS ({_sql_resumo_esperado(_tabela_leitura(grupo))}),
+                    atual AS (SELECT * FROM resumo_diario WHERE {_PERIODO_RESUMO})
+                    SELECT e.data, e.categoria, e.tipo, e.usuario,
+                           e.total, e.quantidade, r.total, r.quantidade
+                    FROM esperado e
+                    LEFT JOIN atual r USING (data, categoria, tipo, usuario)
+                    WHERE r.total IS NOT e.total OR r.quantidade IS NOT e.quantidade
+                    UNION ALL
+                    SELECT r.data, r.categoria, r.tipo, r.usuario,
+                           NULL, NULL, r.total, r.quantidade
+                    FROM atual r
+                    LEFT JOIN esperado e USING (data, categoria, tipo, usuario)
+                    WHERE e.data IS NULL
+                    ORDER BY 1, 2, 3, 4
+                ''', {"inicio": inicio, "fim": fim}).fetchall())
+
+    # Faixas de datas disjuntas: as chaves (data, categoria, tipo, usuario) nunca empatam
+    return sorted(divergencias, key=lambda divergencia: divergencia[:4])
+
+
+def reconstruir_resumo_diario() -> int:
+    """
+    Recalcula resumo_diario do zero a partir de lancamentos (arquivo principal e partições)
+
+    Partições são anexadas fora de transação: o resumo de cada faixa de anos
+    é montado em uma tabela temporária da conexão, e só a troca do conteúdo
+    de resumo_diario é uma transação (_executar_transacao).
+
+    Returns:
+        Quantidade de linhas gravadas no resumo
+    """
+    with get_db_connection() as conn:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS resumo_reconstruido AS SELECT * FROM resumo_diario WHERE 0")
+        conn.execute("DELETE FROM temp.resumo_reconstruido")
+        conn.commit()
+
+        for grupo, inicio, fim in _segmentos_particoes(_anos_particionados(conn), None, None):
+            with _particoes_anexadas(conn, grupo, gatilhos=False):
+                conn.execute(f'''
+                    INSERT INTO temp.resumo_reconstruido (data, categoria, tipo, usuario, total, quantidade)
+                    {_sql_resumo_esperado(_tabela_leitura(grupo))}
+                ''', {"inicio": inicio, "fim": fim})
+                conn.commit()
+
+        linhas = conn.execute('''
+            SELECT data, categoria, tipo, usuario, total, quantidade FROM temp.resumo_reconstruido
+        ''').fetchall()
+        conn.execute("DROP TABLE temp.resumo_reconstruido")
+        conn.commit()
+
+    def trocar(conn):
+        conn.execute("DELETE FROM resumo_diario")
+        conn.executemany('''
+            INSERT INTO resumo_diario (data, categoria, tipo, usuario, total, quantidade)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', linhas)
+        return len(linhas)
+
+    return _executar_transacao(trocar)
+
+
+def _consultas_criticas() -> List[Tuple[str, str, object]]:
+    """
+    Lista as consultas de leitura frequentes com parâmetros de exemplo
+
+    Usa os mesmos construtores de SQL das funções de leitura, de modo que
+    qualquer alteração nelas é coberta por verificar_planos_consulta.
+    """
+    hoje = datetime.today().strftime("%Y-%m-%d")
+    mes = datetime.today().strftime("%Y-%m")
+    cursor_exemplo = (hoje, 1)
+
+    consultas = [
+        ("obter_lancamentos (usuário)", _SQL_LANCAMENTOS_USUARIO, ("diacono01",)),
+        ("obter_lancamentos (admin)", _SQL_LANCAMENTOS_TODOS, ()),
+        ("obter_lancamento_por_id", _SQL_LANCAMENTO_POR_ID, (1,)),
+    ]
+
+    pesquisas = {
+        "pesquisar_lancamentos (nome)": ("Jo", None, None, None, None),
+        "pesquisar_lancamentos (nome + período)": ("Jo", f"{mes}-01", hoje, None, None),
+        "pesquisar_lancamentos (período)": (None, f"{mes}-01", hoje, None, None),
+        "pesquisar_lancamentos (valor)": (None, None, None, 10000, None),
+        "pesquisar_lancamentos (ID)": (None, None, None, None, 1),
+        "pesquisar_lancamentos (recentes)": (None, None, None, None, None),
+    }
+    for nome, filtros in pesquisas.items():
+        sql, params = _sql_pesquisa(*filtros, 20)
+        consultas.append((nome, sql, params))
+
+    for nome, usuario, nivel in (("usuário", "diacono01", "editor"), ("admin", None, "admin")):
+        for direcao in ("proxima", "anterior"):
+            sql, params = _sql_pagina(usuario, nivel, cursor_exemplo, 50, direcao)
+            consultas.append((f"obter_lancamentos_pagina {direcao} ({nome})", sql, params))
+        sql, params = _sql_pagina(usuario, nivel, None, 50, "proxima")
+        consultas.append((f"obter_lancamentos_pagina primeira ({nome})", sql, params))
+
+        sql, params = _sql_totais(usuario, nivel, hoje, mes)
+        consultas.append((f"obter_totais ({nome})", sql, params))
+
+        sql, params = _sql_lancamentos_filtrados(usuario, nivel, f"{mes}-01", hoje, ("Dízimo", "Oferta"))
+        consultas.append((f"iterar_lancamentos período + categorias ({nome})", sql, params))
+
+    return consultas
+
+
+def verificar_planos_consulta() -> List[Tuple[str, List[str], bool]]:
+    """
+    Executa EXPLAIN QUERY PLAN nas consultas frequentes
+
+    Uma consulta é considerada aprovada quando todo acesso à tabela
+    lancamentos usa um índice (ou a chave primária) e a ordenação não
+    exige uma árvore temporária (USE TEMP B-TREE). A varredura de
+    resumo_diario (poucas linhas por dia) é permitida.
+
+    Returns:
+        Lista de (nome da consulta, linhas do plano, aprovada)
+    """
+    resultados = []
+
+    with get_db_connection() as conn:
+        for nome, sql, params in _consultas_criticas():
+            plano = [linha[3] for linha in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            aprovada = all(
+                ("INDEX" in passo or "PRIMARY KEY" in passo)
+                for passo in plano if "lancamentos" in passo
+            ) and not any("TEMP B-TREE" in passo for passo in plano)
+            resultados.append((nome, plano, aprovada))
+
+    return resultados
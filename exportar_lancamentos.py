@@ -0,0 +1,194 @@
+"""
+Exportação de Lançamentos em CSV
+Grava os lançamentos em CSV sem carregar a tabela inteira na memória
+
+As linhas são lidas do banco em lotes (database.iterar_lancamentos, com
+fetchmany) e cada lote vira um pedaço de texto CSV antes de o próximo ser
+lido: a memória usada não depende do tamanho da tabela. Valem as mesmas
+regras de visibilidade de obter_lancamentos (admin vê tudo, demais níveis
+apenas o que registraram), com filtros de período e categoria.
+
+O arquivo sai no formato do Excel em português (";" e vírgula decimal, UTF-8
+com BOM) e com as colunas de importar_lancamentos, que o lê de volta.
+
+Também disponível na página Visualizar (botão de download).
+
+Uso:
+    python exportar_lancamentos.py lancamentos.csv
+    python exportar_lancamentos.py dizimos_2024.csv --inicio 2024-01-01 --fim 2024-12-31 --categoria Dízimo
+    python exportar_lancamentos.py meus.csv --usuario diacono01 --nivel editor
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+from typing import Iterator, Optional, Sequence, Tuple
+
+import database
+from config import CATEGORIAS, EXPORTACAO_LINHAS_POR_LOTE
+from utils import formatar_telefone
+
+SEPARADOR_CSV = ";"
+CODIFICACAO_CSV = "utf-8-sig"  # BOM: o Excel reconhece os acentos
+
+
+def _valor_csv(centavos: int) -> str:
+    """Centavos como texto com vírgula decimal, sem passar por float (ex.: 123456 -> "1234,56")"""
+    sinal = "-" if centavos < 0 else ""
+    reais, resto = divmod(abs(centavos), 100)
+    return f"{sinal}{reais},{resto:02d}"
+
+
+def _blocos_csv(usuario: Optional[str], nivel_acesso: str, data_inicio: Optional[str], data_fim: Optional[str],
+                categorias: Optional[Sequence[str]], tamanho_lote: int) -> Iterator[Tuple[str, int]]:
+    """Gera (texto CSV, quantidade de lançamentos) a cada lote lido do banco; o primeiro é o cabeçalho"""
+    admin = not usuario or nivel_acesso == "admin"
+    colunas = ["id", "data", "nome", "valor", "tipo", "categoria", "email", "celular", "operadora"]
+    if admin:
+        colunas.insert(colunas.index("email"), "usuario")
+
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=SEPARADOR_CSV, lineterminator="\n")
+    escritor.writerow(colunas)
+    yield buffer.getvalue(), 0
+
+    linhas = database.iterar_lancamentos(
+        usuario, nivel_acesso, tamanho_lote=tamanho_lote, data_inicio=data_inicio, data_fim=data_fim,
+        categorias=tuple(categorias) if categorias else None
+    )
+
+    lote = []
+    for linha in linhas:
+        # Consulta do admin traz a coluna usuario entre categoria e email
+        id_lancamento, data, nome, valor_centavos, tipo, categoria, *resto = linha
+        codigo_area, celular, operadora = resto[-3:]
+        ano, mes, dia = data.split("-")
+        lote.append((
+            id_lancamento, f"{dia}/{mes}/{ano}", nome, _valor_csv(valor_centavos), tipo, categoria,
+            *resto[:-3], formatar_telefone(f"{codigo_area or ''}{celular or ''}"), operadora
+        ))
+
+        if len(lote) >= tamanho_lote:
+            buffer.seek(0)
+            buffer.truncate()
+            escritor.writerows(lote)
+            yield buffer.getvalue(), len(lote)
+            lote = []
+
+    if lote:
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerows(lote)
+        yield buffer.getvalue(), len(lote)
+
+
+def gerar_csv(usuario: Optional[str] = None, nivel_acesso: str = "visualizador", data_inicio: Optional[str] = None,
+              data_fim: Optional[str] = None, categorias: Optional[Sequence[str]] = None,
+              tamanho_lote: int = EXPORTACAO_LINHAS_POR_LOTE) -> Iterator[str]:
+    """
+    Gera o CSV dos lançamentos em pedaços de texto (cabeçalho e um pedaço por lote)
+
+    Args:
+        usuario: Usuário da sessão (visibilidade de obter_lancamentos)
+        nivel_acesso: Nível de acesso do usuário (visualizador, editor, admin)
+        data_inicio: Data inicial no formato YYYY-MM-DD (inclusive)
+        data_fim: Data final no formato YYYY-MM-DD (inclusive)
+        categorias: Apenas estas categorias (padrão: todas)
+        tamanho_lote: Linhas lidas do banco e convertidas por vez
+
+    Yields:
+        Pedaços consecutivos do arquivo CSV
+    """
+    for texto, _ in _blocos_csv(usuario, nivel_acesso, data_inicio, data_fim, categorias, tamanho_lote):
+        yield texto
+
+
+def exportar_csv(destino, usuario: Optional[str] = None, nivel_acesso: str = "visualizador",
+                 data_inicio: Optional[str] = None, data_fim: Optional[str] = None,
+                 categorias: Optional[Sequence[str]] = None, tamanho_lote: int = EXPORTACAO_LINHAS_POR_LOTE) -> int:
+    """
+    Grava o CSV dos lançamentos em um arquivo, lote a lote
+
+    Args:
+        destino: Caminho do arquivo ou arquivo aberto (texto ou binário)
+        usuario, nivel_acesso, data_inicio, data_fim, categorias, tamanho_lote:
+            Mesmos argumentos de gerar_csv
+
+    Returns:
+        Quantidade de lançamentos exportados
+    """
+    if isinstance(destino, (str, os.PathLike)):
+        with open(destino, "w", encoding=CODIFICACAO_CSV, newline="") as arquivo:
+            return exportar_csv(arquivo, usuario, nivel_acesso, data_inicio, data_fim, categorias, tamanho_lote)
+
+    binario = isinstance(destino, (io.RawIOBase, io.BufferedIOBase)) or "b" in getattr(destino, "mode", "")
+    exportados = 0
+    for posicao, (texto, quantidade) in enumerate(
+        _blocos_csv(usuario, nivel_acesso, data_inicio, data_fim, categorias, tamanho_lote)
+    ):
+        if binario:
+            # O BOM vai apenas no início do arquivo
+            texto = texto.encode(CODIFICACAO_CSV if posicao == 0 else "utf-8")
+        destino.write(texto)
+        exportados += quantidade
+    return exportados
+
+
+def exportar_para_arquivo_temporario(**filtros):
+    """
+    Exporta para um arquivo temporário em disco (para st.download_button)
+
+    O CSV nunca fica inteiro em listas ou DataFrames: é escrito lote a lote no
+    disco e o arquivo aberto é entregue ao Streamlit, que o lê ao enviar o
+    download. O arquivo é apagado ao ser fechado.
+
+    Args:
+        filtros: Mesmos argumentos de gerar_csv
+
+    Returns:
+        Arquivo binário posicionado no início
+    """
+    arquivo = tempfile.TemporaryFile(prefix="exportacao_", suffix=".csv")
+    exportar_csv(arquivo, **filtros)
+    arquivo.seek(0)
+    return arquivo
+
+
+# ============================================
+# LINHA DE COMANDO
+# ============================================
+
+def main() -> int:
+    """Função principal - interpreta os argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(description="Exportação dos lançamentos em CSV")
+    parser.add_argument("arquivo", help="CSV de saída")
+    parser.add_argument("--usuario", help="Exporta como este usuário (visibilidade do nível informado)")
+    parser.add_argument("--nivel", default="admin", help="Nível de acesso do usuário (padrão: admin)")
+    parser.add_argument("--inicio", help="Data inicial (AAAA-MM-DD)")
+    parser.add_argument("--fim", help="Data final (AAAA-MM-DD)")
+    parser.add_argument("--categoria", action="append", choices=CATEGORIAS,
+                        help="Categoria exportada (pode repetir; padrão: todas)")
+    parser.add_argument("--lote", type=int, default=EXPORTACAO_LINHAS_POR_LOTE, help="Linhas lidas por vez")
+    args = parser.parse_args()
+
+    database.garantir_banco_inicializado()
+
+    inicio = time.perf_counter()
+    try:
+        exportados = exportar_csv(
+            args.arquivo, args.usuario, args.nivel, data_inicio=args.inicio, data_fim=args.fim,
+            categorias=args.categoria, tamanho_lote=args.lote
+        )
+    except OSError as e:
+        print(f"❌ {e}")
+        return 1
+
+    print(f"✅ {exportados} lançamento(s) exportado(s) para {args.arquivo} em {time.perf_counter() - inicio:.1f}s.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,408 @@
+"""
+Importação de Lançamentos Históricos
+Carrega de uma só vez planilhas CSV ou XLSX com anos de registros
+
+O arquivo é lido em blocos de IMPORTACAO_LINHAS_POR_LOTE linhas (memória
+limitada, qualquer que seja o tamanho da planilha). Cada bloco tem datas,
+valores, tipos, categorias, emails e celulares normalizados com as mesmas
+regras do formulário de registro; as linhas válidas seguem para
+database.carregar_lancamentos_em_massa e as recusadas vão para um CSV com o
+número da linha e o motivo, para correção e nova importação.
+
+Também disponível para o administrador na página Editar (envio do arquivo).
+
+Uso:
+    python importar_lancamentos.py planilha.csv --usuario admin
+    python importar_lancamentos.py planilha.xlsx --simular --rejeitados recusadas.csv
+    python importar_lancamentos.py planilha.csv --codificacao cp1252
+
+Colunas reconhecidas (sem diferença de maiúsculas e acentos):
+    data, nome, valor, tipo, categoria (obrigatórias), email e celular/telefone
+"""
+import argparse
+import os
+import sys
+import time
+import unicodedata
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import database
+from config import CATEGORIAS, IMPORTACAO_LINHAS_POR_LOTE, TIPOS_PAGAMENTO
+from utils import reais_para_centavos, validar_telefone
+
+COLUNAS_OBRIGATORIAS = ("data", "nome", "valor", "tipo", "categoria")
+
+# Outros nomes de coluna comuns nas planilhas -> nome usado na importação
+_APELIDOS_COLUNAS = {
+    "valor (r$)": "valor",
+    "valor r$": "valor",
+    "forma de pagamento": "tipo",
+    "contribuinte": "nome",
+    "e-mail": "email",
+    "telefone": "celular",
+    "whatsapp": "celular",
+}
+
+# "1.234" e "1.234.567" sem vírgula: pontos como separador de milhar
+_SOMENTE_MILHAR = r"^\d{1,3}(?:\.\d{3})+$"
+
+_DATA_BRASILEIRA = r"^(\d{1,2})/(\d{1,2})/(\d{4})$"
+
+
+def _chave(texto: str) -> str:
+    """Minúsculas e sem acentos, para comparar cabeçalhos, tipos e categorias"""
+    decomposto = unicodedata.normalize("NFKD", str(texto).strip().lower())
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+_TIPOS = {_chave(tipo): tipo for tipo in TIPOS_PAGAMENTO}
+_CATEGORIAS = {_chave(categoria): categoria for categoria in CATEGORIAS}
+
+
+# ============================================
+# LEITURA EM BLOCOS
+# ============================================
+
+def _detectar_separador(arquivo, codificacao: str) -> str:
+    """Ponto e vírgula (padrão do Excel em português) ou vírgula, pelo cabeçalho"""
+    if isinstance(arquivo, (str, os.PathLike)):
+        with open(arquivo, encoding=codificacao, errors="replace") as entrada:
+            cabecalho = entrada.readline()
+    else:
+        cabecalho = arquivo.readline()
+        arquivo.seek(0)
+        if isinstance(cabecalho, bytes):
+            cabecalho = cabecalho.decode(codificacao, errors="replace")
+
+    return ";" if cabecalho.count(";") > cabecalho.count(",") else ","
+
+
+def _ler_csv(arquivo, tamanho: int, codificacao: str) -> Iterator:
+    """Blocos de um CSV, todos os campos como texto"""
+    import pandas as pd
+
+    yield from pd.read_csv(
+        arquivo, sep=_detectar_separador(arquivo, codificacao), dtype=str, keep_default_na=False,
+        chunksize=tamanho, encoding=codificacao, skipinitialspace=True
+    )
+
+
+def _texto_celula(valor) -> str:
+    """Célula do Excel como texto: datas em ISO e números sem o ".0" dos inteiros"""
+    if valor is None:
+        return ""
+    if hasattr(valor, "strftime"):
+        return valor.strftime("%Y-%m-%d")
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def _ler_xlsx(arquivo, tamanho: int) -> Iterator:
+    """Blocos da primeira aba de um XLSX, lida linha a linha (modo read_only)"""
+    import pandas as pd
+
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("A leitura de XLSX requer o pacote openpyxl (pip install openpyxl).")
+
+    planilha = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = planilha.worksheets[0].iter_rows(values_only=True)
+        cabecalho = [_texto_celula(valor) for valor in next(linhas, ())]
+
+        bloco = []
+        for linha in linhas:
+            bloco.append([_texto_celula(valor) for valor in linha[:len(cabecalho)]])
+            if len(bloco) >= tamanho:
+                yield pd.DataFrame(bloco, columns=cabecalho, dtype=str)
+                bloco = []
+        if bloco:
+            yield pd.DataFrame(bloco, columns=cabecalho, dtype=str)
+    finally:
+        planilha.close()
+
+
+def ler_blocos(arquivo, nome_arquivo: Optional[str] = None, tamanho: int = IMPORTACAO_LINHAS_POR_LOTE,
+               codificacao: str = "utf-8-sig") -> Iterator:
+    """
+    Lê a planilha em blocos de até `tamanho` linhas
+
+    Args:
+        arquivo: Caminho ou arquivo aberto em modo binário (ex.: upload do Streamlit)
+        nome_arquivo: Nome usado para identificar o formato (padrão: o caminho)
+        tamanho: Linhas por bloco
+        codificacao: Codificação do CSV (planilhas antigas do Excel: cp1252)
+
+    Yields:
+        DataFrames com as colunas renomeadas para os nomes da importação
+    """
+    nome_arquivo = nome_arquivo or str(arquivo)
+
+    if nome_arquivo.lower().endswith(".xlsx"):
+        blocos = _ler_xlsx(arquivo, tamanho)
+    elif nome_arquivo.lower().endswith((".csv", ".txt")):
+        blocos = _ler_csv(arquivo, tamanho, codificacao)
+    else:
+        raise ValueError(f"Formato não suportado: {nome_arquivo}. Use CSV ou XLSX.")
+
+    for bloco in blocos:
+        colunas = [_chave(coluna) for coluna in bloco.columns]
+        bloco.columns = [_APELIDOS_COLUNAS.get(coluna, coluna) for coluna in colunas]
+
+        ausentes = [coluna for coluna in COLUNAS_OBRIGATORIAS if coluna not in bloco.columns]
+        if ausentes:
+            raise ValueError(f"Coluna(s) obrigatória(s) ausente(s): {', '.join(ausentes)}")
+
+        # Índice posicional em todos os formatos (usado no número da linha recusada)
+        yield bloco.fillna("").reset_index(drop=True)
+
+
+# ============================================
+# NORMALIZAÇÃO
+# ============================================
+
+def _mapear_unicos(serie, funcao: Callable):
+    """Aplica a função uma vez por valor distinto (tipos, categorias e celulares se repetem)"""
+    import pandas as pd
+
+    unicos = pd.unique(serie)
+    return serie.map(dict(zip(unicos, map(funcao, unicos))))
+
+
+def _normalizar_celular(texto: str) -> Tuple[Optional[str], Optional[str]]:
+    """(11 dígitos, None) se válido, ("", None) se vazio ou (None, motivo) pelas regras de validar_telefone"""
+    if not texto.strip():
+        return "", None
+    valido, mensagem = validar_telefone(texto)
+    if not valido:
+        return None, mensagem
+    return "".join(filter(str.isdigit, texto)), None
+
+
+def _converter_valores(texto) -> Tuple:
+    """
+    Valores em reais ("1.234,56", "R$ 10,00", "10.5") para centavos
+
+    Returns:
+        (centavos como float, máscara dos valores inválidos ou não positivos)
+    """
+    import numpy as np
+    import pandas as pd
+
+    texto = texto.str.replace(r"[R$\s]", "", regex=True)
+    decimal_virgula = texto.str.contains(",", regex=False) | texto.str.match(_SOMENTE_MILHAR)
+    texto = texto.where(
+        ~decimal_virgula, texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    )
+
+    reais = pd.to_numeric(texto, errors="coerce").to_numpy(dtype=float)
+    centavos = np.round(reais * 100)
+
+    # Mais de duas casas decimais: arredondamento comercial de reais_para_centavos
+    casas_extras = (texto.str.match(r"^-?\d*\.\d{3,}$")).to_numpy()
+    for posicao in np.flatnonzero(casas_extras & ~np.isnan(reais)):
+        centavos[posicao] = reais_para_centavos(texto.iat[posicao])
+
+    invalidos = np.isnan(centavos) | ~(centavos > 0)
+    return centavos, invalidos
+
+
+def normalizar_bloco(bloco, anos_arquivados: frozenset = frozenset()) -> Tuple[List[Tuple], object]:
+    """
+    Valida e normaliza um bloco da planilha
+
+    Mesmas regras do registro: nome com pelo menos 2 caracteres, valor
+    positivo, tipo e categoria da configuração (sem diferença de maiúsculas e
+    acentos), email com "@" e ".", celular de validar_telefone (vazio é
+    aceito: registros antigos costumam não ter). Datas em DD/MM/AAAA ou
+    AAAA-MM-DD, fora dos anos arquivados em Parquet (o arquivo do ano é
+    fechado e não recebe novos lançamentos).
+
+    Returns:
+        (tuplas válidas para carregar_lancamentos_em_massa, DataFrame das
+        linhas recusadas com as colunas originais e o motivo)
+    """
+    import numpy as np
+    import pandas as pd
+
+    motivos = []
+
+    # DD/MM/AAAA vira AAAA-MM-DD por expressão regular: uma única conversão, no formato ISO (rápido)
+    texto_data = bloco["data"].str.strip().str.replace(_DATA_BRASILEIRA, r"\3-\2-\1", regex=True)
+    datas = pd.to_datetime(texto_data, format="%Y-%m-%d", errors="coerce")
+    motivos.append((datas.isna().to_numpy(), "Data inválida (use DD/MM/AAAA ou AAAA-MM-DD)."))
+    if anos_arquivados:
+        motivos.append((datas.dt.year.isin(anos_arquivados).to_numpy(), "Ano arquivado em Parquet."))
+
+    nomes = bloco["nome"].str.strip()
+    motivos.append(((nomes.str.len() < 2).to_numpy(), "Nome deve ter pelo menos 2 caracteres."))
+
+    centavos, valores_invalidos = _converter_valores(bloco["valor"])
+    motivos.append((valores_invalidos, "Valor deve ser maior que zero."))
+
+    tipos = _mapear_unicos(bloco["tipo"], lambda tipo: _TIPOS.get(_chave(tipo)))
+    motivos.append((tipos.isna().to_numpy(), f"Tipo deve ser um de: {', '.join(TIPOS_PAGAMENTO)}."))
+
+    categorias = _mapear_unicos(bloco["categoria"], lambda categoria: _CATEGORIAS.get(_chave(categoria)))
+    motivos.append((categorias.isna().to_numpy(), f"Categoria deve ser uma de: {', '.join(CATEGORIAS)}."))
+
+    emails = bloco["email"].str.strip() if "email" in bloco.columns else pd.Series("", index=bloco.index)
+    emails_invalidos = (emails != "") & ~(emails.str.contains("@", regex=False) & emails.str.contains(".", regex=False))
+    motivos.append((emails_invalidos.to_numpy(), "Email inválido."))
+
+    if "celular" in bloco.columns:
+        unicos = pd.unique(bloco["celular"])
+        numeros_unicos, erros_unicos = zip(*map(_normalizar_celular, unicos)) if len(unicos) else ((), ())
+        numeros = bloco["celular"].map(dict(zip(unicos, numeros_unicos)))
+        erros = bloco["celular"].map(dict(zip(unicos, erros_unicos)))
+        for mensagem in pd.unique(erros.dropna()):
+            motivos.append(((erros == mensagem).to_numpy(), mensagem))
+    else:
+        numeros = pd.Series("", index=bloco.index)
+
+    recusadas = np.logical_or.reduce([mascara for mascara, _ in motivos])
+    validas = ~recusadas
+
+    lancamentos = list(zip(
+        datas[validas].dt.strftime("%Y-%m-%d").tolist(),
+        nomes[validas].tolist(),
+        centavos[validas].astype(np.int64).tolist(),
+        tipos[validas].tolist(),
+        categorias[validas].tolist(),
+        [email or None for email in emails[validas].tolist()],
+        [numero[:2] or None for numero in numeros[validas].tolist()],
+        [numero[2:] or None for numero in numeros[validas].tolist()],
+    ))
+
+    rejeitadas = bloco[recusadas].copy()
+    rejeitadas["motivo"] = [
+        " ".join(motivo for mascara, motivo in motivos if mascara[posicao])
+        for posicao in np.flatnonzero(recusadas)
+    ]
+    return lancamentos, rejeitadas
+
+
+# ============================================
+# IMPORTAÇÃO
+# ============================================
+
+def importar_arquivo(arquivo, usuario: str, nome_arquivo: Optional[str] = None, simular: bool = False,
+                     rejeitados=None, tamanho_lote: int = IMPORTACAO_LINHAS_POR_LOTE,
+                     codificacao: str = "utf-8-sig", progresso: Optional[Callable[[int, int], None]] = None) -> dict:
+    """
+    Importa uma planilha de lançamentos históricos
+
+    Args:
+        arquivo: Caminho ou arquivo aberto em modo binário
+        usuario: Usuário registrado nos lançamentos importados
+        nome_arquivo: Nome usado para identificar o formato (padrão: o caminho)
+        simular: Apenas valida e conta, sem gravar no banco
+        rejeitados: Caminho ou arquivo de texto que recebe as linhas recusadas (CSV)
+        tamanho_lote: Linhas lidas, validadas e gravadas por vez
+        codificacao: Codificação do CSV
+        progresso: Função chamada após cada bloco com (linhas lidas, recusadas)
+
+    Returns:
+        Dicionário com lidas, importadas, rejeitadas, segundos e simulacao.
+        importadas é None se a gravação falhou (nada é gravado nesse caso).
+
+    Raises:
+        ValueError: Formato não suportado ou colunas obrigatórias ausentes
+    """
+    inicio = time.perf_counter()
+    contagem = {"lidas": 0, "validas": 0, "rejeitadas": 0}
+    destino = open(rejeitados, "w", encoding="utf-8-sig", newline="") if isinstance(rejeitados, (str, os.PathLike)) \
+        else rejeitados
+
+    from arquivo_anual import listar_anos_arquivados
+    anos_arquivados = frozenset(ano for ano, *_ in listar_anos_arquivados())
+
+    def lotes_validos():
+        for bloco in ler_blocos(arquivo, nome_arquivo, tamanho_lote, codificacao):
+            lancamentos, recusadas = normalizar_bloco(bloco, anos_arquivados)
+
+            if destino is not None and len(recusadas):
+                # Número da linha na planilha (a linha 1 é o cabeçalho)
+                recusadas.insert(0, "linha", contagem["lidas"] + recusadas.index + 2)
+                recusadas.to_csv(destino, index=False, header=contagem["rejeitadas"] == 0)
+
+            contagem["lidas"] += len(bloco)
+            contagem["validas"] += len(lancamentos)
+            contagem["rejeitadas"] += len(recusadas)
+            if progresso is not None:
+                progresso(contagem["lidas"], contagem["rejeitadas"])
+
+            if lancamentos:
+                yield lancamentos
+
+    try:
+        if simular:
+            for _ in lotes_validos():
+                pass
+            importadas = 0
+        else:
+            importadas = database.carregar_lancamentos_em_massa(lotes_validos(), usuario)
+    finally:
+        if destino is not rejeitados:
+            destino.close()
+
+    return {
+        "lidas": contagem["lidas"],
+        "validas": contagem["validas"],
+        "importadas": importadas,
+        "rejeitadas": contagem["rejeitadas"],
+        "segundos": time.perf_counter() - inicio,
+        "simulacao": simular,
+    }
+
+
+# ============================================
+# LINHA DE COMANDO
+# ============================================
+
+def main() -> int:
+    """Função principal - interpreta os argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(description="Importação de lançamentos históricos (CSV ou XLSX)")
+    parser.add_argument("arquivo", help="Planilha CSV ou XLSX")
+    parser.add_argument("--usuario", default="admin", help="Usuário registrado nos lançamentos (padrão: admin)")
+    parser.add_argument("--simular", action="store_true", help="Apenas valida a planilha, sem gravar")
+    parser.add_argument("--rejeitados", help="CSV que recebe as linhas recusadas e o motivo")
+    parser.add_argument("--lote", type=int, default=IMPORTACAO_LINHAS_POR_LOTE, help="Linhas por bloco")
+    parser.add_argument("--codificacao", default="utf-8-sig", help="Codificação do CSV (ex.: cp1252)")
+    args = parser.parse_args()
+
+    database.garantir_banco_inicializado()
+
+    def mostrar_progresso(lidas, rejeitadas):
+        print(f"📥 {lidas} linha(s) lida(s), {rejeitadas} recusada(s)")
+
+    try:
+        resultado = importar_arquivo(
+            args.arquivo, args.usuario, simular=args.simular, rejeitados=args.rejeitados,
+            tamanho_lote=args.lote, codificacao=args.codificacao, progresso=mostrar_progresso
+        )
+    except (OSError, ValueError, UnicodeDecodeError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    print("\n" + "=" * 60)
+    if resultado["importadas"] is None:
+        print("❌ Erro ao gravar os lançamentos. Nada foi importado.")
+        return 1
+
+    if args.simular:
+        print(f"🔍 Simulação: {resultado['validas']} linha(s) válida(s) seriam importadas.")
+    else:
+        print(f"✅ {resultado['importadas']} lançamento(s) importado(s).")
+    print(f"   Lidas: {resultado['lidas']} | Recusadas: {resultado['rejeitadas']} | "
+          f"{resultado['segundos']:.1f}s ({resultado['lidas'] / max(resultado['segundos'], 1e-9):,.0f} linhas/s)")
+    if resultado["rejeitadas"] and args.rejeitados:
+        print(f"💡 Linhas recusadas em {args.rejeitados}: corrija e importe apenas esse arquivo.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
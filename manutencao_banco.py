@@ -0,0 +1,269 @@
+"""
+Utilitário de Manutenção do Banco de Dados
+Aplica migrações e verifica se as consultas principais usam índices
+
+Uso:
+    python manutencao_banco.py migrar
+    python manutencao_banco.py explicar
+    python manutencao_banco.py verificar-resumo
+    python manutencao_banco.py reconstruir-resumo
+    python manutencao_banco.py arquivar 2023 [--vacuum]
+    python manutencao_banco.py arquivos
+    python manutencao_banco.py particionar [2023 ...]
+    python manutencao_banco.py particoes
+    python manutencao_banco.py reparar-particoes
+"""
+import argparse
+import sqlite3
+import sys
+from datetime import datetime
+
+import database
+from migrations import versao_atual, versao_mais_recente
+
+
+def comando_migrar(args) -> int:
+    """Cria o banco (se necessário) e aplica as migrações pendentes"""
+    database.init_db()
+
+    with database.get_db_connection() as conn:
+        versao = versao_atual(conn)
+
+    print(f"✅ Esquema na versão {versao} (mais recente: {versao_mais_recente()})")
+    return 0
+
+
+def comando_explicar(args) -> int:
+    """Mostra o EXPLAIN QUERY PLAN das consultas principais e falha se alguma não usar índice"""
+    database.init_db()
+
+    reprovadas = 0
+    for nome, plano, aprovada in database.verificar_planos_consulta():
+        print(f"\n{'✅' if aprovada else '❌'} {nome}")
+        for passo in plano:
+            print(f"    {passo}")
+        if not aprovada:
+            reprovadas += 1
+
+    print("\n" + "=" * 60)
+    if reprovadas:
+        print(f"❌ {reprovadas} consulta(s) sem uso de índice!")
+        return 1
+
+    print("✅ Todas as consultas usam índices.")
+    return 0
+
+
+def _imprimir_divergencias(divergencias) -> None:
+    """Lista as diferenças entre resumo_diario e os lançamentos"""
+    for data, categoria, tipo, usuario, total_esp, qtd_esp, total_atual, qtd_atual in divergencias:
+        print(
+            f"  {data} | {categoria} | {tipo} | {usuario}: "
+            f"esperado {total_esp} centavos / {qtd_esp} lançamento(s), "
+            f"resumo {total_atual} centavos / {qtd_atual} lançamento(s)"
+        )
+
+
+def comando_verificar_resumo(args) -> int:
+    """Compara resumo_diario com o recálculo a partir de lancamentos"""
+    database.init_db()
+
+    divergencias = database.verificar_resumo_diario()
+    if divergencias:
+        print(f"❌ {len(divergencias)} divergência(s) no resumo diário:")
+        _imprimir_divergencias(divergencias)
+        print("\n💡 Execute: python manutencao_banco.py reconstruir-resumo")
+        return 1
+
+    print("✅ resumo_diario confere com os lançamentos.")
+    return 0
+
+
+def comando_reconstruir_resumo(args) -> int:
+    """Recalcula resumo_diario do zero, informando o que estava diferente"""
+    database.init_db()
+
+    divergencias = database.verificar_resumo_diario()
+    if divergencias:
+        print(f"⚠️ {len(divergencias)} divergência(s) encontradas antes da reconstrução:")
+        _imprimir_divergencias(divergencias)
+    else:
+        print("ℹ️ Nenhuma divergência encontrada antes da reconstrução.")
+
+    linhas = database.reconstruir_resumo_diario()
+    print(f"✅ resumo_diario reconstruído com {linhas} linha(s).")
+    return 0
+
+
+def comando_arquivar(args) -> int:
+    """Move um ano encerrado de lancamentos para um arquivo Parquet"""
+    from arquivo_anual import arquivar_ano
+
+    database.init_db()
+
+    try:
+        resultado = arquivar_ano(args.ano)
+    except ImportError:
+        print("❌ O arquivo anual requer o pacote pyarrow (pip install pyarrow).")
+        return 1
+    except (ValueError, OSError, sqlite3.Error) as e:
+        print(f"❌ {e}")
+        return 1
+
+    print(
+        f"✅ {resultado['linhas']} lançamento(s) de {args.ano} arquivado(s) em {resultado['arquivo']} "
+        f"({resultado['bytes'] / 1024 / 1024:.1f} MB)."
+    )
+
+    if args.vacuum:
+        with database.get_db_connection() as conn:
+            conn.execute("VACUUM")
+        print("✅ VACUUM concluído: espaço das linhas removidas devolvido ao disco.")
+    else:
+        print("💡 Para devolver o espaço ao disco: python manutencao_banco.py arquivar ... --vacuum")
+    return 0
+
+
+def comando_arquivos(args) -> int:
+    """Lista os anos arquivados e confere os arquivos Parquet"""
+    from arquivo_anual import listar_anos_arquivados, verificar_arquivos
+
+    database.init_db()
+
+    anos = listar_anos_arquivados()
+    if not anos:
+        print("ℹ️ Nenhum ano arquivado.")
+        return 0
+
+    for ano, arquivo, linhas, total, data_inicio, data_fim, tamanho, _, arquivado_em in anos:
+        print(
+            f"  {ano}: {arquivo} | {linhas} lançamento(s) | {total / 100:.2f} | "
+            f"{data_inicio} a {data_fim} | {tamanho / 1024 / 1024:.1f} MB | arquivado em {arquivado_em}"
+        )
+
+    problemas = verificar_arquivos()
+    if problemas:
+        for ano, problema in problemas:
+            print(f"❌ {ano}: {problema}")
+        return 1
+
+    print("✅ Todos os arquivos conferem com o manifesto.")
+    return 0
+
+
+def comando_particionar(args) -> int:
+    """Move anos encerrados do arquivo principal para partições (um arquivo SQLite por ano)"""
+    database.init_db()
+
+    anos = args.anos
+    if not anos:
+        # Padrão: todo ano encerrado que ainda tem lançamentos no arquivo principal
+        with database.get_db_connection() as conn:
+            anos = [int(ano) for ano, in conn.execute(
+                "SELECT DISTINCT substr(data, 1, 4) FROM lancamentos WHERE data < ? ORDER BY 1",
+                (f"{datetime.today().year}-01-01",)
+            )]
+        if not anos:
+            print("ℹ️ Nenhum ano encerrado no arquivo principal.")
+            return 0
+
+    for ano in anos:
+        try:
+            movidos = database.particionar_ano(ano)
+        except (ValueError, OSError, sqlite3.Error) as e:
+            print(f"❌ {ano}: {e}")
+            return 1
+        print(f"✅ {ano}: {movidos} lançamento(s) movido(s) para a partição.")
+
+    if args.vacuum:
+        with database.get_db_connection() as conn:
+            conn.execute("VACUUM")
+        print("✅ VACUUM concluído no arquivo principal.")
+    return 0
+
+
+def comando_particoes(args) -> int:
+    """Lista as partições anuais e confere cada arquivo (PRAGMA quick_check)"""
+    database.init_db()
+
+    particoes = database.verificar_particoes()
+    if not particoes:
+        print("ℹ️ Nenhuma partição anual.")
+        return 0
+
+    problemas = 0
+    for ano, caminho, linhas, tamanho, verificacao in particoes:
+        ok = verificacao == "ok"
+        problemas += not ok
+        print(f"{'✅' if ok else '❌'} {ano}: {caminho} | {linhas} lançamento(s) | "
+              f"{tamanho / 1024 / 1024:.1f} MB | {verificacao}")
+
+    return 1 if problemas else 0
+
+
+def comando_reparar_particoes(args) -> int:
+    """
+    Repara o que um commit interrompido deixa entre as partições e o arquivo principal
+
+    Com WAL, um commit que altera dois arquivos não é atômico entre eles:
+    termina as mudanças de arquivo pela metade e reconstrói resumo_diario
+    se ele não conferir com os lançamentos (arquivo principal e partições).
+    """
+    database.init_db()
+
+    movidos = database.concluir_movimentacoes()
+    print(f"✅ {movidos} lançamento(s) levado(s) ao arquivo do seu ano.")
+
+    divergencias = database.verificar_resumo_diario()
+    if not divergencias:
+        print("✅ resumo_diario confere com os lançamentos.")
+        return 0
+
+    print(f"⚠️ {len(divergencias)} divergência(s) no resumo diário:")
+    _imprimir_divergencias(divergencias)
+    linhas = database.reconstruir_resumo_diario()
+    print(f"✅ resumo_diario reconstruído com {linhas} linha(s).")
+    return 0
+
+
+def main() -> int:
+    """Função principal - interpreta os argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(description="Manutenção do banco de dados de Dízimos e Ofertas")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    subparsers.add_parser("migrar", help="Aplica as migrações pendentes").set_defaults(func=comando_migrar)
+    subparsers.add_parser(
+        "explicar", help="Verifica com EXPLAIN QUERY PLAN se as consultas usam índices"
+    ).set_defaults(func=comando_explicar)
+    subparsers.add_parser(
+        "verificar-resumo", help="Compara resumo_diario com os lançamentos"
+    ).set_defaults(func=comando_verificar_resumo)
+    subparsers.add_parser(
+        "reconstruir-resumo", help="Recalcula resumo_diario a partir dos lançamentos"
+    ).set_defaults(func=comando_reconstruir_resumo)
+
+    arquivar = subparsers.add_parser("arquivar", help="Move um ano encerrado para um arquivo Parquet")
+    arquivar.add_argument("ano", type=int, help="Ano encerrado (ex.: 2023)")
+    arquivar.add_argument("--vacuum", action="store_true", help="Executa VACUUM depois de arquivar")
+    arquivar.set_defaults(func=comando_arquivar)
+    subparsers.add_parser(
+        "arquivos", help="Lista os anos arquivados e confere os arquivos"
+    ).set_defaults(func=comando_arquivos)
+
+    particionar = subparsers.add_parser("particionar", help="Move anos encerrados para partições anuais")
+    particionar.add_argument("anos", type=int, nargs="*", help="Anos (padrão: todos os encerrados)")
+    particionar.add_argument("--vacuum", action="store_true", help="Executa VACUUM no arquivo principal depois")
+    particionar.set_defaults(func=comando_particionar)
+    subparsers.add_parser(
+        "particoes", help="Lista as partições anuais e confere cada arquivo"
+    ).set_defaults(func=comando_particoes)
+    subparsers.add_parser(
+        "reparar-particoes", help="Termina mudanças de arquivo interrompidas e reconstrói o resumo se preciso"
+    ).set_defaults(func=comando_reparar_particoes)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
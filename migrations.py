@@ -0,0 +1,412 @@
+"""
+Módulo de Migrações do Banco de Dados
+Versiona o esquema com PRAGMA user_version e aplica as alterações pendentes em ordem
+"""
+import sqlite3
+from typing import Callable, List, Tuple
+
+
+# ============================================
+# DEFINIÇÕES REUTILIZÁVEIS
+# ============================================
+
+# Soma em centavos do lançamento (NEW/OLD); linhas antigas sem valor_centavos
+# usam o valor REAL arredondado
+_CENTAVOS_NEW = "COALESCE(NEW.valor_centavos, CAST(ROUND(NEW.valor * 100) AS INTEGER))"
+_CENTAVOS_OLD = "COALESCE(OLD.valor_centavos, CAST(ROUND(OLD.valor * 100) AS INTEGER))"
+
+_RESUMO_SOMAR_NEW = f"""
+        INSERT INTO resumo_diario (data, categoria, tipo, usuario, total, quantidade)
+        VALUES (NEW.data, NEW.categoria, NEW.tipo, NEW.usuario, {_CENTAVOS_NEW}, 1)
+        ON CONFLICT (data, categoria, tipo, usuario) DO UPDATE SET
+            total = total + excluded.total,
+            quantidade = quantidade + 1;
+"""
+
+_RESUMO_SUBTRAIR_OLD = f"""
+        UPDATE resumo_diario
+        SET total = total - {_CENTAVOS_OLD}, quantidade = quantidade - 1
+        WHERE data = OLD.data AND categoria = OLD.categoria
+          AND tipo = OLD.tipo AND usuario = OLD.usuario;
+        DELETE FROM resumo_diario
+        WHERE data = OLD.data AND categoria = OLD.categoria
+          AND tipo = OLD.tipo AND usuario = OLD.usuario AND quantidade <= 0;
+"""
+
+# Gatilhos que mantêm resumo_diario em dia com lancamentos (nome -> DDL)
+GATILHOS_RESUMO_DIARIO = {
+    "trg_lancamentos_resumo_insert": f"""
+    CREATE TRIGGER IF NOT EXISTS trg_lancamentos_resumo_insert
+    AFTER INSERT ON lancamentos
+    BEGIN{_RESUMO_SOMAR_NEW}    END
+    """,
+    "trg_lancamentos_resumo_delete": f"""
+    CREATE TRIGGER IF NOT EXISTS trg_lancamentos_resumo_delete
+    AFTER DELETE ON lancamentos
+    BEGIN{_RESUMO_SUBTRAIR_OLD}    END
+    """,
+    "trg_lancamentos_resumo_update": f"""
+    CREATE TRIGGER IF NOT EXISTS trg_lancamentos_resumo_update
+    AFTER UPDATE OF data, categoria, tipo, usuario, valor, valor_centavos ON lancamentos
+    BEGIN{_RESUMO_SUBTRAIR_OLD}{_RESUMO_SOMAR_NEW}    END
+    """,
+}
+
+# Índice de texto completo (FTS5) espelhando lancamentos
+# remove_diacritics 2: "Joao" encontra "João"
+SQL_CRIAR_FTS = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS lancamentos_fts USING fts5(
+        nome, email, celular,
+        content='lancamentos', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+
+_FTS_INSERIR_NEW = """
+        INSERT INTO lancamentos_fts (rowid, nome, email, celular)
+        VALUES (NEW.id, NEW.nome, NEW.email, NEW.celular);
+"""
+
+_FTS_REMOVER_OLD = """
+        INSERT INTO lancamentos_fts (lancamentos_fts, rowid, nome, email, celular)
+        VALUES ('delete', OLD.id, OLD.nome, OLD.email, OLD.celular);
+"""
+
+# Gatilhos que mantêm lancamentos_fts em dia com lancamentos (nome -> DDL)
+GATILHOS_FTS = {
+    "trg_lancamentos_fts_insert": f"""
+    CREATE TRIGGER IF NOT EXISTS trg_lancamentos_fts_insert
+    AFTER INSERT ON lancamentos
+    BEGIN{_FTS_INSERIR_NEW}    END
+    """,
+    "trg_lancamentos_fts_delete": f"""
+    CREATE TRIGGER IF NOT EXISTS trg_lancamentos_fts_delete
+    AFTER DELETE ON lancamentos
+    BEGIN{_FTS_REMOVER_OLD}    END
+    """,
+    "trg_lancamentos_fts_update": f"""
+    CREATE TRIGGER IF NOT EXISTS trg_lancamentos_fts_update
+    AFTER UPDATE OF nome, email, celular ON lancamentos
+    BEGIN{_FTS_REMOVER_OLD}{_FTS_INSERIR_NEW}    END
+    """,
+}
+
+# Recalcula o resumo a partir de lancamentos (usado na migração e na reconstrução)
+SQL_RESUMO_DIARIO_ESPERADO = """
+    SELECT data, categoria, tipo, usuario,
+           SUM(COALESCE(valor_centavos, CAST(ROUND(valor * 100) AS INTEGER))) AS total,
+           COUNT(*) AS quantidade
+    FROM lancamentos
+    GROUP BY data, categoria, tipo, usuario
+"""
+
+
+# ============================================
+# MIGRAÇÕES
+# ============================================
+
+def _migracao_001_indices(conn: sqlite3.Connection):
+    """
+    Índices compostos para as consultas mais frequentes
+
+    - (data, id): ORDER BY data DESC, id DESC e paginação por cursor (admin)
+    - (usuario, data, id): mesmo caso, filtrado pelo usuário que registrou
+    - (usuario, data, categoria, valor): índice de cobertura para obter_totais,
+      tanto filtrado por usuário quanto na varredura completa do admin
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lancamentos_data_id ON lancamentos (data, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lancamentos_usuario_data_id ON lancamentos (usuario, data, id)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_lancamentos_totais "
+        "ON lancamentos (usuario, data, categoria, valor)"
+    )
+
+
+def _migracao_002_valor_centavos(conn: sqlite3.Connection):
+    """
+    Valor monetário exato em centavos (INTEGER)
+
+    A coluna REAL acumula erro de arredondamento nas somas. valor_centavos passa
+    a ser a fonte de verdade; valor continua preenchido por compatibilidade.
+    O índice de totais é recriado sobre a coluna inteira.
+    """
+    conn.execute("ALTER TABLE lancamentos ADD COLUMN valor_centavos INTEGER")
+    conn.execute("UPDATE lancamentos SET valor_centavos = CAST(ROUND(valor * 100) AS INTEGER)")
+    conn.execute("DROP INDEX IF EXISTS idx_lancamentos_totais")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_lancamentos_totais_centavos "
+        "ON lancamentos (usuario, data, categoria, valor_centavos)"
+    )
+
+
+def _migracao_003_resumo_diario(conn: sqlite3.Connection):
+    """
+    Tabela resumo_diario pré-agregada e mantida por gatilhos
+
+    Uma linha por (data, categoria, tipo, usuario) com o total em centavos e a
+    quantidade de lançamentos. Os totais do painel leem poucas linhas daqui
+    em vez de varrer lancamentos.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS resumo_diario (
+            data TEXT NOT NULL,
+            categoria TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            usuario TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            quantidade INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (data, categoria, tipo, usuario)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_resumo_diario_usuario ON resumo_diario (usuario, data)")
+    conn.execute(f"INSERT INTO resumo_diario (data, categoria, tipo, usuario, total, quantidade) {SQL_RESUMO_DIARIO_ESPERADO}")
+
+    for ddl in GATILHOS_RESUMO_DIARIO.values():
+        conn.execute(ddl)
+
+    # Os totais não leem mais lancamentos: o índice de cobertura só custaria escrita
+    conn.execute("DROP INDEX IF EXISTS idx_lancamentos_totais_centavos")
+
+
+def _migracao_004_indices_busca(conn: sqlite3.Connection):
+    """
+    Índices para a busca de lançamentos da página Editar
+
+    - nome COLLATE NOCASE: permite a otimização de LIKE 'prefixo%' (sem
+      diferenciar maiúsculas) e ordena os resultados por nome
+    - (valor_centavos, data, id): busca por valor exato já ordenada por data
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lancamentos_nome ON lancamentos (nome COLLATE NOCASE)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_lancamentos_valor "
+        "ON lancamentos (valor_centavos, data, id)"
+    )
+
+
+def _migracao_005_busca_texto(conn: sqlite3.Connection):
+    """
+    Busca de texto completo (FTS5) por nome, email e celular
+
+    Tabela de conteúdo externo: o texto fica apenas em lancamentos, e o
+    índice é mantido pelos gatilhos GATILHOS_FTS.
+    """
+    conn.execute(SQL_CRIAR_FTS)
+    conn.execute("INSERT INTO lancamentos_fts (lancamentos_fts) VALUES ('rebuild')")
+
+    for ddl in GATILHOS_FTS.values():
+        conn.execute(ddl)
+
+
+def _migracao_006_outbox(conn: sqlite3.Connection):
+    """
+    Fila (outbox) de confirmações por WhatsApp
+
+    A mensagem é gravada na mesma transação do lançamento e enviada depois
+    por outbox_worker.py. status: pendente, enviando, enviado, erro ou
+    cancelado. proxima_tentativa (epoch) agenda a nova tentativa de uma
+    mensagem pendente e marca o fim da reserva de uma mensagem em envio.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lancamento_id INTEGER NOT NULL,
+            telefone TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pendente',
+            tentativas INTEGER NOT NULL DEFAULT 0,
+            proxima_tentativa REAL NOT NULL DEFAULT 0,
+            resultado TEXT,
+            criado_em TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            enviado_em TEXT
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_outbox_fila ON outbox (proxima_tentativa) "
+        "WHERE status IN ('pendente', 'enviando')"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_lancamento ON outbox (lancamento_id)")
+
+
+def _migracao_007_campanhas(conn: sqlite3.Connection):
+    """
+    Campanhas de WhatsApp em massa e o progresso de cada destinatário
+
+    A chave (campanha_id, telefone) garante um envio por número; o status
+    de cada destinatário (pendente, enviado, erro) permite retomar uma
+    campanha interrompida de onde parou.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS campanhas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            modelo TEXT NOT NULL,
+            criada_em TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            concluida_em TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS campanha_destinatarios (
+            campanha_id INTEGER NOT NULL,
+            telefone TEXT NOT NULL,
+            nome TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pendente',
+            resultado TEXT,
+            enviado_em TEXT,
+            PRIMARY KEY (campanha_id, telefone)
+        ) WITHOUT ROWID
+    """)
+
+
+def _migracao_008_arquivo_anual(conn: sqlite3.Connection):
+    """
+    Manifesto dos anos encerrados arquivados em Parquet e seus resumos
+
+    anos_arquivados tem uma linha por ano movido de lancamentos para um arquivo
+    Parquet (arquivo_anual.py); resumo_arquivado guarda os totais desses anos
+    por (mês, categoria, tipo, usuário), para que obter_totais continue
+    somando os anos arquivados sem abrir os arquivos. Ambos são gravados na
+    mesma transação que remove as linhas de lancamentos.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS anos_arquivados (
+            ano INTEGER PRIMARY KEY,
+            arquivo TEXT NOT NULL,
+            linhas INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            data_inicio TEXT NOT NULL,
+            data_fim TEXT NOT NULL,
+            bytes INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            arquivado_em TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS resumo_arquivado (
+            mes TEXT NOT NULL,
+            categoria TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            usuario TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            PRIMARY KEY (mes, categoria, tipo, usuario)
+        ) WITHOUT ROWID
+    """)
+
+
+def _migracao_009_particoes(conn: sqlite3.Connection):
+    """
+    Registro dos anos guardados em partições (um arquivo SQLite por ano)
+
+    Cada linha indica que os lançamentos do ano ficam em particoes/<arquivo>,
+    anexado com ATTACH quando uma escrita ou leitura precisa dele (ver
+    database.particionar_ano). resumo_diario continua no arquivo principal
+    e cobre também os anos particionados.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS particoes (
+            ano INTEGER PRIMARY KEY,
+            arquivo TEXT NOT NULL,
+            criada_em TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+
+
+def _migracao_010_sessoes(conn: sqlite3.Connection):
+    """
+    Geração dos tokens de sessão por usuário
+
+    O token guarda a geração em que foi emitido; "Sair" incrementa a geração
+    do usuário e revoga todos os tokens anteriores (inclusive links copiados).
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sessoes (
+            usuario TEXT PRIMARY KEY,
+            geracao INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+
+
+def _migracao_011_sessoes_revogadas(conn: sqlite3.Connection):
+    """
+    Revogação de cada token de sessão (botão "Sair")
+
+    O token leva um identificador próprio (jti); "Sair" grava só o desse
+    token até ele expirar, e os outros aparelhos do mesmo usuário continuam
+    conectados. Substitui a geração por usuário (sessoes), que revogava todos.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sessoes_revogadas (
+            jti TEXT PRIMARY KEY,
+            expira_em INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("DROP TABLE IF EXISTS sessoes")
+
+
+# Lista ordenada de migrações: (versão, descrição, função)
+# Nunca altere uma migração já publicada - crie uma nova versão
+MIGRACOES: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "Índices compostos da tabela lancamentos", _migracao_001_indices),
+    (2, "Coluna valor_centavos (INTEGER) com valores exatos", _migracao_002_valor_centavos),
+    (3, "Tabela resumo_diario mantida por gatilhos", _migracao_003_resumo_diario),
+    (4, "Índices de busca por nome e valor", _migracao_004_indices_busca),
+    (5, "Busca de texto completo (FTS5) em nome, email e celular", _migracao_005_busca_texto),
+    (6, "Fila (outbox) de confirmações por WhatsApp", _migracao_006_outbox),
+    (7, "Campanhas de WhatsApp e progresso por destinatário", _migracao_007_campanhas),
+    (8, "Manifesto e resumos dos anos arquivados em Parquet", _migracao_008_arquivo_anual),
+    (9, "Registro das partições anuais (um arquivo SQLite por ano)", _migracao_009_particoes),
+    (10, "Geração dos tokens de sessão por usuário (revogação ao sair)", _migracao_010_sessoes),
+    (11, "Revogação de cada token de sessão (sair em um aparelho só)", _migracao_011_sessoes_revogadas),
+]
+
+
+# ============================================
+# EXECUÇÃO
+# ============================================
+
+def versao_atual(conn: sqlite3.Connection) -> int:
+    """Retorna a versão do esquema gravada em PRAGMA user_version"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def versao_mais_recente() -> int:
+    """Retorna a versão mais recente conhecida pelo código"""
+    return MIGRACOES[-1][0] if MIGRACOES else 0
+
+
+def aplicar_migracoes(conn: sqlite3.Connection) -> List[int]:
+    """
+    Aplica as migrações pendentes, cada uma em sua própria transação
+
+    A versão é conferida novamente dentro da transação (BEGIN IMMEDIATE),
+    de modo que dois processos iniciando juntos não aplicam a mesma migração.
+
+    Args:
+        conn: Conexão aberta com o banco de dados
+
+    Returns:
+        Lista com as versões aplicadas nesta chamada
+    """
+    aplicadas = []
+
+    for versao, descricao, migrar in MIGRACOES:
+        if versao <= versao_atual(conn):
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if versao <= versao_atual(conn):
+                conn.rollback()
+                continue
+
+            migrar(conn)
+            conn.execute(f"PRAGMA user_version = {int(versao)}")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Erro ao aplicar migração {versao} ({descricao}): {e}")
+            raise
+
+        print(f"Migração {versao} aplicada: {descricao}")
+        aplicadas.append(versao)
+
+    return aplicadas
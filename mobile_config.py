@@ -1,284 +1,86 @@
 """
 CSS e Configurações Responsivas para Mobile
 """
+import functools
+import hashlib
+import os
+import re
+
 import streamlit as st
 
 
+# Folha de estilos única do aplicativo: a fonte legível é minificada antes do
+# deploy (python mobile_config.py) e o arquivo versionado estilos.min.css é
+# servido, só para leitura, pelo static serving do Streamlit (.streamlit/config.toml)
+CAMINHO_CSS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "estilos.css")
+CAMINHO_CSS_MINIFICADO = os.path.join(os.path.dirname(CAMINHO_CSS), "estilos.min.css")
+URL_CSS_MINIFICADO = "app/static/estilos.min.css"
+
+
+def minificar_css(css: str) -> str:
+    """
+    Remove comentários, quebras de linha e espaços em volta de { } ; , e >
+
+    Não mexe nos espaços em volta de ":" - em seletores eles mudam o
+    significado ("div :hover" não é "div:hover").
+    """
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.DOTALL)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = css.replace(";}", "}")
+    return css.strip()
+
+
+def gerar_css_minificado() -> str:
+    """
+    Gera static/estilos.min.css a partir de static/estilos.css
+
+    Executada ao editar a folha de estilos (python mobile_config.py), não pelo
+    aplicativo: o arquivo gerado é versionado junto com a fonte.
+
+    Returns:
+        CSS minificado
+    """
+    with open(CAMINHO_CSS, encoding="utf-8") as arquivo:
+        css = minificar_css(arquivo.read())
+
+    with open(CAMINHO_CSS_MINIFICADO, "w", encoding="utf-8") as arquivo:
+        arquivo.write(css)
+
+    return css
+
+
+@functools.lru_cache(maxsize=1)
+def _tag_css() -> str:
+    """
+    Tag enviada ao navegador a cada rerun (calculada uma vez por processo)
+
+    Com o static serving habilitado, é apenas um @import da folha de estilos,
+    que o navegador baixa uma vez e guarda em cache; o parâmetro ?v= muda
+    quando o CSS muda. Sem static serving, o CSS minificado vai inline.
+    Sem estilos.min.css, usa a fonte legível inline.
+    """
+    try:
+        with open(CAMINHO_CSS_MINIFICADO, encoding="utf-8") as arquivo:
+            css = arquivo.read()
+    except OSError as e:
+        print(f"Erro ao ler o CSS minificado (execute python mobile_config.py): {e}")
+        with open(CAMINHO_CSS, encoding="utf-8") as arquivo:
+            return f"<style>{arquivo.read()}</style>"
+
+    if not st.get_option("server.enableStaticServing"):
+        return f"<style>{css}</style>"
+
+    versao = hashlib.sha1(css.encode("utf-8")).hexdigest()[:10]
+    return f'<style>@import url("{URL_CSS_MINIFICADO}?v={versao}");</style>'
+
+
 def aplicar_css_mobile():
     """
-    Aplica CSS customizado para melhorar a experiência mobile
+    Aplica o CSS do aplicativo (responsivo para mobile, login, usuário e logo)
     """
-    st.markdown("""
-    <style>
-    /* ========================================
-       CONFIGURAÇÕES GERAIS MOBILE
-       ======================================== */
-    
-    /* Remover padding extra em mobile */
-    @media (max-width: 768px) {
-        .block-container {
-            padding-top: 2rem !important;
-            padding-left: 1rem !important;
-            padding-right: 1rem !important;
-        }
-        
-        /* Título principal menor em mobile */
-        h1 {
-            font-size: 1.5rem !important;
-        }
-        
-        h2 {
-            font-size: 1.3rem !important;
-        }
-        
-        h3 {
-            font-size: 1.1rem !important;
-        }
-        
-        h4 {
-            font-size: 1rem !important;
-        }
-    }
-    
-    /* ========================================
-       SIDEBAR MOBILE
-       ======================================== */
-    
-    @media (max-width: 768px) {
-        /* Sidebar mais compacta */
-        [data-testid="stSidebar"] {
-            min-width: 200px !important;
-        }
-        
-        /* Logo menor em mobile */
-        [data-testid="stSidebar"] img {
-            max-width: 100px !important;
-            margin: 0 auto !important;
-            display: block !important;
-        }
-    }
-    
-    /* ========================================
-       FORMULÁRIOS E INPUTS
-       ======================================== */
-    
-    /* Inputs maiores para toque em mobile */
-    @media (max-width: 768px) {
-        input, select, textarea {
-            font-size: 16px !important;
-            min-height: 44px !important;
-        }
-        
-        button {
-            min-height: 44px !important;
-            font-size: 16px !important;
-        }
-        
-        /* Botões mais espaçados */
-        .stButton button {
-            width: 100% !important;
-            margin: 0.5rem 0 !important;
-        }
-    }
-    
-    /* ========================================
-       MÉTRICAS E CARDS
-       ======================================== */
-    
-    /* Métricas responsivas */
-    @media (max-width: 768px) {
-        [data-testid="stMetricValue"] {
-            font-size: 1.2rem !important;
-        }
-        
-        [data-testid="stMetricLabel"] {
-            font-size: 0.9rem !important;
-        }
-        
-        /* Cards de métrica com espaçamento */
-        [data-testid="metric-container"] {
-            padding: 0.5rem !important;
-            margin-bottom: 0.5rem !important;
-        }
-    }
-    
-    /* ========================================
-       TABELAS E DATAFRAMES
-       ======================================== */
-    
-    /* Tabelas com scroll horizontal suave */
-    @media (max-width: 768px) {
-        [data-testid="stDataFrame"] {
-            font-size: 12px !important;
-        }
-        
-        /* Melhor visualização de tabelas */
-        .dataframe {
-            font-size: 11px !important;
-        }
-        
-        .dataframe th {
-            font-size: 11px !important;
-            padding: 4px !important;
-        }
-        
-        .dataframe td {
-            font-size: 11px !important;
-            padding: 4px !important;
-        }
-    }
-    
-    /* ========================================
-       INFORMAÇÕES E ALERTAS
-       ======================================== */
-    
-    /* Info boxes responsivas */
-    @media (max-width: 768px) {
-        .stAlert {
-            font-size: 0.9rem !important;
-            padding: 0.75rem !important;
-        }
-    }
-    
-    /* ========================================
-       COLUNAS RESPONSIVAS
-       ======================================== */
-    
-    /* Forçar colunas a empilhar em mobile */
-    @media (max-width: 768px) {
-        [data-testid="column"] {
-            width: 100% !important;
-            flex: 100% !important;
-        }
-    }
-    
-    /* ========================================
-       EXPANDERS E CONTAINERS
-       ======================================== */
-    
-    @media (max-width: 768px) {
-        .streamlit-expanderHeader {
-            font-size: 0.95rem !important;
-        }
-        
-        .streamlit-expanderContent {
-            font-size: 0.9rem !important;
-        }
-    }
-    
-    /* ========================================
-       GRÁFICOS
-       ======================================== */
-    
-    /* Gráficos responsivos */
-    @media (max-width: 768px) {
-        [data-testid="stVegaLiteChart"] {
-            width: 100% !important;
-        }
-    }
-    
-    /* ========================================
-       LOGIN E USUARIO INFO
-       ======================================== */
-    
-    /* Área de usuário compacta em mobile */
-    @media (max-width: 768px) {
-        .user-info {
-            font-size: 0.85rem !important;
-            text-align: right !important;
-        }
-        
-        .user-info button {
-            font-size: 0.85rem !important;
-            padding: 0.25rem 0.75rem !important;
-        }
-    }
-    
-    /* ========================================
-       MELHORIAS GERAIS DE UX MOBILE
-       ======================================== */
-    
-    /* Remover zoom em inputs (iOS) */
-    input[type="text"],
-    input[type="number"],
-    input[type="email"],
-    input[type="password"],
-    select,
-    textarea {
-        font-size: 16px !important;
-    }
-    
-    /* Links e botões mais fáceis de tocar */
-    a, button {
-        padding: 0.5rem !important;
-        margin: 0.25rem 0 !important;
-    }
-    
-    /* Scroll suave */
-    html {
-        scroll-behavior: smooth;
-    }
-    
-    /* ========================================
-       FORM SUBMIT BUTTONS
-       ======================================== */
-    
-    @media (max-width: 768px) {
-        .stFormSubmitButton button {
-            width: 100% !important;
-            min-height: 50px !important;
-            font-size: 1.1rem !important;
-            font-weight: 600 !important;
-            margin-top: 1rem !important;
-        }
-    }
-    
-    /* ========================================
-       SELECTBOX E MULTISELECT
-       ======================================== */
-    
-    @media (max-width: 768px) {
-        [data-baseweb="select"] {
-            font-size: 16px !important;
-        }
-    }
-    
-    /* ========================================
-       DATE INPUT
-       ======================================== */
-    
-    @media (max-width: 768px) {
-        [data-baseweb="input"] {
-            font-size: 16px !important;
-        }
-    }
-    
-    /* ========================================
-       DIVIDERS
-       ======================================== */
-    
-    @media (max-width: 768px) {
-        hr {
-            margin: 1rem 0 !important;
-        }
-    }
-    
-    /* ========================================
-       CHECKBOX E RADIO
-       ======================================== */
-    
-    @media (max-width: 768px) {
-        [data-testid="stCheckbox"] label {
-            font-size: 16px !important;
-        }
-        
-        [data-testid="stRadio"] label {
-            font-size: 16px !important;
-        }
-    }
-    
-    </style>
-    """, unsafe_allow_html=True)
+    # <link> é removido pelo sanitizador de st.html; @import dentro de <style> não
+    st.html(_tag_css())
 
 
 def detectar_mobile():
@@ -296,3 +98,8 @@ def detectar_mobile():
         "usuario_info": [3, 1],  # Título e info do usuário
         "logo_width": 120,  # Largura da logo
     }
+
+
+if __name__ == "__main__":
+    css = gerar_css_minificado()
+    print(f"✅ {CAMINHO_CSS_MINIFICADO} gerado ({len(css)} bytes)")
@@ -1,21 +1,26 @@
 """
 Página de Edição de Lançamentos
 Permite editar e excluir lançamentos (apenas admin)
-Inclui edição de dados de contato
+Inclui edição de dados de contato e importação de planilhas históricas
 Otimizado para Desktop e Mobile
 """
+import io
 import streamlit as st
 from datetime import datetime
-from database import obter_lancamentos, atualizar_lancamento, excluir_lancamento
-from config import TIPOS_PAGAMENTO, CATEGORIAS, OPERADORAS
-from utils import validar_nome, validar_valor, formatar_valor
+from database import (
+    pesquisar_lancamentos, obter_lancamento_por_id, atualizar_lancamento, excluir_lancamento, anos_arquivados
+)
+from config import TIPOS_PAGAMENTO, CATEGORIAS, OPERADORAS, LIMITE_BUSCA_EDICAO
+from utils import validar_nome, validar_valor, formatar_valor, reais_para_centavos, centavos_para_reais
 from notifications import validar_email, validar_celular
 from mobile_config import detectar_mobile
+from importar_lancamentos import importar_arquivo
 
 
 def exibir_pagina_editar():
     """
     Exibe a página de edição de lançamentos (apenas admin)
+    O lançamento é localizado por uma busca limitada, sem carregar a tabela inteira
     Permite editar todos os campos incluindo contatos
     Layout responsivo para mobile
     """
@@ -23,28 +28,33 @@ def exibir_pagina_editar():
     
     st.subheader("✏️ Editar Lançamentos")
     
-    lancamentos = obter_lancamentos()
+    with st.expander("📥 Importar planilha histórica (CSV ou XLSX)"):
+        exibir_importacao_planilha()
     
-    if lancamentos:
-        # Criar lista de opções para seleção
-        lancamentos_para_edicao = {
-            f"ID: {l[0]} - {l[2]} - {formatar_valor(l[3])} - {l[1]}": l[0] 
-            for l in lancamentos
+    resultados = exibir_busca_lancamentos(config)
+    
+    if resultados:
+        # Apenas os resultados da busca (no máximo LIMITE_BUSCA_EDICAO) vão para o navegador
+        rotulos = {
+            l[0]: f"ID: {l[0]} - {l[2]} - {formatar_valor(l[3])} - {l[1]}"
+            for l in resultados
         }
         
-        selected = st.selectbox(
+        id_selecionado = st.selectbox(
             "Selecione um lançamento para editar", 
-            options=list(lancamentos_para_edicao.keys())
+            options=list(rotulos.keys()),
+            format_func=rotulos.get
         )
         
-        id_selecionado = lancamentos_para_edicao[selected]
+        # Anos arquivados em Parquet aparecem na busca, mas não podem ser editados
+        data_selecionada = next(l[1] for l in resultados if l[0] == id_selecionado)
+        if anos_arquivados([int(data_selecionada[:4])]):
+            st.info(f"🗄️ {data_selecionada[:4]} está arquivado em Parquet: o lançamento pode ser consultado, "
+                    "mas não editado nem excluído.")
+            return
         
-        # Encontrar o lançamento selecionado
-        lancamento_selecionado = None
-        for l in lancamentos:
-            if l[0] == id_selecionado:
-                lancamento_selecionado = l
-                break
+        # Registro completo lido pelo ID (consulta pela chave primária)
+        lancamento_selecionado = obter_lancamento_por_id(id_selecionado)
         
         if not lancamento_selecionado:
             st.error("❌ Lançamento não encontrado.")
@@ -66,7 +76,7 @@ def exibir_pagina_editar():
             
             valor = st.number_input(
                 "Valor (R$)", 
-                value=float(lancamento_selecionado[3]), 
+                value=centavos_para_reais(lancamento_selecionado[3]), 
                 min_value=0.01, 
                 step=0.01, 
                 format="%.2f"
@@ -210,13 +220,14 @@ def exibir_pagina_editar():
                     id_selecionado,
                     data.strftime("%Y-%m-%d"),
                     nome.strip(),
-                    float(valor),
+                    reais_para_centavos(valor),
                     tipo,
                     categoria,
                     email=email_valido,
                     codigo_area=codigo_area_valido,
                     celular=celular_valido,
-                    operadora=operadora_valida
+                    operadora=operadora_valida,
+                    data_atual=lancamento_selecionado[1]
                 )
                 
                 if sucesso:
@@ -229,7 +240,7 @@ def exibir_pagina_editar():
                 # Confirmação de exclusão
                 st.warning("⚠️ Tem certeza que deseja excluir este lançamento?")
                 
-                sucesso = excluir_lancamento(id_selecionado)
+                sucesso = excluir_lancamento(id_selecionado, lancamento_selecionado[1])
                 
                 if sucesso:
                     st.success("✅ Lançamento excluído com sucesso!")
@@ -237,4 +248,112 @@ def exibir_pagina_editar():
                 else:
                     st.error("❌ Erro ao excluir lançamento. Tente novamente.")
     else:
-        st.info("ℹ️ Nenhum lançamento disponível para edição")
+        st.info("ℹ️ Nenhum lançamento encontrado para os filtros informados")
+
+
+def exibir_busca_lancamentos(config):
+    """
+    Exibe os filtros de busca e retorna os lançamentos encontrados
+    
+    A busca usa consultas indexadas (nome, período, valor ou ID) e retorna no
+    máximo LIMITE_BUSCA_EDICAO resultados. Sem filtros, mostra os mais recentes.
+    """
+    st.markdown("#### 🔎 Localizar Lançamento")
+    
+    busca = st.text_input(
+        "Nome ou ID",
+        placeholder="Digite o início do nome ou o número do ID",
+        help="Pressione Enter para buscar. Sem filtros, são listados os lançamentos mais recentes"
+    ).strip()
+    
+    with st.expander("Filtros adicionais"):
+        col1, col2 = st.columns(config["form_dupla"])
+        with col1:
+            periodo = st.date_input("Período", value=(), format="DD/MM/YYYY")
+        with col2:
+            valor = st.number_input("Valor exato (R$)", value=None, min_value=0.01, step=0.01, format="%.2f")
+    
+    filtros = {
+        "data_inicio": periodo[0].strftime("%Y-%m-%d") if len(periodo) > 0 else None,
+        "data_fim": periodo[-1].strftime("%Y-%m-%d") if len(periodo) > 0 else None,
+        "valor_centavos": reais_para_centavos(valor) if valor is not None else None,
+        "limite": LIMITE_BUSCA_EDICAO
+    }
+    
+    if busca.isdigit():
+        filtros["id_lancamento"] = int(busca)
+    elif busca:
+        filtros["nome"] = busca
+    
+    resultados = pesquisar_lancamentos(**filtros)
+    
+    if len(resultados) == LIMITE_BUSCA_EDICAO:
+        st.caption(f"Mostrando os primeiros {LIMITE_BUSCA_EDICAO} resultados - refine a busca para encontrar outros")
+    
+    return resultados
+
+
+def exibir_importacao_planilha():
+    """
+    Importa uma planilha de lançamentos antigos enviada pelo administrador
+    
+    A leitura é feita em blocos (importar_lancamentos.importar_arquivo); a
+    simulação apenas valida. As linhas recusadas, com o motivo, ficam
+    disponíveis para download até a próxima importação.
+    """
+    st.caption(
+        "Colunas: data, nome, valor, tipo, categoria e, opcionalmente, email e celular. "
+        "Datas em DD/MM/AAAA ou AAAA-MM-DD."
+    )
+    
+    with st.form("importar_form", clear_on_submit=False):
+        arquivo = st.file_uploader("Planilha", type=["csv", "xlsx"])
+        simular = st.checkbox("Apenas simular (valida sem gravar)", value=True)
+        importar_btn = st.form_submit_button("📥 Importar", width="stretch")
+    
+    if importar_btn:
+        if arquivo is None:
+            st.error("❌ Selecione uma planilha.")
+            return
+        
+        rejeitados = io.StringIO()
+        andamento = st.empty()
+        
+        def mostrar_progresso(lidas, recusadas):
+            andamento.caption(f"⏳ {lidas} linha(s) lida(s), {recusadas} recusada(s)...")
+        
+        try:
+            with st.spinner("Importando..."):
+                resultado = importar_arquivo(
+                    arquivo, st.session_state["usuario"], nome_arquivo=arquivo.name,
+                    simular=simular, rejeitados=rejeitados, progresso=mostrar_progresso
+                )
+        except (ValueError, UnicodeDecodeError) as e:
+            andamento.empty()
+            st.error(f"❌ {e}")
+            return
+        
+        andamento.empty()
+        st.session_state["importacao_resultado"] = resultado
+        st.session_state["importacao_rejeitados"] = rejeitados.getvalue().encode("utf-8-sig")
+    
+    resultado = st.session_state.get("importacao_resultado")
+    if not resultado:
+        return
+    
+    if resultado["importadas"] is None:
+        st.error("❌ Erro ao gravar os lançamentos. Nada foi importado.")
+    elif resultado["simulacao"]:
+        st.info(f"🔍 Simulação: {resultado['validas']} de {resultado['lidas']} linha(s) seriam importadas.")
+    else:
+        st.success(f"✅ {resultado['importadas']} lançamento(s) importado(s) em {resultado['segundos']:.1f}s.")
+    
+    if resultado["rejeitadas"]:
+        st.warning(f"⚠️ {resultado['rejeitadas']} linha(s) recusada(s).")
+        st.download_button(
+            "⬇️ Baixar linhas recusadas (CSV)",
+            data=st.session_state["importacao_rejeitados"],
+            file_name="linhas_recusadas.csv",
+            mime="text/csv",
+            width="stretch"
+        )
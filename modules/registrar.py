@@ -1,66 +1,21 @@
 """
 Página de Registro de Lançamentos
-Permite cadastrar novos dízimos, ofertas e contribuições com envio de WhatsApp
+Permite cadastrar novos dízimos, ofertas e contribuições com envio de WhatsApp,
+um de cada vez ou em lote (grade editável gravada em uma única transação)
+A confirmação por WhatsApp é enfileirada (outbox) e enviada em segundo plano
 Otimizado para Desktop e Mobile
 """
 import streamlit as st
 import re
 from datetime import datetime
-from database import adicionar_lancamento
+from typing import List, Optional, Tuple
+from database import adicionar_lancamento, adicionar_lancamentos_lote, anos_arquivados
 from config import TIPOS_PAGAMENTO, CATEGORIAS
-from utils import validar_nome, validar_valor, formatar_data
-from whatsapp_service import enviar_whatsapp_contribuicao
+from utils import validar_nome, validar_valor, validar_telefone, formatar_telefone, reais_para_centavos
+from outbox_worker import notificar_outbox
 from mobile_config import detectar_mobile
 
 
-def validar_telefone(telefone: str) -> tuple[bool, str]:
-    """
-    Valida formato de telefone brasileiro
-    
-    Args:
-        telefone: Número de telefone
-    
-    Returns:
-        (valido: bool, mensagem: str)
-    
-    Formatos aceitos:
-    - (11) 99999-9999
-    - 11999999999
-    - 11 999999999
-    """
-    if not telefone:
-        return False, "Telefone é obrigatório."
-    
-    # Remove caracteres não numéricos
-    numeros = ''.join(filter(str.isdigit, telefone))
-    
-    # Valida quantidade de dígitos (DDD + 9 dígitos)
-    if len(numeros) != 11:
-        return False, "Telefone deve conter 11 dígitos (DDD + 9 dígitos)."
-    
-    # Valida se começa com dígito 9 (celular)
-    if numeros[2] != '9':
-        return False, "Número deve ser de celular (iniciar com 9)."
-    
-    return True, "Telefone válido."
-
-
-def formatar_telefone(telefone: str) -> str:
-    """
-    Formata telefone para padrão visual
-    
-    Args:
-        telefone: Telefone com apenas números
-    
-    Returns:
-        String formatada: (11) 99999-9999
-    """
-    numeros = ''.join(filter(str.isdigit, telefone))
-    if len(numeros) == 11:
-        return f"({numeros[:2]}) {numeros[2:7]}-{numeros[7:]}"
-    return telefone
-
-
 def exibir_pagina_registrar():
     """
     Exibe a página de registro de novos lançamentos
@@ -71,6 +26,21 @@ def exibir_pagina_registrar():
     
     st.subheader("➕ Registrar Novo Lançamento")
     
+    # Resultado do registro anterior (o formulário é recriado após o registro)
+    for aviso in st.session_state.pop("registrar_avisos", []):
+        st.success(aviso)
+    
+    modo = st.radio(
+        "Modo de registro",
+        ["Um lançamento", "Vários lançamentos (lote)"],
+        horizontal=True,
+        help="No lote, digite vários envelopes em uma grade e registre todos de uma vez"
+    )
+    
+    if modo != "Um lançamento":
+        exibir_registro_lote()
+        return
+    
     # Informação sobre notificações WhatsApp
     st.info("📱 **WhatsApp:** Disponível apenas para pagamentos via **PIX**! Preencha o celular para enviar confirmação automática.")
     
@@ -165,71 +135,239 @@ def exibir_pagina_registrar():
         # PROCESSAMENTO DO FORMULÁRIO
         # ============================================
         if submit_button:
-            # Mostra indicador de carregamento para validação e processamento
-            with st.spinner("🔄 Processando lançamento..."):
-                # Validação do nome
-                if not validar_nome(nome):
-                    st.error("❌ O nome deve ter pelo menos 2 caracteres.")
-                    return
-                
-                # Validação do valor
-                if not validar_valor(valor):
-                    st.error("❌ O valor deve ser maior que zero.")
-                    return
-                
-                # Validação do telefone
-                telefone_valido, msg_telefone = validar_telefone(telefone)
-                if not telefone_valido:
-                    st.error(f"❌ {msg_telefone}")
-                    return
-                
-                # Formata telefone para salvamento
-                telefone_formatado = formatar_telefone(telefone)
+            # Validação do nome
+            if not validar_nome(nome):
+                st.error("❌ O nome deve ter pelo menos 2 caracteres.")
+                return
+            
+            # Validação do valor
+            if not validar_valor(valor):
+                st.error("❌ O valor deve ser maior que zero.")
+                return
+            
+            # Validação do telefone
+            telefone_valido, msg_telefone = validar_telefone(telefone)
+            if not telefone_valido:
+                st.error(f"❌ {msg_telefone}")
+                return
+            
+            # Ano arquivado em Parquet não aceita lançamentos (o banco também recusa)
+            if anos_arquivados([data.year]):
+                st.error(f"❌ {data.year} está arquivado e não aceita novos lançamentos.")
+                return
+            
+            # Formata telefone para salvamento
+            telefone_formatado = formatar_telefone(telefone)
+            
+            # Valor exato em centavos (evita erros de arredondamento do float)
+            valor_centavos = reais_para_centavos(valor)
+            
+            # WhatsApp apenas se solicitado e se for PIX
+            confirmar_whatsapp = enviar_whatsapp and tipo == "Pix"
+            
+            # Adicionar lançamento ao banco (e a confirmação à fila, na mesma transação)
+            sucesso = adicionar_lancamento(
+                data.strftime("%Y-%m-%d"),
+                nome.strip(),
+                valor_centavos,
+                tipo,
+                categoria,
+                st.session_state["usuario"],
+                email.strip() if email else None,
+                telefone=telefone_formatado,
+                enviar_whatsapp=confirmar_whatsapp
+            )
+            
+            if sucesso:
+                avisos = ["✅ Lançamento registrado com sucesso!"]
                 
-                # Mostra progresso detalhado
-                progress_placeholder = st.empty()
-                progress_placeholder.info("💾 Salvando dados no banco...")
+                if confirmar_whatsapp:
+                    # O envio acontece em segundo plano; o status aparece em Visualizar
+                    notificar_outbox()
+                    avisos.append("📲 Confirmação via WhatsApp na fila de envio.")
                 
-                # Adicionar lançamento ao banco
-                sucesso = adicionar_lancamento(
-                    data.strftime("%Y-%m-%d"),
-                    nome.strip(),
-                    float(valor),
-                    tipo,
-                    categoria,
-                    st.session_state["usuario"],
-                    email.strip() if email else None,
-                    telefone=telefone_formatado
-                )
+                st.session_state["registrar_avisos"] = avisos
                 
-                if sucesso:
-                    progress_placeholder.empty()
-                    st.success("✅ Lançamento registrado com sucesso!")
-                    
-                    # Enviar WhatsApp se solicitado e se for PIX
-                    if enviar_whatsapp and tipo == "Pix":
-                        with st.spinner("📱 Enviando confirmação via WhatsApp..."):
-                            sucesso_whats, msg_whats = enviar_whatsapp_contribuicao(
-                                telefone_formatado,
-                                nome.strip(),
-                                float(valor),
-                                categoria,
-                                formatar_data(data.strftime("%Y-%m-%d"))
-                            )
-                            
-                            if sucesso_whats:
-                                st.success(f"📲 {msg_whats}")
-                            else:
-                                st.warning(f"⚠️ Lançamento registrado, mas: {msg_whats}")
-                    
-                    # Incrementa contador do formulário para forçar limpeza dos campos
-                    st.session_state.form_counter += 1
-                    
-                    # Mostra mensagem de reload
-                    with st.spinner("🔄 Limpando formulário..."):
-                        import time
-                        time.sleep(1.5)
-                    st.rerun()
-                else:
-                    progress_placeholder.empty()
-                    st.error("❌ Erro ao registrar lançamento. Tente novamente.")
+                # Incrementa contador do formulário para forçar limpeza dos campos
+                st.session_state.form_counter += 1
+                st.rerun()
+            else:
+                st.error("❌ Erro ao registrar lançamento. Tente novamente.")
+
+
+# ============================================
+# REGISTRO EM LOTE
+# ============================================
+
+# Colunas da grade de registro em lote
+COLUNAS_LOTE = ["Data", "Nome", "Valor (R$)", "Tipo", "Categoria", "Celular", "Email", "WhatsApp"]
+
+# Linhas em branco exibidas ao abrir a grade (novas linhas podem ser adicionadas)
+LINHAS_LOTE_INICIAIS = 10
+
+
+def _vazio(valor) -> bool:
+    """Célula não preenchida (None, NaN/NaT ou texto em branco)"""
+    return valor is None or valor != valor or (isinstance(valor, str) and not valor.strip())
+
+
+def validar_linha_lote(linha: dict) -> Tuple[Optional[Tuple], List[str]]:
+    """
+    Valida uma linha da grade de registro em lote
+    
+    Usa as mesmas regras do formulário individual (validar_nome,
+    validar_valor e validar_telefone).
+    
+    Args:
+        linha: Dicionário com as colunas de COLUNAS_LOTE
+    
+    Returns:
+        (dados, erros): dados no formato de adicionar_lancamentos_lote
+        (None se houver erro) e a lista de mensagens de erro da linha
+    """
+    erros = []
+    
+    data = linha.get("Data")
+    if _vazio(data):
+        erros.append("Data é obrigatória.")
+    
+    nome = "" if _vazio(linha.get("Nome")) else str(linha["Nome"]).strip()
+    if not validar_nome(nome):
+        erros.append("O nome deve ter pelo menos 2 caracteres.")
+    
+    valor = linha.get("Valor (R$)")
+    if _vazio(valor) or not validar_valor(valor):
+        erros.append("O valor deve ser maior que zero.")
+    
+    tipo, categoria = linha.get("Tipo"), linha.get("Categoria")
+    if tipo not in TIPOS_PAGAMENTO:
+        erros.append("Tipo de pagamento inválido.")
+    if categoria not in CATEGORIAS:
+        erros.append("Categoria inválida.")
+    
+    telefone = "" if _vazio(linha.get("Celular")) else str(linha["Celular"])
+    telefone_valido, msg_telefone = validar_telefone(telefone)
+    if not telefone_valido:
+        erros.append(msg_telefone)
+    
+    if erros:
+        return None, erros
+    
+    email = None if _vazio(linha.get("Email")) else str(linha["Email"]).strip()
+    
+    return (
+        data.strftime("%Y-%m-%d"),
+        nome,
+        reais_para_centavos(valor),
+        tipo,
+        categoria,
+        email,
+        formatar_telefone(telefone),
+        bool(linha.get("WhatsApp")) and tipo == "Pix",  # WhatsApp apenas para PIX
+    ), []
+
+
+def _grade_lote(linhas: Optional[List[dict]] = None):
+    """DataFrame da grade: as linhas informadas ou LINHAS_LOTE_INICIAIS linhas em branco"""
+    import pandas as pd
+    
+    if not linhas:
+        linhas = [
+            {"Data": datetime.today().date(), "Tipo": "Dinheiro", "Categoria": "Dízimo", "WhatsApp": True}
+            for _ in range(LINHAS_LOTE_INICIAIS)
+        ]
+    
+    grade = pd.DataFrame(linhas, columns=COLUNAS_LOTE)
+    grade["Valor (R$)"] = grade["Valor (R$)"].astype("float64")
+    return grade.astype({coluna: "object" for coluna in ("Nome", "Celular", "Email")})
+
+
+def exibir_registro_lote():
+    """
+    Registro de vários lançamentos de uma vez (ex.: envelopes após o culto)
+    
+    As linhas são digitadas em uma grade e enviadas juntas: todas são
+    validadas, as válidas são gravadas em uma única transação e as com erro
+    permanecem na grade para correção.
+    """
+    if "lote_contador" not in st.session_state:
+        st.session_state.lote_contador = 0
+        st.session_state.lote_linhas = _grade_lote()
+    
+    erros = st.session_state.pop("registrar_erros_lote", [])
+    if erros:
+        st.warning("⚠️ As linhas abaixo não foram gravadas. Corrija e registre novamente:")
+        for erro in erros:
+            st.error(f"❌ {erro}")
+    
+    st.caption("Linhas em branco são ignoradas. Confirmação por WhatsApp apenas para pagamentos via PIX.")
+    
+    with st.form(key=f"registrar_lote_{st.session_state.lote_contador}"):
+        grade = st.data_editor(
+            st.session_state.lote_linhas,
+            num_rows="dynamic",
+            hide_index=True,
+            width="stretch",
+            column_config={
+                "Data": st.column_config.DateColumn("Data", format="DD/MM/YYYY", required=True,
+                                                    default=datetime.today().date()),
+                "Nome": st.column_config.TextColumn("Nome *", max_chars=100),
+                "Valor (R$)": st.column_config.NumberColumn("Valor (R$) *", min_value=0.01, step=0.01,
+                                                            format="%.2f"),
+                "Tipo": st.column_config.SelectboxColumn("Tipo *", options=TIPOS_PAGAMENTO,
+                                                         default="Dinheiro", required=True),
+                "Categoria": st.column_config.SelectboxColumn("Categoria *", options=CATEGORIAS,
+                                                              default="Dízimo", required=True),
+                "Celular": st.column_config.TextColumn("Celular *", max_chars=15),
+                "Email": st.column_config.TextColumn("Email", max_chars=100),
+                "WhatsApp": st.column_config.CheckboxColumn("📲 WhatsApp", default=True),
+            }
+        )
+        
+        enviar = st.form_submit_button("✅ Registrar Lote", type="primary", width="stretch")
+    
+    if not enviar:
+        return
+    
+    preenchidas = [
+        (posicao, linha) for posicao, linha in enumerate(grade.to_dict("records"), start=1)
+        if not all(_vazio(linha.get(coluna)) for coluna in ("Nome", "Valor (R$)", "Celular", "Email"))
+    ]
+    # Ano arquivado em Parquet não aceita lançamentos (o banco recusaria o lote inteiro)
+    fechados = set(anos_arquivados(linha["Data"].year for _, linha in preenchidas if not _vazio(linha.get("Data"))))
+    
+    validos, invalidas, erros = [], [], []
+    for posicao, linha in preenchidas:
+        dados, problemas = validar_linha_lote(linha)
+        if dados and int(dados[0][:4]) in fechados:
+            dados, problemas = None, [f"{dados[0][:4]} está arquivado e não aceita novos lançamentos."]
+        if problemas:
+            erros.append(f"Linha {posicao} ({linha.get('Nome') or 'sem nome'}): {' '.join(problemas)}")
+            invalidas.append(linha)
+        else:
+            validos.append(dados)
+    
+    if not validos and not erros:
+        st.warning("⚠️ Preencha ao menos uma linha.")
+        return
+    
+    ids = adicionar_lancamentos_lote(validos, st.session_state["usuario"])
+    if ids is None:
+        st.error("❌ Erro ao registrar o lote. Nenhum lançamento foi gravado; tente novamente.")
+        return
+    
+    avisos = []
+    if ids:
+        avisos.append(f"✅ {len(ids)} lançamento(s) registrado(s) com sucesso!")
+        confirmacoes = sum(1 for dados in validos if dados[7])
+        if confirmacoes:
+            notificar_outbox()
+            avisos.append(f"📲 {confirmacoes} confirmação(ões) via WhatsApp na fila de envio.")
+    
+    st.session_state["registrar_avisos"] = avisos
+    st.session_state["registrar_erros_lote"] = erros
+    
+    # Mantém na grade apenas as linhas com erro
+    st.session_state.lote_linhas = _grade_lote(invalidas)
+    st.session_state.lote_contador += 1
+    st.rerun()
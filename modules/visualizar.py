@@ -1,102 +1,287 @@
 """
 Página de Visualização de Lançamentos
 Otimizado para visualização em Desktop e Mobile
+pandas é importado apenas ao montar tabelas e gráficos (abertura mais rápida)
 """
 import streamlit as st
-import pandas as pd
 from datetime import datetime
-from database import obter_lancamentos
-from utils import formatar_data, formatar_valor, calcular_totais
+from config import TAMANHO_PAGINA, LIMITE_BUSCA_TEXTO, CATEGORIAS
+from database import (
+    obter_lancamentos_pagina, buscar_lancamentos, obter_totais, obter_status_whatsapp,
+    estatisticas_pool, estatisticas_cache, estatisticas_outbox,
+    NOMES_COLUNAS_ADMIN, NOMES_COLUNAS_USUARIO
+)
+from auth import pode_administrar
+from utils import formatar_valor, centavos_para_reais
 from mobile_config import detectar_mobile
+from exportar_lancamentos import exportar_para_arquivo_temporario
 
 
 def exibir_pagina_visualizar():
     """
     Exibe a página de visualização de lançamentos
     Mostra todos os dados incluindo informações de contato
+    A tabela é paginada por cursor: apenas uma página é lida do banco
     Layout responsivo para mobile
     """
     st.subheader("📊 Lançamentos Recentes")
     
-    lancamentos = obter_lancamentos(
+    busca = st.text_input(
+        "🔍 Buscar contribuinte",
+        placeholder="Nome, email ou celular",
+        help="Não diferencia maiúsculas nem acentos; palavras incompletas também são encontradas"
+    ).strip()
+    
+    if busca:
+        exibir_resultados_busca(busca)
+    else:
+        exibir_lancamentos_paginados()
+    
+    if pode_administrar(st.session_state["nivel"]):
+        exibir_diagnostico()
+
+
+def exibir_lancamentos_paginados():
+    """Exibe o resumo financeiro e a página atual da tabela de lançamentos"""
+    paginacao = _estado_paginacao()
+    
+    lancamentos, tem_mais = obter_lancamentos_pagina(
         st.session_state["usuario"],
-        st.session_state["nivel"]
+        st.session_state["nivel"],
+        cursor_pagina=paginacao["cursor"],
+        tamanho_pagina=TAMANHO_PAGINA,
+        direcao=paginacao["direcao"]
     )
     
+    if not lancamentos and paginacao["cursor"] is not None:
+        # Página ficou vazia (lançamentos excluídos): volta ao início
+        _ir_para_pagina(None, "proxima")
+        st.rerun()
+    
     if lancamentos:
         # Resumo Financeiro ANTES da tabela para mobile
-        exibir_resumo_financeiro(lancamentos)
+        exibir_resumo_financeiro()
         
         st.markdown("---")
         st.markdown("#### 📋 Tabela de Lançamentos")
         
-        # Montagem da tabela com novos campos
-        columns = ["ID", "Data", "Nome", "Valor (R$)", "Tipo", "Categoria", "Usuário", "Email", "Celular"]
-        
-        dados = []
-        for lanc in lancamentos:
-            # Dados básicos (sempre presentes)
-            linha = [
-                lanc[0],  # ID
-                formatar_data(lanc[1]),  # Data
-                lanc[2],  # Nome
-                formatar_valor(lanc[3]),  # Valor
-                lanc[4],  # Tipo
-                lanc[5],  # Categoria
-            ]
-            
-            # Verificar se é admin (tem coluna usuario na query)
-            if st.session_state["nivel"] == "admin":
-                usuario = lanc[6] if len(lanc) > 6 else "-"
-                email = lanc[7] if len(lanc) > 7 else None
-                codigo_area = lanc[8] if len(lanc) > 8 else None
-                celular = lanc[9] if len(lanc) > 9 else None
-            else:
-                usuario = st.session_state["usuario"]
-                email = lanc[6] if len(lanc) > 6 else None
-                codigo_area = lanc[7] if len(lanc) > 7 else None
-                celular = lanc[8] if len(lanc) > 8 else None
-            
-            # Adicionar usuário
-            linha.append(usuario if usuario else "-")
-            
-            # Adicionar email
-            linha.append(email if email else "-")
-            
-            # Adicionar celular formatado
-            if codigo_area and celular:
-                celular_formatado = f"({codigo_area}) {celular}"
-            else:
-                celular_formatado = "-"
-            
-            linha.append(celular_formatado)
-            dados.append(linha)
-        
-        df = pd.DataFrame(dados, columns=columns)
+        exibir_tabela_lancamentos(lancamentos)
+        exibir_controles_paginacao(lancamentos, tem_mais, paginacao)
         
-        # Info sobre scroll horizontal em mobile
-        st.info("👉 Deslize para o lado para ver mais colunas")
-        
-        # Tabela com altura fixa e scroll
-        st.dataframe(
-            df, 
-            width="stretch", 
-            hide_index=True,
-            height=400  # Altura fixa para melhor controle em mobile
-        )
+        with st.expander("⬇️ Exportar CSV"):
+            exibir_exportacao_csv()
         
     else:
         st.info("ℹ️ Nenhum lançamento registrado ainda.")
 
 
-def exibir_resumo_financeiro(lancamentos):
-    """Exibe o resumo financeiro dos lançamentos - layout responsivo"""
+def exibir_resultados_busca(busca: str):
+    """Exibe os lançamentos encontrados pela busca de texto completo"""
+    lancamentos = buscar_lancamentos(
+        busca,
+        limite=LIMITE_BUSCA_TEXTO,
+        usuario=st.session_state["usuario"],
+        nivel_acesso=st.session_state["nivel"]
+    )
+    
+    if not lancamentos:
+        st.info(f"ℹ️ Nenhum lançamento encontrado para \"{busca}\".")
+        return
+    
+    if len(lancamentos) >= LIMITE_BUSCA_TEXTO:
+        st.caption(f"Exibindo os {LIMITE_BUSCA_TEXTO} resultados mais relevantes. Refine a busca para ver outros.")
+    else:
+        st.caption(f"{len(lancamentos)} lançamento(s) encontrado(s).")
+    
+    exibir_tabela_lancamentos(lancamentos)
+
+
+# Rótulos do status da confirmação por WhatsApp (tabela outbox)
+STATUS_WHATSAPP = {
+    "pendente": "⏳ Na fila",
+    "enviando": "📤 Enviando",
+    "enviado": "✅ Enviado",
+    "erro": "❌ Falhou",
+    "cancelado": "🚫 Cancelado",
+}
+
+
+def montar_tabela_lancamentos(lancamentos, usuario: str, status_whatsapp: dict):
+    """
+    Monta o DataFrame exibido na tabela de lançamentos, coluna a coluna
+    
+    Data e valor ficam como datetime64 e número: a formatação (dd/mm/aaaa e
+    R$) é feita pelo navegador via COLUNAS_TABELA, e a ordenação ao clicar
+    no cabeçalho respeita datas e valores.
+    
+    Args:
+        lancamentos: Tuplas de obter_lancamentos_pagina/buscar_lancamentos ou
+            DataFrame de obter_lancamentos_dataframe
+        usuario: Usuário da sessão (coluna Usuário quando a consulta não a traz)
+        status_whatsapp: {id: (status, resultado)} de obter_status_whatsapp
+    
+    Returns:
+        DataFrame com as colunas da tabela
+    """
+    import pandas as pd
+    
+    if isinstance(lancamentos, pd.DataFrame):
+        df = lancamentos
+    else:
+        # Admin recebe a coluna usuario; os demais, apenas os próprios lançamentos
+        colunas = NOMES_COLUNAS_ADMIN if len(lancamentos[0]) == len(NOMES_COLUNAS_ADMIN) else NOMES_COLUNAS_USUARIO
+        df = pd.DataFrame.from_records(lancamentos, columns=colunas)
+    
+    def ou_traco(serie):
+        return serie.mask(serie.isna() | (serie == ""), "-")
+    
+    tem_celular = df["codigo_area"].notna() & (df["codigo_area"] != "") & df["celular"].notna() & (df["celular"] != "")
+    celular = ("(" + df["codigo_area"].astype("string") + ") " + df["celular"].astype("string")).where(tem_celular, "-")
+    
+    status = df["id"].map({id_lanc: situacao[0] for id_lanc, situacao in status_whatsapp.items()})
+    
+    return pd.DataFrame({
+        "ID": df["id"],
+        "Data": pd.to_datetime(df["data"], format="%Y-%m-%d", errors="coerce"),
+        "Nome": df["nome"],
+        "Valor (R$)": df["valor_centavos"] / 100,
+        "Tipo": df["tipo"],
+        "Categoria": df["categoria"],
+        "Usuário": ou_traco(df["usuario"]) if "usuario" in df else usuario,
+        "Email": ou_traco(df["email"]),
+        "Celular": celular,
+        "WhatsApp": status.map(STATUS_WHATSAPP).fillna(status).fillna("-"),
+    })
+
+
+# Formatação das colunas feita no navegador
+COLUNAS_TABELA = {
+    "Data": st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
+    "Valor (R$)": st.column_config.NumberColumn("Valor (R$)", format="R$ %.2f"),
+}
+
+
+def exibir_tabela_lancamentos(lancamentos):
+    """Monta e exibe a tabela de lançamentos (com contatos e status do WhatsApp)"""
+    status_whatsapp = obter_status_whatsapp(tuple(lanc[0] for lanc in lancamentos))
+    df = montar_tabela_lancamentos(lancamentos, st.session_state["usuario"], status_whatsapp)
+    
+    # Info sobre scroll horizontal em mobile
+    st.info("👉 Deslize para o lado para ver mais colunas")
+    
+    # Tabela com altura fixa e scroll
+    st.dataframe(
+        df, 
+        width="stretch", 
+        hide_index=True,
+        height=400,  # Altura fixa para melhor controle em mobile
+        column_config=COLUNAS_TABELA
+    )
+
+
+def _estado_paginacao() -> dict:
+    """Retorna (criando se necessário) o estado da paginação na sessão"""
+    if "visualizar_paginacao" not in st.session_state:
+        st.session_state["visualizar_paginacao"] = {"cursor": None, "direcao": "proxima"}
+    return st.session_state["visualizar_paginacao"]
+
+
+def _ir_para_pagina(cursor, direcao: str):
+    """Atualiza o cursor da paginação (usado como callback dos botões)"""
+    st.session_state["visualizar_paginacao"] = {"cursor": cursor, "direcao": direcao}
+
+
+def exibir_controles_paginacao(lancamentos, tem_mais: bool, paginacao: dict):
+    """Exibe os botões Início / Anterior / Próxima abaixo da tabela"""
+    if paginacao["direcao"] == "proxima":
+        tem_anterior = paginacao["cursor"] is not None
+        tem_proxima = tem_mais
+    else:
+        tem_anterior = tem_mais
+        tem_proxima = True
+    
+    primeiro = (lancamentos[0][1], lancamentos[0][0])
+    ultimo = (lancamentos[-1][1], lancamentos[-1][0])
+    
+    col_inicio, col_anterior, col_proxima = st.columns(3)
+    
+    with col_inicio:
+        st.button(
+            "⏮️ Início",
+            width="stretch",
+            disabled=not tem_anterior,
+            on_click=_ir_para_pagina,
+            args=(None, "proxima")
+        )
+    
+    with col_anterior:
+        st.button(
+            "⬅️ Anterior",
+            width="stretch",
+            disabled=not tem_anterior,
+            on_click=_ir_para_pagina,
+            args=(primeiro, "anterior")
+        )
+    
+    with col_proxima:
+        st.button(
+            "Próxima ➡️",
+            width="stretch",
+            disabled=not tem_proxima,
+            on_click=_ir_para_pagina,
+            args=(ultimo, "proxima")
+        )
+
+
+def exibir_exportacao_csv():
+    """
+    Botão de download dos lançamentos em CSV, com filtros de período e categoria
+    
+    O arquivo só é gerado ao clicar (callable do download_button, fora do
+    rerun) e é escrito lote a lote em disco (exportar_lancamentos), com a
+    mesma visibilidade da tabela.
+    """
+    config = detectar_mobile()
+    col1, col2 = st.columns(config["form_dupla"])
+    with col1:
+        periodo = st.date_input("Período", value=(), format="DD/MM/YYYY", key="exportar_periodo")
+    with col2:
+        categorias = st.multiselect("Categorias", CATEGORIAS, default=CATEGORIAS, key="exportar_categorias")
+    
+    # Valores capturados agora: o callable roda em outra thread, sem acesso à sessão
+    filtros = {
+        "usuario": st.session_state["usuario"],
+        "nivel_acesso": st.session_state["nivel"],
+        "data_inicio": periodo[0].strftime("%Y-%m-%d") if len(periodo) > 0 else None,
+        "data_fim": periodo[-1].strftime("%Y-%m-%d") if len(periodo) > 0 else None,
+        "categorias": categorias if len(categorias) < len(CATEGORIAS) else None,
+    }
+    
+    st.download_button(
+        "⬇️ Baixar CSV",
+        data=lambda: exportar_para_arquivo_temporario(**filtros),
+        file_name="lancamentos.csv",
+        mime="text/csv",
+        on_click="ignore",
+        disabled=not categorias,
+        width="stretch"
+    )
+
+
+def exibir_resumo_financeiro():
+    """
+    Exibe o resumo financeiro dos lançamentos - layout responsivo
+    Os totais são agregados no banco (obter_totais), sem carregar os lançamentos
+    """
     config = detectar_mobile()
     
     st.subheader("📈 Resumo Financeiro")
     st.markdown("---")
     
-    totais = calcular_totais(lancamentos)
+    totais = obter_totais(
+        st.session_state["usuario"],
+        st.session_state["nivel"]
+    )
     
     # Exibição das métricas principais
     st.markdown("#### 💵 Totais de Entradas")
@@ -143,12 +328,14 @@ def exibir_resumo_financeiro(lancamentos):
     if any([totais["total_dizimo_mes"], totais["total_oferta_mes"], totais["total_visitante_mes"]]):
         st.markdown("---")
         st.markdown("#### 📊 Distribuição Mensal")
+        import pandas as pd
+        
         chart_data = pd.DataFrame({
             'Categoria': ['Dízimo', 'Oferta', 'Visitante'],
             'Valor': [
-                totais["total_dizimo_mes"], 
-                totais["total_oferta_mes"], 
-                totais["total_visitante_mes"]
+                centavos_para_reais(totais["total_dizimo_mes"]), 
+                centavos_para_reais(totais["total_oferta_mes"]), 
+                centavos_para_reais(totais["total_visitante_mes"])
             ]
         })
         st.bar_chart(chart_data.set_index('Categoria'), width="stretch")
@@ -158,3 +345,44 @@ def exibir_resumo_financeiro(lancamentos):
         st.write(f"**Total Geral de Dízimos:** {formatar_valor(totais['total_dizimo_geral'])}")
         st.write(f"**Total Geral de Ofertas:** {formatar_valor(totais['total_oferta_geral'])}")
         st.write(f"**Total Geral de Visitantes:** {formatar_valor(totais['total_visitante_geral'])}")
+
+
+def exibir_diagnostico():
+    """Exibe estatísticas internas do banco de dados (apenas admin)"""
+    with st.expander("⚙️ Diagnóstico do Banco de Dados"):
+        pool = estatisticas_pool()
+        
+        st.markdown("**Pool de conexões**")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Abertas / Limite", f"{pool['abertas']} / {pool['tamanho']}")
+            st.metric("Conexões criadas", pool["conexoes_criadas"])
+        with col2:
+            st.metric("Reutilizações", pool["reutilizacoes"])
+            st.metric("Esperas", pool["esperas"], help=f"{pool['tempo_espera_ms']:.0f} ms aguardando no total")
+        with col3:
+            st.metric("Retentativas (lock)", pool["retentativas_lock"])
+            st.metric("Esgotamentos", pool["esgotamentos"])
+        
+        cache = estatisticas_cache()
+        
+        st.markdown("**Cache de leituras**")
+        col4, col5, col6 = st.columns(3)
+        with col4:
+            st.metric("Acertos", cache["acertos"])
+        with col5:
+            st.metric("Falhas", cache["falhas"], help=f"{cache['invalidacoes']} invalidações por escrita "
+                      f"({cache['escritas_externas']} de outras conexões, pelo PRAGMA data_version)")
+        with col6:
+            st.metric("Taxa de acerto", f"{cache['taxa_acerto']:.0%}", help=f"{cache['entradas']} consultas em cache")
+        
+        outbox = estatisticas_outbox()
+        
+        st.markdown("**Fila de confirmações (WhatsApp)**")
+        col7, col8, col9 = st.columns(3)
+        with col7:
+            st.metric("Na fila", outbox["pendente"] + outbox["enviando"])
+        with col8:
+            st.metric("Enviadas", outbox["enviado"])
+        with col9:
+            st.metric("Falhas", outbox["erro"], help=f"{outbox['cancelado']} canceladas (lançamento excluído)")
@@ -0,0 +1,166 @@
+"""
+Trabalhador da Fila de Confirmações (Outbox)
+Envia em segundo plano as confirmações por WhatsApp gravadas junto com os lançamentos
+
+O aplicativo inicia uma thread por processo (iniciar_trabalhador_outbox).
+Também pode ser executado como processo separado:
+
+Uso:
+    python outbox_worker.py            # processa a fila continuamente
+    python outbox_worker.py --uma-vez  # processa o que estiver pendente e sai
+"""
+import argparse
+import sys
+import threading
+from typing import Optional
+
+import database
+from config import OUTBOX_INTERVALO_SEGUNDOS, OUTBOX_LOTE
+from utils import formatar_data
+from whatsapp_service import EnvioSuspensoError, erro_temporario, obter_whatsapp_service
+
+
+def processar_outbox(lote: int = OUTBOX_LOTE) -> int:
+    """
+    Reserva e envia um lote de mensagens pendentes
+
+    Args:
+        lote: Máximo de mensagens processadas nesta chamada
+
+    Returns:
+        Quantidade de mensagens processadas (enviadas ou não)
+    """
+    mensagens = database.reservar_mensagens_outbox(lote)
+    if not mensagens:
+        return 0
+
+    whatsapp_service = obter_whatsapp_service()
+
+    for id_mensagem, telefone, tentativas, nome, valor_centavos, categoria, data in mensagens:
+        if nome is None:
+            database.concluir_mensagem_outbox(
+                id_mensagem, False, "Lançamento excluído antes do envio.", tentativas, repetir=False
+            )
+            continue
+
+        if not whatsapp_service.enabled:
+            database.concluir_mensagem_outbox(
+                id_mensagem, False, "Serviço WhatsApp não habilitado.", tentativas, repetir=False
+            )
+            continue
+
+        try:
+            resultado = whatsapp_service.enviar_confirmacao(
+                telefone, nome, valor_centavos, categoria, formatar_data(data)
+            )
+        except EnvioSuspensoError as e:
+            # Disjuntor aberto: a API nem foi chamada, então a tentativa não conta
+            database.adiar_mensagem_outbox(id_mensagem, str(e), whatsapp_service.disjuntor.segundos_para_liberar())
+            continue
+        except Exception as e:
+            # Erro definitivo (número inválido, credenciais) não volta para a fila
+            database.concluir_mensagem_outbox(
+                id_mensagem, False, f"Erro ao enviar mensagem WhatsApp: {e}", tentativas,
+                repetir=erro_temporario(e)
+            )
+            continue
+
+        database.concluir_mensagem_outbox(id_mensagem, True, resultado, tentativas)
+
+    return len(mensagens)
+
+
+class TrabalhadorOutbox(threading.Thread):
+    """
+    Thread que esvazia a outbox periodicamente
+
+    Dorme OUTBOX_INTERVALO_SEGUNDOS entre as verificações, mas acorda na hora
+    quando notificar() é chamado (logo após um novo lançamento).
+    """
+
+    def __init__(self, intervalo: float = OUTBOX_INTERVALO_SEGUNDOS, lote: int = OUTBOX_LOTE):
+        super().__init__(name="outbox-whatsapp", daemon=True)
+        self.intervalo = intervalo
+        self.lote = lote
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+
+    def notificar(self):
+        """Pede o processamento imediato da fila"""
+        self._acordar.set()
+
+    def parar(self):
+        """Encerra a thread após o lote atual"""
+        self._parar.set()
+        self._acordar.set()
+
+    def run(self):
+        while not self._parar.is_set():
+            processadas = 0
+            try:
+                processadas = processar_outbox(self.lote)
+            except Exception as e:
+                print(f"Erro ao processar outbox: {e}")
+
+            # Lote cheio: provavelmente há mais mensagens esperando
+            if processadas >= self.lote:
+                continue
+
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+
+
+# Uma thread por processo, compartilhada entre as sessões do Streamlit
+_trabalhador: Optional[TrabalhadorOutbox] = None
+_lock_trabalhador = threading.Lock()
+
+
+def iniciar_trabalhador_outbox() -> TrabalhadorOutbox:
+    """Inicia a thread da outbox (apenas na primeira chamada do processo)"""
+    global _trabalhador
+
+    with _lock_trabalhador:
+        if _trabalhador is None or not _trabalhador.is_alive():
+            _trabalhador = TrabalhadorOutbox()
+            _trabalhador.start()
+
+    return _trabalhador
+
+
+def notificar_outbox():
+    """Acorda a thread da outbox, se estiver em execução neste processo"""
+    if _trabalhador is not None:
+        _trabalhador.notificar()
+
+
+def main() -> int:
+    """Função principal - processa a fila como processo separado"""
+    parser = argparse.ArgumentParser(description="Envio das confirmações por WhatsApp pendentes")
+    parser.add_argument("--uma-vez", action="store_true", help="Processa a fila atual e sai")
+    args = parser.parse_args()
+
+    database.garantir_banco_inicializado()
+
+    if args.uma_vez:
+        total = 0
+        while True:
+            processadas = processar_outbox()
+            total += processadas
+            if processadas < OUTBOX_LOTE:
+                break
+        print(f"✅ {total} mensagem(ns) processada(s).")
+        return 0
+
+    print(f"📲 Processando a outbox a cada {OUTBOX_INTERVALO_SEGUNDOS}s (Ctrl+C para sair)")
+    trabalhador = TrabalhadorOutbox()
+    trabalhador.start()
+    try:
+        while trabalhador.is_alive():
+            trabalhador.join(1)
+    except KeyboardInterrupt:
+        trabalhador.parar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
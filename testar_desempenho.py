@@ -0,0 +1,1560 @@
+"""
+Script de Testes de Desempenho
+Mede o custo das operações críticas do sistema usando um banco temporário
+
+Uso:
+    python testar_desempenho.py                  # executa todos os testes
+    python testar_desempenho.py inicializacao    # executa apenas um teste
+"""
+import io
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+from typing import Tuple
+
+import database
+
+
+# Limite para importar app.py (com o Streamlit já carregado, como no servidor)
+LIMITE_IMPORTACAO_APP_MS = 250
+
+# Bibliotecas que não devem ser carregadas antes da tela de login
+MODULOS_PESADOS = ("pandas", "numpy", "pyarrow", "PIL", "twilio", "requests", "streamlit_option_menu")
+
+
+def usar_banco_temporario() -> str:
+    """Aponta o módulo database para um arquivo SQLite novo e vazio"""
+    pasta = tempfile.mkdtemp(prefix="dizimos_desempenho_")
+    caminho = os.path.join(pasta, "desempenho.db")
+    database.fechar_conexoes()
+    database.DATABASE_NAME = caminho
+    database._banco_inicializado = False
+    return caminho
+
+
+def cronometrar(funcao, repeticoes: int) -> float:
+    """Executa a função várias vezes e retorna o tempo médio em milissegundos"""
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) * 1000 / repeticoes
+
+
+def contar_conexoes(funcao) -> int:
+    """Conta quantas conexões get_db_connection a função abre"""
+    original = database.get_db_connection
+    contador = {"conexoes": 0}
+
+    def get_db_connection_contando():
+        contador["conexoes"] += 1
+        return original()
+
+    database.get_db_connection = get_db_connection_contando
+    try:
+        funcao()
+    finally:
+        database.get_db_connection = original
+    return contador["conexoes"]
+
+
+# ============================================
+# TESTES
+# ============================================
+
+def testar_inicializacao() -> bool:
+    """Custo de um rerun do Streamlit: init_db() sempre x inicialização única"""
+    usar_banco_temporario()
+    repeticoes = 200
+
+    # Primeira execução (cria tabela e aplica migrações) fica fora da medição
+    database.init_db()
+
+    antes = cronometrar(database.init_db, repeticoes)
+
+    database._banco_inicializado = False
+    database.garantir_banco_inicializado()
+    depois = cronometrar(database.garantir_banco_inicializado, repeticoes)
+    conexoes = contar_conexoes(database.garantir_banco_inicializado)
+
+    print(f"Antes  (init_db a cada rerun):           {antes:8.3f} ms/rerun")
+    print(f"Depois (garantir_banco_inicializado):    {depois:8.3f} ms/rerun")
+    print(f"Conexões abertas em um rerun:            {conexoes}")
+
+    return conexoes == 0 and depois < antes
+
+
+def _escrever_concorrente(inserir, threads: int, por_thread: int) -> Tuple[float, int]:
+    """Executa inserções em várias threads; retorna (segundos, falhas)"""
+    falhas = []
+
+    def trabalhador(indice):
+        for i in range(por_thread):
+            if not inserir(f"Contribuinte {indice}-{i}", f"diacono{indice:02d}"):
+                falhas.append(1)
+
+    inicio = time.perf_counter()
+    lista = [threading.Thread(target=trabalhador, args=(t,)) for t in range(threads)]
+    for thread in lista:
+        thread.start()
+    for thread in lista:
+        thread.join()
+    return time.perf_counter() - inicio, len(falhas)
+
+
+def testar_pool() -> bool:
+    """Escritas concorrentes: sqlite3.connect por chamada x pool WAL"""
+    threads, por_thread = 8, 150
+    hoje = date.today().isoformat()
+
+    # Antes: nova conexão por operação (como o get_db_connection original), journal DELETE
+    caminho_antigo = usar_banco_temporario()
+    database.init_db()
+    database.fechar_conexoes()
+    with sqlite3.connect(caminho_antigo) as conn:
+        conn.execute("PRAGMA journal_mode=DELETE")
+
+    def inserir_antigo(nome, usuario):
+        try:
+            conn = sqlite3.connect(caminho_antigo)
+            try:
+                conn.execute(
+                    "INSERT INTO lancamentos (data, nome, valor, tipo, categoria, usuario) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (hoje, nome, 10.0, "Pix", "Oferta", usuario)
+                )
+                conn.commit()
+            finally:
+                conn.close()
+            return True
+        except sqlite3.Error:
+            return False
+
+    tempo_antes, falhas_antes = _escrever_concorrente(inserir_antigo, threads, por_thread)
+
+    # Depois: pool de conexões em WAL com busy_timeout e retentativas
+    usar_banco_temporario()
+    database.garantir_banco_inicializado()
+
+    def inserir_pool(nome, usuario):
+        return database.adicionar_lancamento(hoje, nome, 1000, "Pix", "Oferta", usuario)
+
+    tempo_depois, falhas_depois = _escrever_concorrente(inserir_pool, threads, por_thread)
+
+    total = threads * por_thread
+    print(f"Antes  (connect por chamada): {total / tempo_antes:8.0f} inserções/s, {falhas_antes} falhas")
+    print(f"Depois (pool WAL):            {total / tempo_depois:8.0f} inserções/s, {falhas_depois} falhas")
+    print(f"Estatísticas do pool: {database.estatisticas_pool()}")
+
+    return falhas_depois == 0
+
+
+def testar_cache() -> bool:
+    """Rerun da página Visualizar: consultas ao banco com e sem escrita (deste e de outro processo)"""
+    usar_banco_temporario()
+    database.garantir_banco_inicializado()
+    hoje = date.today().isoformat()
+    for i in range(2000):
+        database.adicionar_lancamento(hoje, f"Contribuinte {i}", 1000 + i, "Pix", "Oferta", "diacono01")
+
+    def rerun_visualizar():
+        database.obter_lancamentos_pagina("diacono01", "editor", None, 50, "proxima")
+        database.obter_totais("diacono01", "editor")
+
+    def consultas(funcao):
+        # Leituras que passaram do cache para as tabelas (o PRAGMA data_version não conta)
+        antes = database.estatisticas_cache()["falhas"]
+        funcao()
+        return database.estatisticas_cache()["falhas"] - antes
+
+    primeira = consultas(rerun_visualizar)
+    sem_escrita = consultas(rerun_visualizar)
+    tempo_cache = cronometrar(rerun_visualizar, 200)
+
+    database.adicionar_lancamento(hoje, "Novo contribuinte", 5000, "Pix", "Dízimo", "diacono01")
+    apos_escrita = consultas(rerun_visualizar)
+
+    # Escrita de outro processo (ex.: importação pela linha de comando), sem invalidar_cache
+    externa = sqlite3.connect(database.DATABASE_NAME)
+    externa.execute(
+        "INSERT INTO lancamentos (data, nome, valor, valor_centavos, tipo, categoria, usuario) "
+        "VALUES (?, 'Gravado fora', 70, 7000, 'Pix', 'Oferta', 'diacono01')", (hoje,)
+    )
+    externa.commit()
+    externa.close()
+    apos_escrita_externa = consultas(rerun_visualizar)
+    primeira_linha = database.obter_lancamentos_pagina("diacono01", "editor", None, 50, "proxima")[0][0]
+
+    database.invalidar_cache()
+    tempo_sem_cache = cronometrar(lambda: (database.invalidar_cache(), rerun_visualizar()), 200)
+
+    print(f"Consultas no primeiro rerun:                 {primeira}")
+    print(f"Consultas em rerun sem escrita:              {sem_escrita}")
+    print(f"Consultas em rerun após uma escrita:         {apos_escrita}")
+    print(f"Consultas após escrita de outro processo:    {apos_escrita_externa} "
+          f"(primeira linha: {primeira_linha[2]!r})")
+    print(f"Rerun sem cache: {tempo_sem_cache:8.3f} ms | com cache: {tempo_cache:8.3f} ms")
+    print(f"Estatísticas do cache: {database.estatisticas_cache()}")
+
+    return (sem_escrita == 0 and apos_escrita > 0 and apos_escrita_externa > 0
+            and primeira_linha[2] == "Gravado fora")
+
+
+def _popular_contribuintes(quantidade: int):
+    """Insere lançamentos sintéticos com nomes acentuados, emails e celulares"""
+    random.seed(42)
+    prenomes = ["João", "José", "Maria", "Antônio", "Conceição", "Sebastião", "Inês", "Lúcia", "Marcos", "Ana"]
+    sobrenomes = ["Silva", "Conceição", "Araújo", "Gonçalves", "Brandão", "Simões", "Pereira", "Lima"]
+    hoje = date.today().isoformat()
+
+    linhas = []
+    for i in range(quantidade):
+        prenome, sobrenome = random.choice(prenomes), random.choice(sobrenomes)
+        nome = f"{prenome} {sobrenome} {i}"
+        email = f"contribuinte{i}@exemplo.com.br" if i % 3 == 0 else None
+        celular = f"9{random.randint(10000000, 99999999)}" if i % 2 == 0 else None
+        linhas.append((hoje, nome, 10.0, 1000, "Pix", "Oferta", "diacono01", email, "11" if celular else None, celular))
+
+    with database.get_db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO lancamentos (data, nome, valor, valor_centavos, tipo, categoria, usuario, "
+            "email, codigo_area, celular) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            linhas
+        )
+        conn.commit()
+    database.invalidar_cache()
+
+
+def testar_fts() -> bool:
+    """Busca por contribuinte em 100 mil lançamentos: LIKE '%...%' x FTS5"""
+    usar_banco_temporario()
+    database.garantir_banco_inicializado()
+    _popular_contribuintes(100_000)
+
+    caminho = database.DATABASE_NAME
+    termos = ["Sebastião", "Sebastiao", "araujo", "contribuinte777"]
+
+    def buscar_like(termo):
+        with sqlite3.connect(caminho) as conn:
+            padrao = f"%{termo}%"
+            return conn.execute(
+                "SELECT id FROM lancamentos WHERE nome LIKE ? OR email LIKE ? OR celular LIKE ? "
+                "ORDER BY data DESC, id DESC LIMIT 100",
+                (padrao, padrao, padrao)
+            ).fetchall()
+
+    def buscar_fts(termo):
+        database.invalidar_cache()
+        return database.buscar_lancamentos(termo, limite=100, nivel_acesso="admin")
+
+    todos_ok = True
+    for termo in termos:
+        tempo_like = cronometrar(lambda: buscar_like(termo), 5)
+        tempo_fts = cronometrar(lambda: buscar_fts(termo), 5)
+        achados_like = len(buscar_like(termo))
+        achados_fts = len(buscar_fts(termo))
+        print(
+            f"{termo!r:20} LIKE: {tempo_like:8.2f} ms ({achados_like:3} resultados) | "
+            f"FTS5: {tempo_fts:8.2f} ms ({achados_fts:3} resultados)"
+        )
+        todos_ok = todos_ok and achados_fts > 0
+
+    # Gatilhos: alteração e exclusão refletem no índice
+    id_teste = database.buscar_lancamentos("contribuinte777", nivel_acesso="admin")[0][0]
+    lanc = database.obter_lancamento_por_id(id_teste)
+    database.atualizar_lancamento(id_teste, lanc[1], "Zacarias Único", lanc[3], lanc[4], lanc[5])
+    renomeado = database.buscar_lancamentos("zacarias unico", nivel_acesso="admin")
+    database.excluir_lancamento(id_teste)
+    excluido = database.buscar_lancamentos("zacarias", nivel_acesso="admin")
+    print(f"Após renomear: {len(renomeado)} resultado(s) | após excluir: {len(excluido)} resultado(s)")
+
+    return todos_ok and len(renomeado) == 1 and not excluido
+
+
+def testar_outbox() -> bool:
+    """Registro com confirmação por WhatsApp: envio síncrono x outbox em segundo plano"""
+    import outbox_worker
+    from whatsapp_service import obter_whatsapp_service
+
+    whatsapp_service = obter_whatsapp_service()
+
+    usar_banco_temporario()
+    database.garantir_banco_inicializado()
+    hoje = date.today().isoformat()
+    latencia_twilio = 0.3
+
+    # Serviço simulado: cada envio leva o tempo de uma chamada HTTP ao Twilio
+    envios = []
+
+    def enviar_simulado(telefone, nome, valor_centavos, categoria, data):
+        time.sleep(latencia_twilio)
+        envios.append(telefone)
+        return f"SID simulado {len(envios)}"
+
+    original_enviar, original_habilitado = whatsapp_service.enviar_confirmacao, whatsapp_service.enabled
+    whatsapp_service.enviar_confirmacao = enviar_simulado
+    whatsapp_service.enabled = True
+    try:
+        def registrar_sincrono():
+            database.adicionar_lancamento(hoje, "Maria", 1000, "Pix", "Oferta", "diacono01", telefone="(11) 98765-4321")
+            enviar_simulado("(11) 98765-4321", "Maria", 1000, "Oferta", hoje)
+
+        def registrar_outbox():
+            database.adicionar_lancamento(
+                hoje, "Maria", 1000, "Pix", "Oferta", "diacono01",
+                telefone="(11) 98765-4321", enviar_whatsapp=True
+            )
+            outbox_worker.notificar_outbox()
+
+        antes = cronometrar(registrar_sincrono, 5)
+
+        trabalhador = outbox_worker.iniciar_trabalhador_outbox()
+        depois = cronometrar(registrar_outbox, 5)
+
+        # Aguarda a thread esvaziar a fila
+        limite = time.time() + 10
+        while time.time() < limite and database.estatisticas_outbox()["enviado"] < 5:
+            time.sleep(0.1)
+        trabalhador.parar()
+        trabalhador.join(5)
+    finally:
+        whatsapp_service.enviar_confirmacao = original_enviar
+        whatsapp_service.enabled = original_habilitado
+
+    contagem = database.estatisticas_outbox()
+    print(f"Antes  (envio durante o registro): {antes:8.1f} ms/registro")
+    print(f"Depois (outbox):                   {depois:8.1f} ms/registro")
+    print(f"Outbox após o processamento: {contagem}")
+
+    return contagem["enviado"] == 5 and depois < antes
+
+
+def _medir_importacao_app() -> Tuple[float, list]:
+    """
+    Importa app.py em um processo novo com -X importtime
+
+    Returns:
+        (tempo cumulativo de "import app" em ms, módulos pesados carregados)
+    """
+    codigo = (
+        "import sys, streamlit; import app; "
+        f"print('MODULOS:' + ','.join(m for m in {MODULOS_PESADOS!r} if m in sys.modules))"
+    )
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+
+    # Formato: "import time: <próprio us> | <cumulativo us> | <módulo>"
+    cumulativo_us = None
+    for linha in resultado.stderr.splitlines():
+        partes = linha.split("|")
+        if len(partes) == 3 and partes[2].strip() == "app":
+            cumulativo_us = int(partes[1].strip())
+
+    if cumulativo_us is None:
+        raise RuntimeError(f"Não foi possível medir a importação de app.py:\n{resultado.stderr[-2000:]}")
+
+    # Só a linha marcada: avisos do app (ex.: SESSION_SECRET) também podem sair no stdout
+    marcadas = [linha for linha in resultado.stdout.splitlines() if linha.startswith("MODULOS:")]
+    if not marcadas:
+        raise RuntimeError(f"app.py não terminou de importar:\n{resultado.stdout[-2000:]}")
+    pesados = [m for m in marcadas[-1][len("MODULOS:"):].split(",") if m]
+    return cumulativo_us / 1000, pesados
+
+
+def testar_importacao() -> bool:
+    """Abertura a frio: tempo de "import app" medido com python -X importtime"""
+    medicoes = [_medir_importacao_app() for _ in range(3)]
+    tempo = min(ms for ms, _ in medicoes)
+    pesados = medicoes[0][1]
+
+    print(f"import app (melhor de 3):      {tempo:8.1f} ms (limite {LIMITE_IMPORTACAO_APP_MS} ms)")
+    print(f"Bibliotecas pesadas carregadas: {', '.join(pesados) or 'nenhuma'}")
+
+    return tempo <= LIMITE_IMPORTACAO_APP_MS and not pesados
+
+
+def testar_logo() -> bool:
+    """Logo na barra lateral: imagem original a cada rerun x versão reduzida em cache"""
+    from PIL import Image
+    from streamlit.elements.lib.image_utils import _ensure_image_size_and_format, _pil_to_bytes
+    from streamlit.elements.lib.layout_utils import LayoutConfig
+
+    import utils
+    from config import LOGO_PATH
+    from mobile_config import detectar_mobile
+
+    largura = detectar_mobile()["logo_width"]
+    layout = LayoutConfig(width="stretch")
+
+    # Mesmas etapas de st.image (image_to_url) até os bytes servidos ao navegador
+    def rerun_antes():
+        return _ensure_image_size_and_format(_pil_to_bytes(Image.open(LOGO_PATH), "JPEG"), layout, "JPEG")
+
+    def rerun_depois():
+        return _ensure_image_size_and_format(utils.obter_logo(largura), layout, "JPEG")
+
+    utils.obter_logo(largura)  # Primeira chamada decodifica e reduz (uma vez por processo)
+    antes, depois = cronometrar(rerun_antes, 20), cronometrar(rerun_depois, 20)
+    kb_antes, kb_depois = len(rerun_antes()) / 1024, len(rerun_depois()) / 1024
+
+    print(f"Arquivo original:                      {os.path.getsize(LOGO_PATH) / 1024:8.1f} KB")
+    print(f"Antes  (Image.open a cada rerun):      {antes:8.2f} ms/rerun, {kb_antes:8.1f} KB enviados")
+    print(f"Depois (versão em cache para {largura}px):  {depois:8.2f} ms/rerun, {kb_depois:8.1f} KB enviados")
+
+    return kb_depois < kb_antes and depois < antes
+
+
+def _bytes_por_rerun(app) -> Tuple[int, int]:
+    """Bytes dos elementos enviados no último rerun de um AppTest: (total, só <style>)"""
+    total = css = 0
+    pendentes = [app._tree]
+    while pendentes:
+        no = pendentes.pop()
+        pendentes.extend(getattr(no, "children", {}).values())
+        proto = getattr(no, "proto", None)
+        if proto is None:
+            continue
+        tamanho = proto.ByteSize()
+        total += tamanho
+        if "<style" in getattr(proto, "body", ""):
+            css += tamanho
+    return total, css
+
+
+def testar_css() -> bool:
+    """CSS enviado a cada rerun: blocos <style> inline x folha de estilos estática"""
+    from streamlit.testing.v1 import AppTest
+
+    import mobile_config
+    import outbox_worker
+
+    usar_banco_temporario()
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+    def medir(logado: bool) -> Tuple[int, int]:
+        app = AppTest.from_file(script, default_timeout=30)
+        if logado:
+            app.session_state["usuario"] = "admin"
+            app.session_state["nome"] = "Administrador"
+            app.session_state["nivel"] = "admin"
+        app.run()
+        app.run()  # Mede o segundo rerun (sessão já iniciada)
+        return _bytes_por_rerun(app)
+
+    with open(mobile_config.CAMINHO_CSS, encoding="utf-8") as arquivo:
+        css_legivel = arquivo.read()
+    # estilos.min.css é versionado (o app só lê): precisa corresponder à fonte
+    with open(mobile_config.CAMINHO_CSS_MINIFICADO, encoding="utf-8") as arquivo:
+        atualizado = arquivo.read() == mobile_config.minificar_css(css_legivel)
+
+    cenarios = {
+        "Antes (CSS legível inline)": lambda: f"<style>{css_legivel}</style>",
+        "CSS minificado inline": lambda: f"<style>{mobile_config.minificar_css(css_legivel)}</style>",
+        "Depois (@import estático)": mobile_config._tag_css,
+    }
+
+    original = mobile_config._tag_css
+    resultados = {}
+    try:
+        for nome, tag in cenarios.items():
+            mobile_config._tag_css = tag
+            resultados[nome] = (medir(False), medir(True))
+    finally:
+        mobile_config._tag_css = original
+        # main() do app iniciou a thread da outbox: não pode seguir consultando os próximos bancos
+        if outbox_worker._trabalhador is not None:
+            outbox_worker._trabalhador.parar()
+            outbox_worker._trabalhador.join(5)
+
+    print(f"{'':28} {'login (total / CSS)':>22} {'página principal':>22}")
+    for nome, ((login, css_login), (principal, css_principal)) in resultados.items():
+        print(f"{nome:28} {login:>8} B / {css_login:>6} B {principal:>8} B / {css_principal:>6} B")
+
+    print(f"estilos.min.css atualizado com static/estilos.css: {atualizado}")
+
+    (_, css_antes), _ = resultados["Antes (CSS legível inline)"]
+    (_, css_depois), (_, css_depois_principal) = resultados["Depois (@import estático)"]
+    return atualizado and css_depois < 200 and css_depois_principal < 200 and css_depois * 10 < css_antes
+
+
+def testar_login() -> bool:
+    """Login: bcrypt no pool limitado, bloqueio por tentativas e token de sessão"""
+    import bcrypt
+
+    import auth
+
+    usar_banco_temporario()
+    database.garantir_banco_inicializado()
+    hash_senha = bcrypt.hashpw(b"Senha@2026", bcrypt.gensalt(12)).decode()
+    auth.USUARIOS_HASHES["admin"] = hash_senha
+
+    # Verificações simultâneas (pico de threads dentro do bcrypt)
+    em_execucao, pico, lock = [0], [0], threading.Lock()
+    verificar_original = auth.verificar_senha_hash
+
+    def verificar_contando(senha, hash_armazenado):
+        with lock:
+            em_execucao[0] += 1
+            pico[0] = max(pico[0], em_execucao[0])
+        try:
+            return verificar_original(senha, hash_armazenado)
+        finally:
+            with lock:
+                em_execucao[0] -= 1
+
+    auth.verificar_senha_hash = verificar_contando
+    try:
+        uma = cronometrar(lambda: auth.verificar_login("admin", "Senha@2026", "10.0.0.1"), 3)
+
+        # 10 logins ao mesmo tempo (cabem nas threads + fila)
+        resultados = []
+        def logar(indice):
+            try:
+                resultados.append(auth.verificar_login("admin", "Senha@2026", f"10.0.1.{indice}") is not None)
+            except auth.LoginBloqueadoError:
+                resultados.append("recusado")
+
+        inicio = time.perf_counter()
+        threads = [threading.Thread(target=logar, args=(i,)) for i in range(auth.LOGIN_THREADS + auth.LOGIN_FILA_MAXIMA)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        simultaneos = (time.perf_counter() - inicio) * 1000
+    finally:
+        auth.verificar_senha_hash = verificar_original
+
+    # Senha errada repetida: bloqueio sem calcular o hash
+    erradas = sum(auth.verificar_login("admin", "errada", "10.0.2.1") is None
+                  for _ in range(auth.LOGIN_TENTATIVAS_USUARIO))
+    inicio = time.perf_counter()
+    try:
+        auth.verificar_login("admin", "Senha@2026", "10.0.2.2")
+        bloqueado = False
+    except auth.LoginBloqueadoError as e:
+        bloqueado = True
+        print(f"Após {erradas} senhas erradas: {e}")
+    recusa = (time.perf_counter() - inicio) * 1000
+    auth.limitador_usuarios.limpar("admin")
+
+    # Sem IP (proxy não configurado): falhas em usuários diferentes não bloqueiam os demais
+    for indice in range(auth.LOGIN_TENTATIVAS_IP):
+        auth.verificar_login(f"inexistente{indice}", "errada", None)
+    try:
+        sem_ip_liberado = auth.verificar_login("admin", "Senha@2026", None) is not None
+    except auth.LoginBloqueadoError:
+        sem_ip_liberado = False
+
+    # Token de sessão: validação HMAC em vez de bcrypt ao recarregar a página
+    token = auth.gerar_token_sessao("admin")
+    validacao = cronometrar(lambda: auth.validar_token_sessao(token), 1000)
+    usuario_id, jti, expira_em, assinatura = token.split(".")
+    adulterado = auth.validar_token_sessao(f"{usuario_id}.{jti}.{int(expira_em) + 3600}.{assinatura}")
+    # Assinatura com caracteres não ASCII no cookie: recusada, sem exceção
+    try:
+        nao_ascii = auth.validar_token_sessao(f"{usuario_id}.{jti}.99999999999.é")
+    except Exception as e:
+        nao_ascii = e
+
+    # "Sair" revoga só o token deste aparelho (e cópias dele); os outros aparelhos continuam
+    outro_aparelho = auth.gerar_token_sessao("admin")
+    auth.encerrar_sessao(token)
+    apos_sair = [auth.validar_token_sessao(t) is not None for t in (token, outro_aparelho)]
+    token_novo = auth.gerar_token_sessao("admin")
+    novo_login = auth.validar_token_sessao(token_novo)
+
+    auth.USUARIOS_HASHES["admin"] = bcrypt.hashpw(b"Nova@2026", bcrypt.gensalt(4)).decode()
+    apos_troca = auth.validar_token_sessao(token_novo)
+
+    print(f"1 login (bcrypt custo 12):           {uma:8.1f} ms")
+    print(f"{len(threads)} logins simultâneos:             {simultaneos:8.1f} ms "
+          f"(pico de {pico[0]} verificações, limite {auth.LOGIN_THREADS})")
+    print(f"Recusa por excesso de tentativas:    {recusa:8.3f} ms")
+    print(f"Login sem IP após {auth.LOGIN_TENTATIVAS_IP} falhas de outros: "
+          f"{'liberado' if sem_ip_liberado else 'bloqueado'}")
+    print(f"Recarregar com token de sessão:      {validacao:8.3f} ms")
+    print(f"Token adulterado: {'aceito' if adulterado else 'recusado'} | "
+          f"assinatura não ASCII: {nao_ascii!r} | "
+          f"após troca de senha: {'aceito' if apos_troca else 'recusado'}")
+    print(f"Após \"Sair\": este aparelho {'conectado' if apos_sair[0] else 'desconectado'}, outro aparelho "
+          f"{'conectado' if apos_sair[1] else 'desconectado'} | "
+          f"novo login: {'aceito' if novo_login else 'recusado'}")
+
+    return (all(resultado is True for resultado in resultados) and pico[0] <= auth.LOGIN_THREADS
+            and bloqueado and recusa < 5 and validacao < 1 and adulterado is None and nao_ascii is None and apos_troca is None
+            and apos_sair == [False, True] and novo_login is not None and sem_ip_liberado)
+
+
+def _calcular_totais_laco(lancamentos) -> dict:
+    """Implementação anterior de utils.calcular_totais (várias passadas em Python), para comparação"""
+    hoje = datetime.today().strftime("%Y-%m-%d")
+    mes = datetime.today().strftime("%Y-%m")
+    do_mes = [l for l in lancamentos if l[1].startswith(mes)]
+    totais = {
+        "total_geral": sum(l[3] for l in lancamentos),
+        "total_dia": sum(l[3] for l in lancamentos if l[1] == hoje),
+        "total_mes": sum(l[3] for l in do_mes),
+    }
+    for categoria, chave in (("Dízimo", "dizimo"), ("Oferta", "oferta"), ("Visitante", "visitante")):
+        totais[f"total_{chave}_geral"] = sum(l[3] for l in lancamentos if l[5] == categoria)
+        totais[f"total_{chave}_mes"] = sum(l[3] for l in do_mes if l[5] == categoria)
+    return totais
+
+
+def _gerar_lancamentos_memoria(quantidade: int) -> list:
+    """Tuplas no formato de obter_lancamentos, espalhadas pelos últimos 365 dias"""
+    from config import CATEGORIAS, TIPOS_PAGAMENTO
+
+    aleatorio = random.Random(42)
+    hoje = date.today().toordinal()
+    datas = [date.fromordinal(hoje - dias).isoformat() for dias in range(365)]
+    return [
+        (i, aleatorio.choice(datas), f"Contribuinte {i % 5000}", aleatorio.randint(100, 50000),
+         aleatorio.choice(TIPOS_PAGAMENTO), aleatorio.choice(CATEGORIAS), None, None, None, None)
+        for i in range(quantidade)
+    ]
+
+
+def testar_totais() -> bool:
+    """Totais em memória com 1M de lançamentos: laços em Python x colunas do pandas"""
+    import utils
+    from totais import calcular_totais_dataframe, lancamentos_para_dataframe
+
+    import pandas  # noqa: F401 - importação fora da medição
+
+    quantidade = 1_000_000
+    lancamentos = _gerar_lancamentos_memoria(quantidade)
+
+    inicio = time.perf_counter()
+    esperado = _calcular_totais_laco(lancamentos)
+    laco = (time.perf_counter() - inicio) * 1000
+
+    inicio = time.perf_counter()
+    adaptador = utils.calcular_totais(lancamentos)
+    tuplas = (time.perf_counter() - inicio) * 1000
+
+    quadro = lancamentos_para_dataframe(lancamentos)
+    del lancamentos
+    colunas = cronometrar(lambda: calcular_totais_dataframe(quadro), 5)
+
+    texto = quadro.assign(data=quadro["data"].dt.strftime("%Y-%m-%d"), categoria=quadro["categoria"].astype(str))
+    colunas_texto = cronometrar(lambda: calcular_totais_dataframe(texto), 3)
+
+    print(f"{quantidade:,} lançamentos".replace(",", "."))
+    print(f"Laços em Python (anterior):            {laco:9.1f} ms")
+    print(f"calcular_totais (tuplas -> colunas):   {tuplas:9.1f} ms")
+    print(f"DataFrame com texto (converte tipos):  {colunas_texto:9.1f} ms")
+    print(f"DataFrame datetime64 + categórica:     {colunas:9.1f} ms ({laco / colunas:.0f}x)")
+
+    return (adaptador == esperado and calcular_totais_dataframe(quadro) == esperado
+            and calcular_totais_dataframe(texto) == esperado and colunas < laco)
+
+
+def testar_agregador() -> bool:
+    """Agregador em uma passada: cursor em lotes, memória constante e deltas sem reler a tabela"""
+    import tracemalloc
+
+    from totais import AgregadorTotais, calcular_totais_dataframe, lancamentos_para_dataframe
+
+    # Em memória: uma passada x as várias passadas anteriores
+    lancamentos = _gerar_lancamentos_memoria(1_000_000)
+    inicio = time.perf_counter()
+    esperado = _calcular_totais_laco(lancamentos)
+    laco = (time.perf_counter() - inicio) * 1000
+    inicio = time.perf_counter()
+    memoria = AgregadorTotais().consumir(lancamentos)
+    uma_passada = memoria.totais()
+    passada = (time.perf_counter() - inicio) * 1000
+
+    # Dia e mês de referência em meses diferentes: as implementações continuam iguais
+    hoje = date.today()
+    mes_anterior = date(hoje.year - (hoje.month == 1), (hoje.month - 2) % 12 + 1, 1).strftime("%Y-%m")
+    referencia = {"hoje": hoje.isoformat(), "mes": mes_anterior}
+    referencia_agregador = memoria.totais(**referencia)
+    referencia_colunas = calcular_totais_dataframe(lancamentos_para_dataframe(lancamentos), **referencia)
+
+    # Do SQLite: fetchall + laços x iterar_lancamentos + agregador
+    usar_banco_temporario()
+    database.garantir_banco_inicializado()
+    with database.get_db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO lancamentos (data, nome, valor, valor_centavos, tipo, categoria, usuario) "
+            "VALUES (?, ?, ?, ?, ?, ?, 'diacono01')",
+            ((l[1], l[2], l[3] / 100, l[3], l[4], l[5]) for l in lancamentos[:200_000])
+        )
+        conn.commit()
+    database.invalidar_cache()
+    del lancamentos
+
+    def medir(funcao):
+        database.invalidar_cache()
+        inicio = time.perf_counter()
+        resultado = funcao()
+        duracao = (time.perf_counter() - inicio) * 1000
+        database.invalidar_cache()
+        tracemalloc.start()
+        funcao()
+        pico = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+        return resultado, duracao, pico
+
+    lista, t_lista, mem_lista = medir(lambda: _calcular_totais_laco(database.obter_lancamentos(nivel_acesso="admin")))
+    agregador, t_fluxo, mem_fluxo = medir(
+        lambda: AgregadorTotais().consumir(database.iterar_lancamentos(nivel_acesso="admin"))
+    )
+
+    antes_deltas = agregador.totais()
+
+    # Deltas: edição, exclusão e inclusão aplicadas sem reler a tabela
+    antiga = database.obter_lancamento_por_id(10)
+    database.atualizar_lancamento(10, date.today().isoformat(), antiga[2], 123456, "Pix", "Dízimo")
+    agregador.atualizar(antiga, database.obter_lancamento_por_id(10))
+
+    excluida = database.obter_lancamento_por_id(20)
+    database.excluir_lancamento(20)
+    agregador.remover(excluida)
+
+    database.adicionar_lancamento(date.today().isoformat(), "Novo", 5000, "Dinheiro", "Oferta", "diacono01")
+    agregador.adicionar(database.obter_lancamento_por_id(200_001))
+
+    inicio = time.perf_counter()
+    apos_deltas = agregador.totais()
+    t_totais = (time.perf_counter() - inicio) * 1000
+    banco = database.obter_totais(nivel_acesso="admin")
+    releitura = AgregadorTotais().consumir(database.iterar_lancamentos(nivel_acesso="admin"))
+
+    print(f"1M em memória - laços anteriores: {laco:8.1f} ms | uma passada: {passada:8.1f} ms")
+    print(f"200k do SQLite - fetchall + laços:     {t_lista:8.1f} ms, pico {mem_lista:6.1f} MB")
+    print(f"200k do SQLite - iterar + agregador:   {t_fluxo:8.1f} ms, pico {mem_fluxo:6.1f} MB")
+    print(f"Totais após 3 deltas: {t_totais:.3f} ms (iguais ao banco: {apos_deltas == banco})")
+    print(f"Dia {referencia['hoje']} com mês {referencia['mes']}: agregador = colunas: "
+          f"{referencia_agregador == referencia_colunas} (total_dia {referencia_agregador['total_dia']})")
+
+    return (uma_passada == esperado and antes_deltas == lista and apos_deltas != lista
+            and apos_deltas == banco and releitura.totais() == banco
+            and releitura.por_tipo == agregador.por_tipo and releitura.por_dia == agregador.por_dia
+            and mem_fluxo < mem_lista and referencia_agregador == referencia_colunas
+            and referencia_agregador["total_dia"] > 0)
+
+
+def _tabela_lancamentos_laco(lancamentos, nivel: str, usuario_sessao: str, status_whatsapp: dict):
+    """Implementação anterior de exibir_tabela_lancamentos (linha a linha), para comparação"""
+    import pandas as pd
+
+    from modules.visualizar import STATUS_WHATSAPP
+    from utils import formatar_data, formatar_valor
+
+    dados = []
+    for lanc in lancamentos:
+        linha = [lanc[0], formatar_data(lanc[1]), lanc[2], formatar_valor(lanc[3]), lanc[4], lanc[5]]
+        if nivel == "admin":
+            usuario, email, codigo_area, celular = lanc[6], lanc[7], lanc[8], lanc[9]
+        else:
+            usuario, email, codigo_area, celular = usuario_sessao, lanc[6], lanc[7], lanc[8]
+        linha.append(usuario if usuario else "-")
+        linha.append(email if email else "-")
+        linha.append(f"({codigo_area}) {celular}" if codigo_area and celular else "-")
+        status = status_whatsapp.get(lanc[0])
+        linha.append(STATUS_WHATSAPP.get(status[0], status[0]) if status else "-")
+        dados.append(linha)
+    return pd.DataFrame(dados, columns=["ID", "Data", "Nome", "Valor (R$)", "Tipo", "Categoria",
+                                        "Usuário", "Email", "Celular", "WhatsApp"])
+
+
+def testar_tabela() -> bool:
+    """Tabela do Visualizar com 10k, 100k e 1M linhas: laço por linha x colunas"""
+    import pandas as pd
+
+    from modules.visualizar import montar_tabela_lancamentos
+
+    aleatorio = random.Random(7)
+    ok = True
+    print(f"{'linhas':>10} {'laço anterior':>15} {'colunas':>12} {'ganho':>7}")
+
+    for quantidade in (10_000, 100_000, 1_000_000):
+        lancamentos = [
+            linha[:6] + ("diacono01", f"c{linha[0]}@exemplo.com" if linha[0] % 3 == 0 else None,
+                         "11" if linha[0] % 2 == 0 else None, f"9{linha[0]:08d}" if linha[0] % 2 == 0 else None, None)
+            for linha in _gerar_lancamentos_memoria(quantidade)
+        ]
+        status = {i: (aleatorio.choice(["pendente", "enviado", "erro"]), "") for i in range(0, quantidade, 10)}
+
+        inicio = time.perf_counter()
+        anterior = _tabela_lancamentos_laco(lancamentos, "admin", "admin", status)
+        laco = (time.perf_counter() - inicio) * 1000
+
+        inicio = time.perf_counter()
+        colunas = montar_tabela_lancamentos(lancamentos, "admin", status)
+        vetorizado = (time.perf_counter() - inicio) * 1000
+
+        print(f"{quantidade:>10,} {laco:>12.0f} ms {vetorizado:>9.0f} ms {laco / vetorizado:>6.1f}x".replace(",", "."))
+
+        # Mesmo conteúdo: datas e valores formatados pelo navegador equivalem aos textos anteriores
+        iguais = (
+            (colunas["Data"].dt.strftime("%d/%m/%Y") == anterior["Data"]).all()
+            and (colunas["Valor (R$)"] * 100).round().astype("int64").equals(
+                pd.Series([linha[3] for linha in lancamentos], dtype="int64"))
+            and all((colunas[coluna].astype(str) == anterior[coluna].astype(str)).all()
+                    for coluna in ("ID", "Nome", "Tipo", "Categoria", "Usuário", "Email", "Celular", "WhatsApp"))
+        )
+        ok = ok and iguais and vetorizado < laco
+        del lancamentos, anterior, colunas
+
+    # Do banco: fetchall + laço x pd.read_sql + colunas (1M linhas)
+    usar_banco_temporario()
+    database.garantir_banco_inicializado()
+    with database.get_db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO lancamentos (data, nome, valor, valor_centavos, tipo, categoria, usuario) "
+            "VALUES (?, ?, ?, ?, ?, ?, 'diacono01')",
+            ((l[1], l[2], l[3] / 100, l[3], l[4], l[5]) for l in _gerar_lancamentos_memoria(1_000_000))
+        )
+        conn.commit()
+    database.invalidar_cache()
+
+    inicio = time.perf_counter()
+    _tabela_lancamentos_laco(database.obter_lancamentos(nivel_acesso="admin"), "admin", "admin", {})
+    banco_laco = (time.perf_counter() - inicio) * 1000
+    database.invalidar_cache()
+
+    inicio = time.perf_counter()
+    montar_tabela_lancamentos(database.obter_lancamentos_dataframe(nivel_acesso="admin"), "admin", {})
+    banco_colunas = (time.perf_counter() - inicio) * 1000
+
+    print(f"Do banco (1M): fetchall + laço {banco_laco:.0f} ms | read_sql + colunas {banco_colunas:.0f} ms")
+    return ok and banco_colunas < banco_laco
+
+
+def testar_lote() -> bool:
+    """Registro em lote: um commit por envelope x executemany em uma transação"""
+    from modules.registrar import validar_linha_lote
+
+    usar_banco_temporario()
+    database.garantir_banco_inicializado()
+
+    hoje = date.today()
+    linhas = [
+        {"Data": hoje, "Nome": f"Contribuinte {i}", "Valor (R$)": 10 + i / 100, "Tipo": "Pix" if i % 2 else "Dinheiro",
+         "Categoria": "Dízimo", "Celular": f"(11) 9{i:04d}-0000", "Email": None, "WhatsApp": True}
+        for i in range(200)
+    ]
+    linhas[5]["Nome"] = "X"
+    linhas[17]["Celular"] = "1234"
+
+    validados = [validar_linha_lote(linha) for linha in linhas]
+    validos = [dados for dados, erros in validados if not erros]
+    erros = [erros for _, erros in validados if erros]
+
+    inicio = time.perf_counter()
+    for dados in validos:
+        database.adicionar_lancamento(*dados[:5], "diacono01", dados[5], telefone=dados[6], enviar_whatsapp=dados[7])
+    individual = (time.perf_counter() - inicio) * 1000
+
+    inicio = time.perf_counter()
+    ids = database.adicionar_lancamentos_lote(validos, "diacono01")
+    lote = (time.perf_counter() - inicio) * 1000
+
+    with database.get_db_connection() as conn:
+        gravados = conn.execute(
+            "SELECT nome, valor_centavos FROM lancamentos WHERE id IN (%s) ORDER BY id" % ",".join("?" * len(ids)), ids
+        ).fetchall()
+        confirmacoes = conn.execute(
+            "SELECT COUNT(*) FROM outbox WHERE lancamento_id IN (%s)" % ",".join("?" * len(ids)), ids
+        ).fetchone()[0]
+
+    print(f"{len(linhas)} linhas: {len(validos)} válidas, {len(erros)} com erro ({erros[0][0]} | {erros[1][0]})")
+    print(f"adicionar_lancamento um a um:   {individual:8.1f} ms")
+    print(f"adicionar_lancamentos_lote:     {lote:8.1f} ms ({individual / lote:.0f}x)")
+    print(f"Confirmações na fila pelo lote: {confirmacoes} (lançamentos PIX)")
+
+    esperado = [(dados[1], dados[2]) for dados in validos]
+    return (len(validos) == 198 and len(erros) == 2 and gravados == esperado
+            and confirmacoes == sum(1 for dados in validos if dados[7]) and lote < individual)
+
+
+def _gerar_planilha_csv(caminho: str, quantidade: int):
+    """CSV no formato exportado pelo Excel (;), com datas, valores e tipos escritos de formas variadas"""
+    gerador = random.Random(42)
+    tipos = ("Dinheiro", "pix", "Cartão", "Transferencia", "CHEQUE")
+    categorias = ("Dízimo", "oferta", "Visitante")
+
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        arquivo.write("Data;Nome;Valor (R$);Tipo;Categoria;E-mail;Telefone\n")
+        for i in range(quantidade):
+            dia, mes, ano = gerador.randrange(1, 29), gerador.randrange(1, 13), gerador.randrange(2010, 2025)
+            data = f"{dia:02d}/{mes:02d}/{ano}" if i % 2 else f"{ano}-{mes:02d}-{dia:02d}"
+            centavos = gerador.randrange(100, 500000)
+            telefone = f"(11) 9{gerador.randrange(10 ** 7, 10 ** 8)}" if i % 3 == 0 else ""
+            if i % 1000 == 0:
+                telefone = "1234"  # Recusada: celular incompleto
+            email = f"contribuinte{i}@exemplo.com" if i % 4 == 0 else ""
+            arquivo.write(f"{data};Contribuinte {i % 50000};{centavos // 100},{centavos % 100:02d};"
+                          f"{tipos[i % 5]};{categorias[i % 3]};{email};{telefone}\n")
+
+
+def _memoria_residente_mb() -> float:
+    """Memória residente atual do processo (Linux)"""
+    with open("/proc/self/statm") as arquivo:
+        return int(arquivo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def _com_pico_memoria(funcao):
+    """Executa a função amostrando a memória residente; retorna (resultado, pico acima do início em MB)"""
+    inicial = _memoria_residente_mb()
+    pico = [inicial]
+    terminou = threading.Event()
+
+    def amostrar():
+        while not terminou.wait(0.01):
+            pico[0] = max(pico[0], _memoria_residente_mb())
+
+    amostrador = threading.Thread(target=amostrar, daemon=True)
+    amostrador.start()
+    try:
+        resultado = funcao()
+    finally:
+        terminou.set()
+        amostrador.join()
+    return resultado, max(pico[0], _memoria_residente_mb()) - inicial
+
+
+def testar_carga_csv() -> bool:
+    """Importação histórica de 1M de linhas: executemany com gatilhos x carga em blocos"""
+    import importar_lancamentos
+
+    quantidade = 1_000_000
+    pasta = tempfile.mkdtemp(prefix="teste_carga_")
+    planilha = os.path.join(pasta, "historico.csv")
+    recusadas = os.path.join(pasta, "recusadas.csv")
+    _gerar_planilha_csv(planilha, quantidade)
+
+    # Referência: os mesmos 100 mil lançamentos por adicionar_lancamentos_lote (gatilhos e índices a cada linha)
+    usar_banco_temporario()
+    database.garantir_banco_inicializado()
+    amostra = []
+    for bloco in importar_lancamentos.ler_blocos(planilha, tamanho=50000):
+        validos, _ = importar_lancamentos.normalizar_bloco(bloco)
+        amostra.extend(
+            (data, nome, centavos, tipo, categoria, email, f"{ddd or ''}{celular or ''}", False)
+            for data, nome, centavos, tipo, categoria, email, ddd, celular in validos
+        )
+        if len(amostra) >= 100_000:
+            break
+    inicio = time.perf_counter()
+    for posicao in range(0, len(amostra), 50000):
+        database.adicionar_lancamentos_lote(amostra[posicao:posicao + 50000], "admin")
+    referencia = len(amostra) / (time.perf_counter() - inicio)
+    del amostra
+
+    usar_banco_temporario()
+    database.garantir_banco_inicializado()
+    database.adicionar_lancamento("2015-03-01", "Registro anterior", 1000, "Pix", "Dízimo", "admin")
+    with database.get_db_connection() as conn:
+        esquema_antes = conn.execute("SELECT type, name FROM sqlite_master ORDER BY name").fetchall()
+
+    simulacao = importar_lancamentos.importar_arquivo(planilha, "admin", simular=True)
+    gravadas_simulacao = len(database.obter_lancamentos(nivel_acesso="admin"))
+
+    resultado, memoria = _com_pico_memoria(
+        lambda: importar_lancamentos.importar_arquivo(planilha, "admin", rejeitados=recusadas)
+    )
+
+    with database.get_db_connection() as conn:
+        esquema_depois = conn.execute("SELECT type, name FROM sqlite_master ORDER BY name").fetchall()
+        total = conn.execute("SELECT COUNT(*) FROM lancamentos").fetchone()[0]
+    with open(recusadas, encoding="utf-8-sig") as arquivo:
+        linhas_recusadas = sum(1 for _ in arquivo) - 1
+    divergencias = database.verificar_resumo_diario()
+    encontrados = database.buscar_lancamentos("contribuinte 4242", nivel_acesso="admin")
+
+    # O importador de linha de comando não carrega a interface (streamlit, páginas, outbox)
+    interface = ("streamlit", "outbox_worker", "modules.registrar", "mobile_config")
+    carregados = subprocess.run(
+        [sys.executable, "-c",
+         f"import sys, importar_lancamentos; print(','.join(m for m in {interface!r} if m in sys.modules))"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    ).stdout.strip()
+
+    taxa = resultado["lidas"] / resultado["segundos"]
+    print(f"Simulação: {simulacao['lidas']} lidas, {simulacao['validas']} válidas em {simulacao['segundos']:.1f}s "
+          f"({gravadas_simulacao - 1} gravadas)")
+    print(f"adicionar_lancamentos_lote (100k): {referencia:10,.0f} linhas/s")
+    print(f"Carga em blocos ({quantidade:,}):    {taxa:10,.0f} linhas/s ({taxa / referencia:.1f}x) "
+          f"- {resultado['segundos']:.1f}s, +{memoria:.0f} MB de memória")
+    print(f"Importadas: {resultado['importadas']} | recusadas: {resultado['rejeitadas']} ({linhas_recusadas} no arquivo)")
+    print(f"Resumo diário: {len(divergencias)} divergência(s) | busca FTS: {len(encontrados)} resultado(s)")
+    print(f"Módulos da interface carregados pelo importador: {carregados or 'nenhum'}")
+
+    return (simulacao["validas"] == resultado["importadas"] == quantidade - 1000 and gravadas_simulacao == 1
+            and total == resultado["importadas"] + 1 and linhas_recusadas == resultado["rejeitadas"] == 1000
+            and esquema_antes == esquema_depois and not divergencias and len(encontrados) > 0
+            and resultado["segundos"] < 60 and memoria < 500 and not carregados)
+
+
+# Limite da memória alocada pela exportação em lotes, qualquer que seja o tamanho da tabela
+EXPORTACAO_PICO_MAXIMO_MB = 16
+
+
+def _pico_tracemalloc(funcao) -> float:
+    """Pico de memória alocada (tracemalloc) durante a função, em MB"""
+    import tracemalloc
+
+    database.invalidar_cache()
+    tracemalloc.start()
+    try:
+        funcao()
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+        database.invalidar_cache()
+
+
+def _exportar_materializando(caminho: str):
+    """Exportação "natural": obter_lancamentos inteiro -> DataFrame -> to_csv, para comparação"""
+    import pandas as pd
+
+    lancamentos = database.obter_lancamentos(nivel_acesso="admin")
+    pd.DataFrame(lancamentos, columns=database.NOMES_COLUNAS_ADMIN).to_csv(caminho, sep=";", index=False)
+    database.invalidar_cache()  # Libera a lista guardada no cache de leituras
+
+
+def testar_exportacao() -> bool:
+    """Exportação em CSV com 100k e 400k lançamentos: tabela inteira na memória x cursor em lotes"""
+    import exportar_lancamentos
+    import importar_lancamentos
+
+    import pandas  # noqa: F401 - importação fora da medição
+
+    pasta = tempfile.mkdtemp(prefix="teste_exportacao_")
+    caminho = os.path.join(pasta, "lancamentos.csv")
+    usar_banco_temporario()
+    database.garantir_banco_inicializado()
+
+    ok = True
+    existentes = 0
+    picos_lotes = []
+    for quantidade in (100_000, 400_000):
+        # Metade registrada pelo admin, metade pelo diacono01
+        novos = [(data, nome, centavos, tipo, categoria, None, None, None)
+                 for _, data, nome, centavos, tipo, categoria, *_ in _gerar_lancamentos_memoria(quantidade - existentes)]
+        metade = len(novos) // 2
+        database.carregar_lancamentos_em_massa([novos[:metade]], "admin")
+        database.carregar_lancamentos_em_massa([novos[metade:]], "diacono01")
+        del novos
+        existentes = quantidade
+
+        inicio = time.perf_counter()
+        exportados = exportar_lancamentos.exportar_csv(caminho)
+        em_lotes = time.perf_counter() - inicio
+        with open(caminho, encoding="utf-8-sig") as arquivo:
+            linhas = sum(1 for _ in arquivo) - 1
+
+        database.invalidar_cache()
+        inicio = time.perf_counter()
+        _exportar_materializando(caminho)
+        materializado = time.perf_counter() - inicio
+
+        # Memória alocada pela própria exportação (tracemalloc), e não a RSS do processo:
+        # a RSS depende do que os testes anteriores liberaram e o heap reaproveita
+        pico_lotes = _pico_tracemalloc(lambda: exportar_lancamentos.exportar_csv(caminho))
+        pico_materializado = _pico_tracemalloc(lambda: _exportar_materializando(caminho))
+        picos_lotes.append(pico_lotes)
+
+        print(f"{quantidade:>7,} lançamentos | DataFrame + to_csv: {materializado:5.1f}s, {pico_materializado:6.1f} MB"
+              f" | em lotes: {em_lotes:5.1f}s, {pico_lotes:5.1f} MB")
+        ok = ok and exportados == linhas == quantidade and pico_lotes < EXPORTACAO_PICO_MAXIMO_MB
+
+    # Filtros e visibilidade: mesmas contagens do SQL
+    hoje = date.today()
+    inicio_mes = hoje.replace(day=1).isoformat()
+    filtros = {"usuario": "diacono01", "nivel_acesso": "editor", "data_inicio": inicio_mes,
+               "data_fim": hoje.isoformat(), "categorias": ["Dízimo", "Oferta"]}
+    exportados = exportar_lancamentos.exportar_csv(caminho, **filtros)
+    with database.get_db_connection() as conn:
+        esperado = conn.execute('''
+            SELECT COUNT(*) FROM lancamentos
+            WHERE usuario = 'diacono01' AND data BETWEEN ? AND ? AND categoria IN ('Dízimo', 'Oferta')
+        ''', (inicio_mes, hoje.isoformat())).fetchone()[0]
+    with open(caminho, encoding="utf-8-sig") as arquivo:
+        cabecalho = arquivo.readline().strip()
+
+    # O arquivo exportado é aceito de volta pelo importador
+    reimportacao = importar_lancamentos.importar_arquivo(caminho, "admin", simular=True)
+
+    print(f"diacono01 (editor), mês atual, Dízimo + Oferta: {exportados} exportados, {esperado} no banco")
+    print(f"Cabeçalho: {cabecalho}")
+    print(f"Reimportação (simulação): {reimportacao['validas']} válidas, {reimportacao['rejeitadas']} recusadas")
+
+    return (ok and exportados == esperado > 0 and "usuario" not in cabecalho.split(";")
+            and reimportacao["validas"] == exportados and reimportacao["rejeitadas"] == 0
+            and picos_lotes[1] < picos_lotes[0] * 1.5 + 1)
+
+
+def testar_arquivo() -> bool:
+    """Arquivo anual em Parquet: anos encerrados fora de lancamentos, leituras e totais iguais"""
+    import arquivo_anual
+    from config import CATEGORIAS, TIPOS_PAGAMENTO
+
+    import pyarrow.parquet as pq
+
+    caminho = usar_banco_temporario()
+    database.garantir_banco_inicializado()
+
+    # 600 mil lançamentos de 2020 até hoje, metade do admin e metade do diacono01
+    aleatorio = random.Random(42)
+    hoje = date.today()
+    primeiro = date(2020, 1, 1).toordinal()
+    datas = [date.fromordinal(dia).isoformat() for dia in range(primeiro, hoje.toordinal() + 1)]
+    for usuario in ("admin", "diacono01"):
+        database.carregar_lancamentos_em_massa([[
+            (aleatorio.choice(datas), f"Contribuinte {i % 5000}", aleatorio.randint(100, 50000),
+             aleatorio.choice(TIPOS_PAGAMENTO), aleatorio.choice(CATEGORIAS), None, None, None)
+            for i in range(300_000)
+        ]], usuario)
+    anos = range(2020, hoje.year)
+
+    visoes = (("admin", "admin"), ("diacono01", "editor"))
+    periodo = {"data_inicio": "2021-03-01", "data_fim": "2021-03-31", "categorias": ("Dízimo",)}
+
+    def ler_tudo():
+        database.invalidar_cache()
+        inicio = time.perf_counter()
+        linhas = database.obter_lancamentos(nivel_acesso="admin")
+        return time.perf_counter() - inicio, linhas
+
+    def ler_periodo():
+        inicio = time.perf_counter()
+        linhas = list(database.iterar_lancamentos("diacono01", "editor", **periodo))
+        return time.perf_counter() - inicio, linhas
+
+    # Leituras da interface: páginas (início, virada para os anos arquivados, ida e volta em 2021),
+    # pesquisa da edição e busca de texto (menos resultados que o limite: a ordem muda com o arquivo)
+    pesquisas = ({"nome": "contribuinte 12", "limite": 50}, {"data_inicio": "2022-12-20", "limite": 30},
+                 {"valor_centavos": 12345, "limite": 100}, {"id_lancamento": 4242})
+
+    def ler_interface(todos):
+        database.invalidar_cache()
+        virada = next(linha for linha in reversed(todos) if linha[1] >= f"{hoje.year}-01-01")
+        meio = next(linha for linha in todos if linha[1] <= "2021-06-15")
+        cursores = ((None, "proxima"), ((virada[1], virada[0]), "proxima"),
+                    ((meio[1], meio[0]), "proxima"), ((meio[1], meio[0]), "anterior"))
+        return ([database.obter_lancamentos_pagina(usuario, nivel, cursor, 100, direcao)
+                 for usuario, nivel in visoes for cursor, direcao in cursores],
+                [database.pesquisar_lancamentos(**filtros) for filtros in pesquisas],
+                [sorted(database.buscar_lancamentos("contribuinte 4242", 1000, usuario, nivel))
+                 for usuario, nivel in visoes])
+
+    totais_antes = [database.obter_totais(usuario, nivel) for usuario, nivel in visoes]
+    todos_antes = list(database.iterar_lancamentos(nivel_acesso="admin"))
+    interface_antes = ler_interface(todos_antes)
+    tempo_tudo_antes, lista_antes = ler_tudo()
+    tempo_periodo_antes, periodo_antes = ler_periodo()
+    tamanho_antes = os.path.getsize(caminho)
+
+    inicio = time.perf_counter()
+    arquivados = [arquivo_anual.arquivar_ano(ano) for ano in anos]
+    tempo_arquivar = time.perf_counter() - inicio
+    with database.get_db_connection() as conn:
+        conn.execute("VACUUM")
+        restantes = conn.execute("SELECT COUNT(*) FROM lancamentos").fetchone()[0]
+
+    totais_depois = [database.obter_totais(usuario, nivel) for usuario, nivel in visoes]
+    todos_depois = list(database.iterar_lancamentos(nivel_acesso="admin"))
+    interface_depois = ler_interface(todos_antes)
+    tempo_tudo_depois, lista_depois = ler_tudo()
+    tempo_periodo_depois, periodo_depois = ler_periodo()
+
+    # Só o arquivo de 2021 é aberto, e nele só os grupos de linhas com março
+    parquet_2021 = pq.ParquetFile(os.path.join(arquivo_anual.diretorio_arquivo(), "lancamentos_2021.parquet"))
+    grupos = arquivo_anual.grupos_no_periodo(parquet_2021, periodo["data_inicio"], periodo["data_fim"])
+
+    # Lançamento retroativo em ano arquivado: recusado por todas as gravações (individual, lote e edição)
+    id_editavel = database.adicionar_lancamentos_lote(
+        [(hoje.isoformat(), "Editável", 1000, "Pix", "Oferta", None, None, False)], "admin")[0]
+    gravacoes_recusadas = [
+        database.adicionar_lancamento("2021-03-15", "Retroativo", 12345, "Pix", "Dízimo", "diacono01"),
+        database.adicionar_lancamentos_lote(
+            [(hoje.isoformat(), "Lote", 1000, "Pix", "Oferta", None, None, False),
+             ("2021-03-15", "Retroativo", 12345, "Pix", "Dízimo", None, None, False)], "diacono01"),
+        database.atualizar_lancamento(id_editavel, "2021-03-15", "Editável", 1000, "Pix", "Oferta"),
+        database.anos_arquivados([2020, 2021, hoje.year]) == [2020, 2021],
+    ]
+    database.excluir_lancamento(id_editavel)
+    _, periodo_retroativo = ler_periodo()
+    totais_retroativo = database.obter_totais("diacono01", "editor")
+
+    recusas = 0
+    for ano in (anos[0], hoje.year):
+        try:
+            arquivo_anual.arquivar_ano(ano)
+        except ValueError:
+            recusas += 1
+
+    # Arquivo com o nome final sem registro no manifesto (execução interrompida): nunca é sobrescrito
+    orfao = os.path.join(arquivo_anual.diretorio_arquivo(), "lancamentos_2019.parquet")
+    with open(orfao, "wb") as arquivo:
+        arquivo.write(b"sobra")
+    database.adicionar_lancamento("2019-12-31", "Orfao", 1000, "Pix", "Oferta", "admin")
+    try:
+        arquivo_anual.arquivar_ano(2019)
+    except ValueError as e:
+        recusas += "já existe" in str(e)
+    with open(orfao, "rb") as arquivo:
+        recusas += arquivo.read() == b"sobra"
+    os.remove(orfao)
+    arquivo_anual.arquivar_ano(2019)
+
+    # Carga histórica em ano arquivado: recusada inteira pelo banco e linha a linha pelo importador
+    import importar_lancamentos
+    try:
+        database.carregar_lancamentos_em_massa(
+            [[("2021-05-01", "Carga", 1000, "Pix", "Oferta", None, None, None)]], "admin")
+    except ValueError:
+        recusas += 1
+    planilha = io.BytesIO(f"data;nome;valor;tipo;categoria\n01/05/2021;Carga;10,00;Pix;Oferta\n"
+                          f"{hoje.strftime('%d/%m/%Y')};Carga;10,00;Pix;Oferta\n".encode())
+    importacao = importar_lancamentos.importar_arquivo(planilha, "admin", nome_arquivo="carga.csv")
+    recusas += importacao["rejeitadas"] == 1 and importacao["importadas"] == 1
+
+    tamanho_parquet = sum(resultado["bytes"] for resultado in arquivados)
+    print(f"Arquivados {sum(r['linhas'] for r in arquivados):,} lançamentos de {len(anos)} anos em "
+          f"{tempo_arquivar:.1f}s | restam {restantes:,} no SQLite")
+    print(f"Banco: {tamanho_antes / 2 ** 20:.1f} MB -> {os.path.getsize(caminho) / 2 ** 20:.1f} MB "
+          f"| Parquet: {tamanho_parquet / 2 ** 20:.1f} MB")
+    print(f"obter_lancamentos (admin): {tempo_tudo_antes * 1000:7.0f} ms -> {tempo_tudo_depois * 1000:7.0f} ms "
+          f"({len(lista_depois):,} linhas, com os anos arquivados) | páginas, pesquisa e busca iguais: "
+          f"{interface_antes == interface_depois}")
+    print(f"iterar_lancamentos março/2021 (diacono01, Dízimo): {tempo_periodo_antes * 1000:.0f} ms (SQLite) -> "
+          f"{tempo_periodo_depois * 1000:.0f} ms (Parquet, {len(grupos)} de {parquet_2021.metadata.num_row_groups} "
+          f"grupos de linhas)")
+    print(f"Totais iguais: {totais_antes == totais_depois} | leituras iguais: "
+          f"{todos_antes == todos_depois and periodo_antes == periodo_depois} | "
+          f"retroativo: {len(periodo_retroativo) - len(periodo_depois)} linha(s) a mais | recusas: {recusas} "
+          f"| gravações em ano arquivado: {gravacoes_recusadas}")
+
+    return (totais_antes == totais_depois and todos_antes == todos_depois and periodo_antes == periodo_depois
+            and len(periodo_antes) > 0 and lista_antes == lista_depois and interface_antes == interface_depois
+            and all(linhas for linhas, _ in interface_antes[0]) and all(interface_antes[1:])
+            and len(grupos) < parquet_2021.metadata.num_row_groups
+            and periodo_retroativo == periodo_depois and totais_retroativo == totais_depois[1]
+            and gravacoes_recusadas == [False, None, False, True]
+            and recusas == 6 and not arquivo_anual.verificar_arquivos()
+            and not database.verificar_resumo_diario())
+
+
+def testar_particoes() -> bool:
+    """Partições anuais (ATTACH): anos encerrados em arquivos próprios, leituras e totais iguais"""
+    from config import CATEGORIAS, TIPOS_PAGAMENTO, PARTICOES_POR_CONSULTA
+
+    caminho = usar_banco_temporario()
+    database.garantir_banco_inicializado()
+
+    # 60 mil lançamentos de 2020 até hoje, metade do admin e metade do diacono01 (1 em 10 com celular):
+    # roteamento, mudanças interrompidas e busca de texto não dependem do volume
+    aleatorio = random.Random(42)
+    hoje = date.today()
+    primeiro = date(2020, 1, 1).toordinal()
+    datas = [date.fromordinal(dia).isoformat() for dia in range(primeiro, hoje.toordinal() + 1)]
+    for usuario in ("admin", "diacono01"):
+        database.carregar_lancamentos_em_massa([[
+            (aleatorio.choice(datas), f"Contribuinte {i % 5000}", aleatorio.randint(100, 50000),
+             aleatorio.choice(TIPOS_PAGAMENTO), aleatorio.choice(CATEGORIAS), None,
+             *(("11", f"9{i:08d}") if i % 10 == 0 else (None, None)))
+            for i in range(30_000)
+        ]], usuario)
+    anos = range(2020, hoje.year)
+
+    visoes = (("admin", "admin"), ("diacono01", "editor"))
+    periodo = {"data_inicio": "2021-03-01", "data_fim": "2021-03-31", "categorias": ("Dízimo",)}
+    pesquisas = ({"nome": "contribuinte 12", "limite": 50}, {"data_inicio": "2022-12-20", "limite": 30},
+                 {"valor_centavos": 12345, "limite": 100})
+    # Menos resultados que o limite: sem partições a busca ordena por relevância, com partições por data
+    buscas = ("contribuinte 4242", "900012")
+
+    def paginar(usuario, nivel):
+        # Visualizar: todas as páginas para frente e, a partir da última linha, todas para trás
+        paginas, cursor, tem_mais = [], None, True
+        while tem_mais:
+            linhas, tem_mais = database.obter_lancamentos_pagina(usuario, nivel, cursor, 5000, "proxima")
+            paginas.extend(linhas)
+            cursor = (linhas[-1][1], linhas[-1][0]) if linhas else None
+        voltando, tem_mais = [], True
+        while tem_mais and cursor:
+            linhas, tem_mais = database.obter_lancamentos_pagina(usuario, nivel, cursor, 5000, "anterior")
+            voltando[:0] = linhas
+            cursor = (linhas[0][1], linhas[0][0]) if linhas else None
+        return paginas, voltando + paginas[-1:] == paginas
+
+    def ler():
+        database.invalidar_cache()
+        return ([database.obter_totais(usuario, nivel) for usuario, nivel in visoes],
+                list(database.iterar_lancamentos(nivel_acesso="admin")),
+                list(database.iterar_lancamentos("diacono01", "editor", **periodo)),
+                [database.pesquisar_lancamentos(**filtros) for filtros in pesquisas],
+                [database.obter_lancamentos(usuario, nivel) for usuario, nivel in visoes],
+                [paginar(usuario, nivel) for usuario, nivel in visoes],
+                [sorted(database.buscar_lancamentos(texto, 1000, usuario, nivel))
+                 for texto in buscas for usuario, nivel in visoes],
+                list(database.iterar_contatos()))
+
+    def verificar_principal():
+        inicio = time.perf_counter()
+        with database.get_db_connection() as conn:
+            conn.execute("PRAGMA quick_check").fetchall()
+        return time.perf_counter() - inicio
+
+    antes = ler()
+    tamanho_antes = os.path.getsize(caminho)
+    tempo_verificacao_antes = verificar_principal()
+
+    inicio = time.perf_counter()
+    movidos = sum(database.particionar_ano(ano) for ano in anos)
+    tempo_particionar = time.perf_counter() - inicio
+    with database.get_db_connection() as conn:
+        conn.execute("VACUUM")
+        restantes = conn.execute("SELECT COUNT(*) FROM lancamentos").fetchone()[0]
+    tempo_verificacao_depois = verificar_principal()
+
+    def busca_limitada():
+        # Mais resultados que o limite: o corte não pode depender de como os anos foram agrupados
+        database.invalidar_cache()
+        return database.buscar_lancamentos("contribuinte 42", 20)
+
+    depois = ler()
+    buscas_limitadas = [busca_limitada()]
+    database.PARTICOES_POR_CONSULTA = 2  # Força várias faixas de ATTACH na mesma leitura
+    try:
+        em_faixas = ler()
+        buscas_limitadas.append(busca_limitada())
+    finally:
+        database.PARTICOES_POR_CONSULTA = PARTICOES_POR_CONSULTA
+
+    # Plano da visão: união ordenada pelos índices de cada arquivo, sem ordenação temporária
+    with database.get_db_connection() as conn:
+        with database._particoes_anexadas(conn, list(anos), gatilhos=False):
+            sql, params = database._sql_lancamentos_filtrados(
+                None, "admin", None, None, None, database._tabela_leitura(list(anos)))
+            plano = " | ".join(linha[-1] for linha in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+
+    # Roteamento das escritas pela data
+    def arquivo_do_lancamento(id_lancamento):
+        with database.get_db_connection() as conn:
+            return database._localizar_lancamento(conn, id_lancamento)[1]
+
+    def achados_retroativo():
+        database.invalidar_cache()
+        return [linha[0] for linha in database.buscar_lancamentos("retroativo")]
+
+    database.adicionar_lancamento("2021-03-15", "Retroativo", 12345, "Pix", "Dízimo", "diacono01")
+    with database.get_db_connection() as conn:
+        id_retroativo = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'lancamentos'").fetchone()[0]
+    rotas = [arquivo_do_lancamento(id_retroativo)]
+    buscas_retroativo = [achados_retroativo()]
+    totais_retroativo = database.obter_totais("diacono01", "editor")
+    database.atualizar_lancamento(id_retroativo, hoje.isoformat(), "Retroativo", 12345, "Pix", "Dízimo")
+    rotas.append(arquivo_do_lancamento(id_retroativo))
+    database.atualizar_lancamento(id_retroativo, "2022-07-01", "Retroativo", 12345, "Pix", "Dízimo")
+    rotas.append(arquivo_do_lancamento(id_retroativo))
+    buscas_retroativo.append(achados_retroativo())
+    lido = database.obter_lancamento_por_id(id_retroativo)
+    database.excluir_lancamento(id_retroativo)
+    rotas.append(database.obter_lancamento_por_id(id_retroativo))
+    buscas_retroativo.append(achados_retroativo())
+
+    lote = [(data, "Lote", 1000, "Pix", "Oferta", None, None, False)
+            for data in ("2020-05-05", hoje.isoformat(), "2023-01-31", hoje.isoformat())]
+    ids_lote = database.adicionar_lancamentos_lote(lote, "admin")
+    datas_lote = [database.obter_lancamento_por_id(id_lote)[1] for id_lote in ids_lote]
+    for id_lote in ids_lote:
+        database.excluir_lancamento(id_lote)
+    final = ler()
+
+    # Carga histórica com um ano particionado: as linhas do ano vão para a partição
+    database.carregar_lancamentos_em_massa([[
+        ("2021-06-01", "Carga", 1000, "Pix", "Oferta", None, None, None),
+        (hoje.isoformat(), "Carga", 1000, "Pix", "Oferta", None, None, None),
+    ]], "admin")
+    with database.get_db_connection() as conn:
+        carga_rotas = sorted((linha[1], database._localizar_lancamento(conn, linha[0])[1])
+                             for linha in database.pesquisar_lancamentos(nome="Carga", limite=10))
+
+    # Rota escolhida antes de um particionar_ano terminar (corrida): a transação de gravação
+    # confere a rota de novo e a escolha é refeita
+    particao_da_data = database._particao_da_data
+    desatualizadas = []
+
+    def rota_desatualizada(conn, data):
+        return desatualizadas.pop() if desatualizadas else particao_da_data(conn, data)
+
+    database._particao_da_data = rota_desatualizada
+    try:
+        desatualizadas.append(None)
+        database.adicionar_lancamento("2021-08-08", "Corrida", 700, "Pix", "Oferta", "admin")
+        with database.get_db_connection() as conn:
+            id_corrida = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'lancamentos'").fetchone()[0]
+        rotas_corrida = [arquivo_do_lancamento(id_corrida)]
+        desatualizadas.append(None)
+        database.atualizar_lancamento(id_corrida, "2022-08-08", "Corrida", 700, "Pix", "Oferta")
+        rotas_corrida.append(arquivo_do_lancamento(id_corrida))
+    finally:
+        database._particao_da_data = particao_da_data
+    database.excluir_lancamento(id_corrida)
+
+    # Mudança de arquivo interrompida (queda entre as transações): novos valores gravados só na
+    # origem (A) ou também copiados para o destino (B), sem os gatilhos do resumo
+    def copias(id_lancamento):
+        with database.get_db_connection() as conn:
+            return sorted(database._copias_lancamento(conn, id_lancamento))
+
+    ids_interrompidos = []
+    for nome in ("Interrompido A", "Interrompido B"):
+        database.adicionar_lancamento("2021-04-01", nome, 5000, "Pix", "Oferta", "admin")
+        with database.get_db_connection() as conn:
+            ids_interrompidos.append(conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'lancamentos'").fetchone()[0])
+    particao = sqlite3.connect(database._caminho_particao(2021))
+    particao.execute("ATTACH DATABASE ? AS destino", (database._caminho_particao(2022),))
+    particao.execute("UPDATE lancamentos SET data = '2022-07-01' WHERE id IN (?, ?)", ids_interrompidos)
+    particao.execute("INSERT INTO destino.lancamentos SELECT * FROM lancamentos WHERE id = ?", ids_interrompidos[1:])
+    particao.commit()
+    particao.close()
+    interrompidas = [copias(id_lancamento) for id_lancamento in ids_interrompidos]
+    with database.get_db_connection() as conn:
+        localizadas = [database._localizar_lancamento(conn, id_lancamento)[1] for id_lancamento in ids_interrompidos]
+    reparados = database.concluir_movimentacoes()  # Reparo: edição e exclusão não percorrem as partições
+    concluidas = [copias(id_lancamento) for id_lancamento in ids_interrompidos]
+    resumo_divergente = bool(database.verificar_resumo_diario())
+    for id_lancamento in ids_interrompidos:
+        database.excluir_lancamento(id_lancamento, "2022-07-01")
+    excluidas = [copias(id_lancamento) for id_lancamento in ids_interrompidos]
+    database.reconstruir_resumo_diario()
+
+    # Confirmação por WhatsApp de lançamentos de um ano particionado: dados lidos nas partições e,
+    # na falha definitiva, "erro" se o lançamento existe ou "cancelado" se foi excluído
+    ids_confirmacao = []
+    for nome in ("Confirmação", "Confirmação excluída"):
+        database.adicionar_lancamento("2021-05-05", nome, 2500, "Pix", "Oferta", "admin",
+                                      telefone="(11) 99999-0000", enviar_whatsapp=True)
+        with database.get_db_connection() as conn:
+            ids_confirmacao.append(conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'lancamentos'").fetchone()[0])
+    database.excluir_lancamento(ids_confirmacao[1])
+    reservadas = database.reservar_mensagens_outbox(10)
+    for mensagem in reservadas:
+        database.concluir_mensagem_outbox(mensagem[0], False, "Número inválido", mensagem[2], repetir=False)
+    with database.get_db_connection() as conn:
+        status_confirmacao = conn.execute(
+            "SELECT lancamento_id, status FROM outbox WHERE lancamento_id IN (?, ?) ORDER BY lancamento_id",
+            ids_confirmacao).fetchall()
+    for id_lancamento in ids_confirmacao[:1]:
+        database.excluir_lancamento(id_lancamento)
+
+    particoes = database.verificar_particoes()
+    tamanho_particoes = sum(particao[3] for particao in particoes)
+    recusas = 0
+    try:
+        database.particionar_ano(hoje.year)
+    except ValueError:
+        recusas += 1
+    # Partição criada antes do índice de texto completo: repetir particionar_ano indexa o arquivo
+    particao = sqlite3.connect(database._caminho_particao(anos[0]))
+    for nome in ("trg_lancamentos_fts_insert", "trg_lancamentos_fts_delete", "trg_lancamentos_fts_update"):
+        particao.execute(f"DROP TRIGGER {nome}")
+    particao.execute("DROP TABLE lancamentos_fts")
+    particao.commit()
+    particao.close()
+    recusas += database.particionar_ano(anos[0]) == 0  # Ano já particionado: nada a mover
+    database.invalidar_cache()
+    reindexada = [sorted(database.buscar_lancamentos(texto, 1000)) for texto in buscas]
+
+    iguais = antes == depois == em_faixas == final
+    rotas_esperadas = [2021, None, 2022, None]
+    print(f"Particionados {movidos:,} lançamentos de {len(anos)} anos em {tempo_particionar:.1f}s "
+          f"| restam {restantes:,} no arquivo principal")
+    print(f"Arquivo principal: {tamanho_antes / 2 ** 20:.1f} MB -> {os.path.getsize(caminho) / 2 ** 20:.1f} MB "
+          f"| partições: {tamanho_particoes / 2 ** 20:.1f} MB | quick_check: "
+          f"{tempo_verificacao_antes * 1000:.0f} ms -> {tempo_verificacao_depois * 1000:.0f} ms")
+    print(f"Plano da visão: {plano.count('MERGE (UNION ALL)')} MERGE (UNION ALL) sobre os índices | "
+          f"ordenação temporária: {'TEMP B-TREE' in plano}")
+    print(f"Leituras iguais (1 e várias faixas, após escritas): {iguais} | rotas: {rotas} "
+          f"| lote: {datas_lote == [linha[0] for linha in lote]} | recusas: {recusas}")
+    print(f"Carga em massa (data, partição): {carga_rotas} | rota conferida na gravação: {rotas_corrida}")
+    print(f"Outbox (partição): {[mensagem[3:] for mensagem in reservadas]} | status: {status_confirmacao}")
+    print(f"Mudança interrompida: {interrompidas} -> {concluidas} -> {excluidas} | localizadas: {localizadas} "
+          f"| reparados: {reparados} | resumo divergente antes de reconstruir: {resumo_divergente}")
+    print(f"Busca de texto: {[len(linhas) for linhas in antes[6]]} resultados | contatos: {len(antes[7]):,} "
+          f"| retroativo: {buscas_retroativo} | partição reindexada: {reindexada == antes[6][::2]} "
+          f"| busca limitada igual em faixas: {buscas_limitadas[0] == buscas_limitadas[1]}")
+
+    return (iguais and len(antes[2]) > 0 and movidos + restantes == 60_000
+            and all(ida_e_volta for _, ida_e_volta in antes[5]) and len(antes[5][0][0]) == 60_000
+            and rotas == rotas_esperadas and lido is not None and lido[1] == "2022-07-01"
+            and totais_retroativo["total_dizimo_geral"] == antes[0][1]["total_dizimo_geral"] + 12345
+            and ids_lote == sorted(ids_lote) and datas_lote == [linha[0] for linha in lote]
+            and "MERGE" in plano and "TEMP B-TREE" not in plano
+            and all(particao[4] == "ok" for particao in particoes) and len(particoes) == len(anos)
+            and recusas == 2 and not database.verificar_resumo_diario()
+            and carga_rotas == [("2021-06-01", 2021), (hoje.isoformat(), None)]
+            and rotas_corrida == [2021, 2022]
+            and interrompidas == [[(2021, "2022-07-01")], [(2021, "2022-07-01"), (2022, "2022-07-01")]]
+            and localizadas == [2021, 2022] and reparados == 2 and resumo_divergente
+            and concluidas == [[(2022, "2022-07-01")], [(2022, "2022-07-01")]] and excluidas == [[], []]
+            and [mensagem[3:] for mensagem in reservadas] == [("Confirmação", 2500, "Oferta", "2021-05-05"),
+                                                             (None, None, None, None)]
+            and status_confirmacao == [(ids_confirmacao[0], "erro"), (ids_confirmacao[1], "cancelado")]
+            and all(0 < len(linhas) < 1000 for linhas in antes[6]) and len(antes[7]) == 6_000
+            and buscas_retroativo == [[id_retroativo], [id_retroativo], []] and reindexada == antes[6][::2]
+            and buscas_limitadas[0] == buscas_limitadas[1] and len(buscas_limitadas[0]) == 20
+            and buscas_limitadas[0] == sorted(buscas_limitadas[0], key=lambda linha: (linha[1], linha[0]), reverse=True))
+
+
+TESTES = {
+    "inicializacao": testar_inicializacao,
+    "pool": testar_pool,
+    "cache": testar_cache,
+    "fts": testar_fts,
+    "outbox": testar_outbox,
+    "importacao": testar_importacao,
+    "logo": testar_logo,
+    "css": testar_css,
+    "login": testar_login,
+    "totais": testar_totais,
+    "agregador": testar_agregador,
+    "tabela": testar_tabela,
+    "lote": testar_lote,
+    "carga_csv": testar_carga_csv,
+    "exportacao": testar_exportacao,
+    "arquivo": testar_arquivo,
+    "particoes": testar_particoes,
+}
+
+
+def main() -> int:
+    """Executa os testes pedidos (ou todos) e retorna o código de saída"""
+    nomes = sys.argv[1:] or list(TESTES)
+
+    desconhecidos = [nome for nome in nomes if nome not in TESTES]
+    if desconhecidos:
+        print(f"❌ Teste(s) desconhecido(s): {', '.join(desconhecidos)}")
+        print(f"Disponíveis: {', '.join(TESTES)}")
+        return 2
+
+    todos_ok = True
+    for nome in nomes:
+        print("\n" + "=" * 60)
+        print(f"⏱️  {nome.upper()} - {TESTES[nome].__doc__}")
+        print("=" * 60)
+        ok = TESTES[nome]()
+        print("✅ OK" if ok else "❌ FALHOU")
+        todos_ok = todos_ok and ok
+
+    return 0 if todos_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+Script de Teste do Envio de WhatsApp
+Verifica limite de taxa, novas tentativas e disjuntor do WhatsAppService (e o uso deles pela outbox)
+contra um servidor HTTP local que simula a API do Twilio (nenhuma mensagem real é enviada)
+
+Uso:
+    python testar_whatsapp.py
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import campanha_whatsapp
+import database
+import whatsapp_service
+from testar_desempenho import usar_banco_temporario
+from whatsapp_service import WhatsAppService, LimitadorTaxa, DisjuntorCircuito
+
+
+class TwilioSimulado:
+    """Servidor local que responde como o endpoint Messages.json do Twilio"""
+
+    def __init__(self):
+        self.respostas = []  # Status HTTP das próximas respostas (vazio = 201)
+        self.latencia = 0.0  # Segundos de espera antes de cada resposta
+        self.requisicoes = []  # (instante, destinatário, corpo)
+        self._lock = threading.Lock()
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), self._criar_handler())
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.servidor.server_address[1]}"
+
+    def programar(self, *status, latencia: float = 0.0):
+        """Define os status HTTP das próximas respostas"""
+        with self._lock:
+            self.respostas = list(status)
+            self.requisicoes = []
+            self.latencia = latencia
+
+    def _proximo_status(self, destinatario: str, corpo: str) -> int:
+        with self._lock:
+            self.requisicoes.append((time.monotonic(), destinatario, corpo))
+            return self.respostas.pop(0) if self.respostas else 201
+
+    def _criar_handler(self):
+        simulado = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                tamanho = int(self.headers.get("Content-Length", 0))
+                campos = parse_qs(self.rfile.read(tamanho).decode())
+                status = simulado._proximo_status(campos.get("To", [""])[0], campos.get("Body", [""])[0])
+                time.sleep(simulado.latencia)
+
+                if status < 400:
+                    conteudo = {"sid": f"SM{len(simulado.requisicoes):032d}", "status": "queued"}
+                else:
+                    conteudo = {"code": 20000 + status, "message": f"Erro simulado {status}", "status": status}
+
+                dados = json.dumps(conteudo).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def criar_servico(simulado: TwilioSimulado, taxa: float = 1000) -> WhatsAppService:
+    """Serviço habilitado apontando para o servidor simulado"""
+    servico = WhatsAppService(habilitado=True, url_api=simulado.url)
+    servico.limitador = LimitadorTaxa(taxa, 1)
+    servico.disjuntor = DisjuntorCircuito(limite_falhas=5, pausa=0.5)
+    return servico
+
+
+# ============================================
+# TESTES
+# ============================================
+
+def testar_sucesso(simulado) -> bool:
+    """Envio normal: uma única requisição"""
+    servico = criar_servico(simulado)
+    simulado.programar()
+    sucesso, msg = servico.enviar_confirmacao_contribuicao("(11) 98765-4321", "João", 10000, "Dízimo", "07/02/2026")
+    print(f"{msg} | requisições: {len(simulado.requisicoes)}")
+    return sucesso and len(simulado.requisicoes) == 1 and simulado.requisicoes[0][1] == "whatsapp:+5511987654321"
+
+
+def testar_novas_tentativas(simulado) -> bool:
+    """429 e 503 seguidos de sucesso: erro temporário é repetido"""
+    servico = criar_servico(simulado)
+    simulado.programar(429, 503)
+    sucesso, msg = servico.enviar_confirmacao_contribuicao("(11) 98765-4321", "João", 10000, "Dízimo", "07/02/2026")
+    print(f"{msg} | requisições: {len(simulado.requisicoes)}")
+    return sucesso and len(simulado.requisicoes) == 3
+
+
+def testar_erro_definitivo(simulado) -> bool:
+    """400 (número inválido): não é repetido"""
+    servico = criar_servico(simulado)
+    simulado.programar(400)
+    sucesso, msg = servico.enviar_mensagem_personalizada("(11) 98765-4321", "Olá")
+    print(f"{msg} | requisições: {len(simulado.requisicoes)}")
+    return not sucesso and len(simulado.requisicoes) == 1
+
+
+def testar_disjuntor(simulado) -> bool:
+    """500 contínuo: o disjuntor abre, recusa sem chamar a API e fecha após a pausa"""
+    servico = criar_servico(simulado)
+    simulado.programar(*([500] * 10))
+
+    # 4 tentativas na primeira mensagem, a 5ª falha (2ª mensagem) abre o disjuntor
+    servico.enviar_mensagem_personalizada("(11) 98765-4321", "Teste 1")
+    servico.enviar_mensagem_personalizada("(11) 98765-4321", "Teste 2")
+    chamadas_ate_abrir = len(simulado.requisicoes)
+
+    sucesso_aberto, msg_aberto = servico.enviar_mensagem_personalizada("(11) 98765-4321", "Teste 3")
+    chamadas_com_aberto = len(simulado.requisicoes) - chamadas_ate_abrir
+    estado_aberto = servico.disjuntor.estado
+
+    time.sleep(0.6)
+    simulado.programar()
+    sucesso_depois, _ = servico.enviar_mensagem_personalizada("(11) 98765-4321", "Teste 4")
+
+    print(f"Requisições até abrir: {chamadas_ate_abrir} | com disjuntor aberto: {chamadas_com_aberto}")
+    print(f"Com disjuntor {estado_aberto}: {msg_aberto}")
+    print(f"Após a pausa: {'enviada' if sucesso_depois else 'falhou'} | estado: {servico.disjuntor.estado}")
+
+    return (chamadas_ate_abrir == 5 and chamadas_com_aberto == 0 and not sucesso_aberto
+            and estado_aberto == "aberto" and sucesso_depois and servico.disjuntor.estado == "fechado")
+
+
+def testar_limite_taxa(simulado) -> bool:
+    """10 mensagens em 5 threads com limite de 20/s: intervalo mínimo de 50 ms"""
+    servico = criar_servico(simulado, taxa=20)
+    simulado.programar()
+
+    def enviar(indice):
+        for numero in range(2):
+            servico.enviar_mensagem_personalizada("(11) 98765-4321", f"Mensagem {indice}.{numero}")
+
+    threads = [threading.Thread(target=enviar, args=(i,)) for i in range(5)]
+    inicio = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.monotonic() - inicio
+
+    instantes = sorted(instante for instante, _, _ in simulado.requisicoes)
+    taxa_media = (len(instantes) - 1) / (instantes[-1] - instantes[0])
+    print(f"{len(instantes)} mensagens em {duracao:.2f}s | taxa observada: {taxa_media:.1f}/s (limite 20/s)")
+    return len(instantes) == 10 and taxa_media <= 20 * 1.1
+
+
+def testar_campanha(simulado) -> bool:
+    """Campanha: deduplicação, envio em paralelo, interrupção e retomada"""
+    usar_banco_temporario()
+    database.garantir_banco_inicializado()
+
+    # 300 contribuintes, cada um com 3 lançamentos e o número gravado de formas diferentes
+    for i in range(300):
+        numero = f"9{i:08d}"
+        for formato in (numero, f"{numero[:5]}-{numero[5:]}", f"55 11 {numero}"):
+            codigo_area = "" if formato.startswith("55") else "11"
+            database.adicionar_lancamento("2026-10-01", f"Contribuinte {i}", 1000, "Pix", "Oferta",
+                                          "diacono01", codigo_area=codigo_area, celular=formato)
+    database.adicionar_lancamento("2026-10-01", "Sem celular", 1000, "Dinheiro", "Oferta", "diacono01")
+
+    servico = criar_servico(simulado, taxa=200)
+
+    # Sequencial x pool de threads, com 20 ms de latência por requisição
+    sequencial_id, total = campanha_whatsapp.criar_campanha("Sequencial", "Olá {primeiro_nome}, obrigado!")
+    simulado.programar(latencia=0.02)
+    sequencial = campanha_whatsapp.enviar_campanha(sequencial_id, threads=1, servico=servico)
+
+    # API cai após 100 envios: a execução para com destinatários pendentes e depois é retomada
+    campanha_id, _ = campanha_whatsapp.criar_campanha("Paralela", "Olá {primeiro_nome}, obrigado!")
+    simulado.programar(*([201] * 100 + [500] * 20), latencia=0.02)
+    interrompida = campanha_whatsapp.enviar_campanha(campanha_id, threads=8, servico=servico)
+    pendentes = database.resumo_campanha(campanha_id)["pendente"]
+
+    # Retomada em uma nova execução (novo processo: disjuntor fechado)
+    simulado.programar(latencia=0.02)
+    retomada = campanha_whatsapp.enviar_campanha(campanha_id, threads=8, servico=criar_servico(simulado, taxa=200))
+    resumo = database.resumo_campanha(campanha_id)
+    destinatarios = {destinatario for _, destinatario, _ in simulado.requisicoes}
+
+    print(f"Destinatários únicos: {total} (de 901 lançamentos)")
+    print(f"1 thread:  {sequencial['mensagens_por_segundo']:6.1f} msg/s")
+    print(f"8 threads: {retomada['mensagens_por_segundo']:6.1f} msg/s (limite 200/s)")
+    print(f"1ª execução (API cai): {interrompida['enviados']} enviados, {pendentes} pendentes")
+    print(f"Retomada: {retomada['enviados']} enviados | resumo final: {resumo}")
+
+    return (total == 300 and sequencial["enviados"] == 300 and pendentes > 0
+            and resumo["enviado"] == 300 and len(destinatarios) == retomada["enviados"]
+            and database.obter_campanha(campanha_id)[4] is not None
+            and retomada["mensagens_por_segundo"] > sequencial["mensagens_por_segundo"])
+
+
+def testar_outbox(simulado) -> bool:
+    """Outbox: erro definitivo não volta para a fila; disjuntor aberto adia sem gastar tentativa"""
+    import outbox_worker
+
+    usar_banco_temporario()
+    database.garantir_banco_inicializado()
+    for i in range(4):
+        database.adicionar_lancamento("2026-10-01", f"Contribuinte {i}", 1000, "Pix", "Oferta", "diacono01",
+                                      telefone="(11) 98765-4321", enviar_whatsapp=True)
+
+    # 1ª mensagem: 400 (número inválido); 2ª: 500 em todas as tentativas; a 3ª abre o disjuntor
+    original = whatsapp_service._whatsapp_service
+    whatsapp_service._whatsapp_service = criar_servico(simulado)
+    simulado.programar(400, *([500] * 10))
+    try:
+        processadas = outbox_worker.processar_outbox()
+    finally:
+        whatsapp_service._whatsapp_service = original
+
+    with database.get_db_connection() as conn:
+        situacao = conn.execute("SELECT status, tentativas FROM outbox ORDER BY id").fetchall()
+    print(f"Processadas: {processadas} | requisições: {len(simulado.requisicoes)} | (status, tentativas): {situacao}")
+
+    return (processadas == 4 and len(simulado.requisicoes) == 6
+            and situacao == [("erro", 1), ("pendente", 1), ("pendente", 0), ("pendente", 0)])
+
+
+TESTES = [testar_sucesso, testar_novas_tentativas, testar_erro_definitivo, testar_disjuntor, testar_limite_taxa,
+          testar_outbox, testar_campanha]
+
+
+def main() -> int:
+    """Executa os testes contra o servidor simulado e retorna o código de saída"""
+    # Esperas curtas entre tentativas para o teste ser rápido
+    whatsapp_service.WHATSAPP_ESPERA_BASE_SEGUNDOS = 0.01
+    whatsapp_service.WHATSAPP_ESPERA_MAXIMA_SEGUNDOS = 0.05
+
+    simulado = TwilioSimulado()
+    todos_ok = True
+
+    for teste in TESTES:
+        print("\n" + "=" * 60)
+        print(f"📲 {teste.__doc__}")
+        print("=" * 60)
+        ok = teste(simulado)
+        print("✅ OK" if ok else "❌ FALHOU")
+        todos_ok = todos_ok and ok
+
+    simulado.servidor.shutdown()
+    return 0 if todos_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
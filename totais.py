@@ -0,0 +1,237 @@
+"""
+Totais Financeiros em Memória
+Totais para grandes volumes de lançamentos (ex.: exportação anual)
+
+O aplicativo calcula os totais no SQLite (database.obter_totais). Este módulo
+atende à análise offline, com somas inteiras em centavos e o mesmo dicionário:
+- calcular_totais_dataframe: vetorizado, sobre colunas (DataFrame do pandas ou
+  arrays do NumPy). pandas é importado apenas quando a função é chamada.
+- AgregadorTotais: uma única passada sobre um iterador de linhas (ex.:
+  database.iterar_lancamentos), com memória constante, sem pandas.
+"""
+import threading
+from collections import defaultdict
+from datetime import date
+from typing import Iterable, List, Optional, Tuple
+
+from config import CATEGORIAS
+
+# Mesma ordem de database.obter_totais
+CHAVES_TOTAIS = (
+    "total_geral", "total_dia", "total_mes",
+    "total_dizimo_geral", "total_oferta_geral", "total_visitante_geral",
+    "total_dizimo_mes", "total_oferta_mes", "total_visitante_mes"
+)
+
+# Categoria -> prefixo da chave no dicionário de totais
+_CHAVE_CATEGORIA = {"Dízimo": "dizimo", "Oferta": "oferta", "Visitante": "visitante"}
+
+# Posições dos campos nas tuplas de lançamentos (obter_lancamentos)
+IDX_DATA = 1
+IDX_VALOR = 3
+IDX_TIPO = 4
+IDX_CATEGORIA = 5
+
+
+def lancamentos_para_dataframe(lancamentos: List[Tuple]):
+    """
+    Converte a lista de tuplas de lançamentos nas colunas usadas pelos totais
+
+    Cada coluna é lida direto para um array do NumPy (sem DataFrame de
+    objetos intermediário): as datas ISO viram datetime64 e as categorias,
+    códigos inteiros.
+
+    Returns:
+        DataFrame com data (datetime64), valor_centavos (int64) e categoria (categórica)
+    """
+    import numpy as np
+    import pandas as pd
+
+    quantidade = len(lancamentos)
+    codigos = {categoria: codigo for codigo, categoria in enumerate(CATEGORIAS)}
+
+    datas = np.array([l[IDX_DATA] for l in lancamentos], dtype="datetime64[D]")
+    valores = np.fromiter((l[IDX_VALOR] for l in lancamentos), dtype=np.int64, count=quantidade)
+    categorias = np.fromiter((codigos.get(l[IDX_CATEGORIA], -1) for l in lancamentos),
+                             dtype=np.int8, count=quantidade)
+
+    return pd.DataFrame({
+        "data": datas.astype("datetime64[s]"),
+        "valor_centavos": valores,
+        "categoria": pd.Categorical.from_codes(categorias, categories=CATEGORIAS),
+    })
+
+
+def calcular_totais_dataframe(lancamentos, hoje: Optional[str] = None, mes: Optional[str] = None) -> dict:
+    """
+    Calcula os totais financeiros a partir de colunas
+
+    Aceita datas em texto (YYYY-MM-DD) ou datetime64 e categorias em texto ou
+    categóricas; datas e categorias são comparadas como inteiros (dias e
+    códigos) e cada total é uma soma mascarada sobre o array de valores.
+
+    Args:
+        lancamentos: DataFrame (ou dicionário de arrays do NumPy) com as
+            colunas data, valor_centavos e categoria
+        hoje: Data de referência no formato YYYY-MM-DD (padrão: hoje)
+        mes: Mês de referência no formato YYYY-MM (padrão: mês atual)
+
+    Returns:
+        Dicionário com os totais calculados (em centavos)
+    """
+    import numpy as np
+    import pandas as pd
+
+    hoje = hoje or date.today().strftime("%Y-%m-%d")
+    mes = mes or hoje[:7]
+
+    if not isinstance(lancamentos, pd.DataFrame):
+        lancamentos = pd.DataFrame(lancamentos, copy=False)
+
+    # Texto ISO (YYYY-MM-DD) converte direto para dias
+    dias = lancamentos["data"].to_numpy().astype("datetime64[D]")
+
+    categorias = lancamentos["categoria"]
+    if not isinstance(categorias.dtype, pd.CategoricalDtype):
+        categorias = categorias.astype(pd.CategoricalDtype(CATEGORIAS))
+
+    valores = lancamentos["valor_centavos"].to_numpy(dtype=np.int64)
+    no_dia = dias == np.datetime64(hoje, "D")
+    inicio_mes = np.datetime64(mes, "M")
+    no_mes = (dias >= inicio_mes.astype("datetime64[D]")) & (dias < (inicio_mes + 1).astype("datetime64[D]"))
+
+    totais = dict.fromkeys(CHAVES_TOTAIS, 0)
+    totais["total_geral"] = int(valores.sum())
+    totais["total_dia"] = int(valores.sum(where=no_dia))
+    totais["total_mes"] = int(valores.sum(where=no_mes))
+
+    # Somas mascaradas por código da categoria (inteiros, sem comparar textos)
+    codigos = categorias.cat.codes.to_numpy()
+    for codigo, categoria in enumerate(categorias.cat.categories):
+        chave = _CHAVE_CATEGORIA.get(categoria)
+        if chave is None:
+            continue
+        da_categoria = codigos == codigo
+        totais[f"total_{chave}_geral"] = int(valores.sum(where=da_categoria))
+        totais[f"total_{chave}_mes"] = int(valores.sum(where=da_categoria & no_mes))
+
+    return totais
+
+
+class AgregadorTotais:
+    """
+    Acumula os totais dos lançamentos em uma única passada
+
+    Como a tabela resumo_diario, guarda uma soma por (dia, categoria, tipo de
+    pagamento): cada linha custa uma única atualização de dicionário e a
+    memória depende da quantidade de dias, não de lançamentos. Os totais por
+    categoria, dia, mês e tipo saem dessas somas. Depois da carga,
+    adicionar/remover/atualizar aplicam apenas a diferença de cada lançamento
+    incluído, excluído ou editado, sem reler a tabela.
+
+    As linhas seguem o formato de obter_lancamentos (data no índice 1, valor
+    em centavos no 3, tipo no 4 e categoria no 5).
+    """
+
+    def __init__(self):
+        self.quantidade = 0
+        self.resumo = defaultdict(int)  # (data, categoria, tipo) -> centavos
+        self._lock = threading.Lock()
+
+    def consumir(self, linhas: Iterable[Tuple]) -> "AgregadorTotais":
+        """
+        Acumula todas as linhas do iterador (ex.: database.iterar_lancamentos)
+
+        Returns:
+            O próprio agregador, para encadear com totais()
+        """
+        resumo = self.resumo
+        quantidade = 0
+
+        with self._lock:
+            for linha in linhas:
+                resumo[linha[IDX_DATA], linha[IDX_CATEGORIA], linha[IDX_TIPO]] += linha[IDX_VALOR]
+                quantidade += 1
+            self.quantidade += quantidade
+
+        return self
+
+    def _aplicar(self, linha: Tuple, sinal: int):
+        """Soma (sinal 1) ou subtrai (sinal -1) uma linha do resumo"""
+        chave = (linha[IDX_DATA], linha[IDX_CATEGORIA], linha[IDX_TIPO])
+        self.resumo[chave] += sinal * linha[IDX_VALOR]
+        self.quantidade += sinal
+        if not self.resumo[chave]:
+            del self.resumo[chave]  # Combinação sem lançamentos não fica como zero
+
+    def adicionar(self, linha: Tuple):
+        """Inclui um lançamento novo"""
+        with self._lock:
+            self._aplicar(linha, 1)
+
+    def remover(self, linha: Tuple):
+        """Retira um lançamento excluído (linha como estava antes da exclusão)"""
+        with self._lock:
+            self._aplicar(linha, -1)
+
+    def atualizar(self, antiga: Tuple, nova: Tuple):
+        """Troca a versão anterior de um lançamento editado pela nova"""
+        with self._lock:
+            self._aplicar(antiga, -1)
+            self._aplicar(nova, 1)
+
+    def _somar_por(self, campo) -> dict:
+        """Soma o resumo agrupando pela chave calculada por campo(data, categoria, tipo)"""
+        somas = defaultdict(int)
+        with self._lock:
+            for (data, categoria, tipo), valor in self.resumo.items():
+                somas[campo(data, categoria, tipo)] += valor
+        return dict(somas)
+
+    @property
+    def por_categoria(self) -> dict:
+        return self._somar_por(lambda data, categoria, tipo: categoria)
+
+    @property
+    def por_tipo(self) -> dict:
+        return self._somar_por(lambda data, categoria, tipo: tipo)
+
+    @property
+    def por_dia(self) -> dict:
+        return self._somar_por(lambda data, categoria, tipo: data)
+
+    @property
+    def por_mes(self) -> dict:
+        return self._somar_por(lambda data, categoria, tipo: data[:7])
+
+    def totais(self, hoje: Optional[str] = None, mes: Optional[str] = None) -> dict:
+        """
+        Totais no formato de utils.calcular_totais
+
+        Args:
+            hoje: Data de referência no formato YYYY-MM-DD (padrão: hoje)
+            mes: Mês de referência no formato YYYY-MM (padrão: mês atual)
+
+        Returns:
+            Dicionário com os totais calculados (em centavos)
+        """
+        hoje = hoje or date.today().strftime("%Y-%m-%d")
+        mes = mes or hoje[:7]
+        totais = dict.fromkeys(CHAVES_TOTAIS, 0)
+
+        with self._lock:
+            for (data, categoria, _), valor in self.resumo.items():
+                totais["total_geral"] += valor
+                if data == hoje:
+                    totais["total_dia"] += valor  # Independe de mes (como calcular_totais_dataframe)
+                do_mes = data.startswith(mes)
+                if do_mes:
+                    totais["total_mes"] += valor
+
+                chave = _CHAVE_CATEGORIA.get(categoria)
+                if chave is not None:
+                    totais[f"total_{chave}_geral"] += valor
+                    if do_mes:
+                        totais[f"total_{chave}_mes"] += valor
+
+        return totais
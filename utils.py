@@ -1,48 +1,121 @@
 """
 Módulo de Funções Utilitárias
 """
-import streamlit as st
-from PIL import Image
+import io
+import os
+import threading
 from datetime import datetime
-from typing import List, Tuple
-from config import LOGO_PATH
-from mobile_config import detectar_mobile
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, List, Tuple
+from config import LOGO_PATH, LOGO_LARGURAS, LOGO_DENSIDADE_PIXELS, LOGO_QUALIDADE
+
+# streamlit e mobile_config são importados dentro das funções de exibição:
+# os validadores e conversões servem também aos scripts de linha de comando
+
+
+# Versões reduzidas da logo: {(caminho, mtime_ns): {largura: bytes}}
+# Guardadas por processo; trocar o arquivo (novo mtime) gera novas versões
+_cache_logo: Dict[tuple, Dict[int, bytes]] = {}
+_lock_logo = threading.Lock()
+
+
+def _gerar_versoes_logo(caminho: str) -> Dict[int, bytes]:
+    """
+    Decodifica a logo e gera uma versão por largura de LOGO_LARGURAS
+    
+    As versões são JPEG: st.image repassa bytes JPEG sem alteração, mas
+    recodifica outros formatos (como WebP) a cada chamada.
+    """
+    from PIL import Image, ImageOps  # Importação tardia: só necessária após o login
+    
+    versoes = {}
+    with Image.open(caminho) as arquivo:
+        original = ImageOps.exif_transpose(arquivo).convert("RGB")
+    
+    for largura in LOGO_LARGURAS:
+        largura = min(largura, original.width)
+        altura = round(original.height * largura / original.width)
+        imagem = original.resize((largura, altura), Image.LANCZOS)
+        
+        buffer = io.BytesIO()
+        imagem.save(buffer, "JPEG", quality=LOGO_QUALIDADE, optimize=True, progressive=True)
+        versoes[largura] = buffer.getvalue()
+    
+    return versoes
+
+
+def obter_logo(largura_exibida: int) -> bytes:
+    """
+    Retorna a menor versão da logo que cobre a largura exibida
+    
+    A logo é decodificada e reduzida apenas uma vez por processo (ou quando
+    o arquivo muda); os reruns seguintes só consultam o cache.
+    
+    Args:
+        largura_exibida: Largura na tela, em pixels CSS
+    
+    Returns:
+        Imagem JPEG codificada
+    
+    Raises:
+        OSError: Arquivo da logo ausente ou inválido
+    """
+    chave = (LOGO_PATH, os.stat(LOGO_PATH).st_mtime_ns)
+    
+    with _lock_logo:
+        versoes = _cache_logo.get(chave)
+        if versoes is None:
+            versoes = _gerar_versoes_logo(LOGO_PATH)
+            _cache_logo.clear()
+            _cache_logo[chave] = versoes
+    
+    necessaria = largura_exibida * LOGO_DENSIDADE_PIXELS
+    for largura in sorted(versoes):
+        if largura >= necessaria:
+            return versoes[largura]
+    return versoes[max(versoes)]
 
 
 def display_logo():
     """Exibe o logo da igreja ou um texto alternativo - responsivo para mobile"""
+    import streamlit as st
+    from mobile_config import detectar_mobile
+
     config = detectar_mobile()
     
     try:
-        logo = Image.open(LOGO_PATH)
+        logo = obter_logo(config["logo_width"])
         # Logo centralizada e responsiva
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
             st.image(logo, width="stretch")
     except:
         st.markdown("""
-        <style>
-            .logo {
-                font-size: 14px;
-                font-weight: bold;
-                color: #2c3e50;
-                text-align: center;
-                margin: 10px 0;
-                padding: 10px;
-            }
-            @media (max-width: 768px) {
-                .logo {
-                    font-size: 12px;
-                }
-            }
-        </style>
         <div class="logo">🕊 MINISTÉRIO DECHONAI</div>
         """, unsafe_allow_html=True)
 
 
-def formatar_valor(valor: float) -> str:
-    """Formata um valor numérico para moeda brasileira"""
-    return f"R$ {valor:.2f}"
+def formatar_valor(centavos: int) -> str:
+    """Formata um valor em centavos para moeda brasileira (aritmética inteira)"""
+    sinal = "-" if centavos < 0 else ""
+    reais, resto = divmod(abs(int(centavos)), 100)
+    return f"R$ {sinal}{reais}.{resto:02d}"
+
+
+def reais_para_centavos(valor) -> int:
+    """
+    Converte um valor em reais (float, str ou Decimal) para centavos inteiros
+    
+    Usa Decimal com arredondamento comercial (meio para cima) para que
+    valores como 10.005 não sejam afetados pela representação binária.
+    """
+    centavos = Decimal(str(valor)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP) * 100
+    return int(centavos)
+
+
+def centavos_para_reais(centavos: int) -> float:
+    """Converte centavos para reais - apenas para widgets e gráficos"""
+    return centavos / 100
 
 
 def formatar_data(data_str: str, formato_entrada: str = "%Y-%m-%d", 
@@ -65,61 +138,78 @@ def validar_valor(valor: float) -> bool:
     return valor > 0
 
 
-def calcular_totais(lancamentos: List[Tuple]) -> dict:
+def validar_telefone(telefone: str) -> tuple[bool, str]:
     """
-    Calcula os totais financeiros dos lançamentos
+    Valida formato de telefone brasileiro
     
     Args:
-        lancamentos: Lista de tuplas com os dados dos lançamentos
+        telefone: Número de telefone
     
     Returns:
-        Dicionário com os totais calculados
+        (valido: bool, mensagem: str)
     
-    Nota: A função ajusta dinamicamente os índices baseado no número de campos
+    Formatos aceitos:
+    - (11) 99999-9999
+    - 11999999999
+    - 11 999999999
     """
-    hoje = datetime.today().strftime("%Y-%m-%d")
-    mes_atual_str = datetime.today().strftime("%Y-%m")
+    if not telefone:
+        return False, "Telefone é obrigatório."
     
-    # Descobrir se temos a coluna usuario (admin) ou não
-    # Se o primeiro lançamento tem mais de 10 campos, inclui usuario
-    tem_usuario = len(lancamentos[0]) > 10 if lancamentos else False
+    # Remove caracteres não numéricos
+    numeros = ''.join(filter(str.isdigit, telefone))
     
-    # Índices dos campos principais (sempre presentes)
-    idx_data = 1
-    idx_valor = 3
-    idx_categoria = 5
+    # Valida quantidade de dígitos (DDD + 9 dígitos)
+    if len(numeros) != 11:
+        return False, "Telefone deve conter 11 dígitos (DDD + 9 dígitos)."
     
-    total_geral = sum(l[idx_valor] for l in lancamentos)
+    # Valida se começa com dígito 9 (celular)
+    if numeros[2] != '9':
+        return False, "Número deve ser de celular (iniciar com 9)."
     
-    lancamentos_hoje = [l for l in lancamentos if l[idx_data] == hoje]
-    lancamentos_mes_atual = [l for l in lancamentos if l[idx_data].startswith(mes_atual_str)]
+    return True, "Telefone válido."
+
+
+def formatar_telefone(telefone: str) -> str:
+    """
+    Formata telefone para padrão visual
+    
+    Args:
+        telefone: Telefone com apenas números
+    
+    Returns:
+        String formatada: (11) 99999-9999
+    """
+    numeros = ''.join(filter(str.isdigit, telefone))
+    if len(numeros) == 11:
+        return f"({numeros[:2]}) {numeros[2:7]}-{numeros[7:]}"
+    return telefone
+
+
+def calcular_totais(lancamentos: List[Tuple]) -> dict:
+    """
+    Calcula os totais financeiros dos lançamentos
     
-    total_dia = sum(l[idx_valor] for l in lancamentos_hoje)
-    total_mes = sum(l[idx_valor] for l in lancamentos_mes_atual)
+    Adaptador da versão vetorizada (totais.calcular_totais_dataframe): as
+    tuplas viram colunas e os totais são calculados de uma vez.
     
-    total_dizimo_geral = sum(l[idx_valor] for l in lancamentos if l[idx_categoria] == "Dízimo")
-    total_oferta_geral = sum(l[idx_valor] for l in lancamentos if l[idx_categoria] == "Oferta")
-    total_visitante_geral = sum(l[idx_valor] for l in lancamentos if l[idx_categoria] == "Visitante")
+    Args:
+        lancamentos: Lista de tuplas com os dados dos lançamentos
+            (data no índice 1, valor em centavos no índice 3, categoria no índice 5)
     
-    total_dizimo_mes = sum(l[idx_valor] for l in lancamentos_mes_atual if l[idx_categoria] == "Dízimo")
-    total_oferta_mes = sum(l[idx_valor] for l in lancamentos_mes_atual if l[idx_categoria] == "Oferta")
-    total_visitante_mes = sum(l[idx_valor] for l in lancamentos_mes_atual if l[idx_categoria] == "Visitante")
+    Returns:
+        Dicionário com os totais calculados (somas inteiras, em centavos)
+    """
+    from totais import calcular_totais_dataframe, lancamentos_para_dataframe
     
-    return {
-        "total_geral": total_geral,
-        "total_dia": total_dia,
-        "total_mes": total_mes,
-        "total_dizimo_geral": total_dizimo_geral,
-        "total_oferta_geral": total_oferta_geral,
-        "total_visitante_geral": total_visitante_geral,
-        "total_dizimo_mes": total_dizimo_mes,
-        "total_oferta_mes": total_oferta_mes,
-        "total_visitante_mes": total_visitante_mes
-    }
+    return calcular_totais_dataframe(lancamentos_para_dataframe(lancamentos))
 
 
 def exibir_usuario_info():
     """Exibe informações do usuário logado no topo da página - responsivo"""
+    import streamlit as st
+    from mobile_config import detectar_mobile
+
     config = detectar_mobile()
     
     # Layout responsivo que empilha em mobile
@@ -130,34 +220,6 @@ def exibir_usuario_info():
     
     with col_user_info:
         # Informações compactas do usuário
-        st.markdown("""
-        <style>
-        .user-box {
-            background-color: #f0f2f6;
-            padding: 0.75rem;
-            border-radius: 0.5rem;
-            text-align: right;
-        }
-        .user-box p {
-            margin: 0;
-            font-size: 0.85rem;
-            line-height: 1.4;
-        }
-        .user-box strong {
-            color: #1f77b4;
-        }
-        @media (max-width: 768px) {
-            .user-box {
-                text-align: center;
-                margin-top: 0.5rem;
-            }
-            .user-box p {
-                font-size: 0.8rem;
-            }
-        }
-        </style>
-        """, unsafe_allow_html=True)
-        
         st.markdown(f"""
         <div class="user-box">
             <p><strong>{st.session_state['nome']}</strong></p>
@@ -165,6 +227,9 @@ def exibir_usuario_info():
         </div>
         """, unsafe_allow_html=True)
         
-        if st.button("🚪 Sair", width="stretch"):
+        if st.button("🚪 Sair", width="stretch", help="Encerra a sessão neste aparelho"):
+            from auth import encerrar_sessao
+            encerrar_sessao(st.session_state.get("token_sessao"))  # Uma cópia do cookie deixa de valer
             st.session_state.clear()
+            st.session_state["apagar_cookie_sessao"] = True  # A tela de login apaga o cookie
             st.rerun()
@@ -1,18 +1,153 @@
 """
 Módulo de Integração com WhatsApp
 Responsável pelo envio de mensagens via WhatsApp para os contribuintes
+
+A biblioteca twilio (e requests) só é importada quando o serviço está
+habilitado e é usado de fato - não pesa na abertura da tela de login.
 """
+import math
 import os
+import random
+import threading
+import time
 from typing import Optional
-from twilio.rest import Client
+from utils import formatar_valor
 from config import (
     TWILIO_ACCOUNT_SID, 
     TWILIO_AUTH_TOKEN, 
     TWILIO_WHATSAPP_NUMBER,
-    WHATSAPP_ENABLED
+    TWILIO_API_URL,
+    WHATSAPP_ENABLED,
+    WHATSAPP_TAXA_MENSAGENS,
+    WHATSAPP_RAJADA,
+    WHATSAPP_TIMEOUT_SEGUNDOS,
+    WHATSAPP_TENTATIVAS,
+    WHATSAPP_ESPERA_BASE_SEGUNDOS,
+    WHATSAPP_ESPERA_MAXIMA_SEGUNDOS,
+    WHATSAPP_DISJUNTOR_FALHAS,
+    WHATSAPP_DISJUNTOR_PAUSA_SEGUNDOS
 )
 
 
+class LimitadorTaxa:
+    """
+    Limitador de taxa do tipo "balde de fichas" (token bucket)
+    
+    O balde recebe `taxa` fichas por segundo, até `capacidade`. Cada envio
+    consome uma ficha; sem fichas, aguardar() bloqueia até a próxima chegar.
+    Seguro para uso por várias threads.
+    """
+    
+    def __init__(self, taxa: float, capacidade: int = 1):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self._fichas = float(capacidade)
+        self._ultima_reposicao = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _repor(self, agora: float):
+        decorrido = agora - self._ultima_reposicao
+        self._fichas = min(self.capacidade, self._fichas + decorrido * self.taxa)
+        self._ultima_reposicao = agora
+    
+    def aguardar(self) -> float:
+        """
+        Consome uma ficha, esperando se necessário
+        
+        Returns:
+            Segundos aguardados
+        """
+        espera_total = 0.0
+        while True:
+            with self._lock:
+                self._repor(time.monotonic())
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return espera_total
+                espera = (1 - self._fichas) / self.taxa
+            time.sleep(espera)
+            espera_total += espera
+
+
+class DisjuntorCircuito:
+    """
+    Disjuntor (circuit breaker) para a API do Twilio
+    
+    Estados:
+    - fechado: envios normais
+    - aberto: após `limite_falhas` falhas temporárias seguidas, os envios são
+      recusados sem chamar a API durante `pausa` segundos
+    - meio-aberto: passada a pausa, uma única chamada de teste é liberada;
+      sucesso fecha o disjuntor, falha o abre novamente
+    """
+    
+    def __init__(self, limite_falhas: int, pausa: float):
+        self.limite_falhas = limite_falhas
+        self.pausa = pausa
+        self._falhas_seguidas = 0
+        self._aberto_ate: Optional[float] = None
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+    
+    @property
+    def estado(self) -> str:
+        """Estado atual: fechado, aberto ou meio-aberto"""
+        with self._lock:
+            if self._aberto_ate is None:
+                return "fechado"
+            return "aberto" if time.monotonic() < self._aberto_ate else "meio-aberto"
+    
+    def segundos_para_liberar(self) -> float:
+        """Tempo restante de suspensão (0 se os envios estão liberados)"""
+        with self._lock:
+            if self._aberto_ate is None:
+                return 0.0
+            return max(0.0, self._aberto_ate - time.monotonic())
+    
+    def permitir(self) -> bool:
+        """Indica se uma chamada à API pode ser feita agora"""
+        with self._lock:
+            if self._aberto_ate is None:
+                return True
+            if time.monotonic() < self._aberto_ate or self._teste_em_andamento:
+                return False
+            self._teste_em_andamento = True
+            return True
+    
+    def registrar_sucesso(self):
+        with self._lock:
+            self._falhas_seguidas = 0
+            self._aberto_ate = None
+            self._teste_em_andamento = False
+    
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas_seguidas += 1
+            if self._teste_em_andamento or self._falhas_seguidas >= self.limite_falhas:
+                self._aberto_ate = time.monotonic() + self.pausa
+            self._teste_em_andamento = False
+
+
+class EnvioSuspensoError(Exception):
+    """Envio recusado porque o disjuntor está aberto"""
+
+
+def erro_temporario(erro: Exception) -> bool:
+    """
+    Indica se vale a pena tentar o envio novamente
+    
+    Temporários: 429 (limite de taxa), 5xx e falhas de rede/timeout.
+    Erros 4xx restantes (número inválido, credenciais) são definitivos.
+    """
+    # Só chega aqui após uma chamada ao Twilio: as bibliotecas já estão carregadas
+    import requests
+    from twilio.base.exceptions import TwilioRestException
+    
+    if isinstance(erro, TwilioRestException):
+        return erro.status == 429 or erro.status >= 500
+    return isinstance(erro, (requests.ConnectionError, requests.Timeout))
+
+
 class WhatsAppService:
     """
     Serviço para envio de mensagens via WhatsApp usando Twilio API
@@ -31,7 +166,7 @@ class WhatsAppService:
     5. Retorna status de sucesso ou erro
     """
     
-    def __init__(self):
+    def __init__(self, habilitado: Optional[bool] = None, url_api: Optional[str] = TWILIO_API_URL):
         """
         Inicializa o serviço WhatsApp com as credenciais Twilio
         
@@ -39,17 +174,82 @@ class WhatsAppService:
         - TWILIO_ACCOUNT_SID: ID da conta Twilio
         - TWILIO_AUTH_TOKEN: Token de autenticação
         - TWILIO_WHATSAPP_NUMBER: Número WhatsApp formato: whatsapp:+14155238886
+        
+        Args:
+            habilitado: Sobrescreve WHATSAPP_ENABLED (opcional)
+            url_api: Endereço alternativo da API (opcional, ex.: servidor de testes)
         """
-        self.enabled = WHATSAPP_ENABLED
+        self.enabled = WHATSAPP_ENABLED if habilitado is None else habilitado
+        
+        # Compartilhados por todas as threads que usam esta instância
+        self.limitador = LimitadorTaxa(WHATSAPP_TAXA_MENSAGENS, WHATSAPP_RAJADA)
+        self.disjuntor = DisjuntorCircuito(WHATSAPP_DISJUNTOR_FALHAS, WHATSAPP_DISJUNTOR_PAUSA_SEGUNDOS)
         
         if self.enabled:
             try:
-                self.client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+                from twilio.http.http_client import TwilioHttpClient
+                from twilio.rest import Client
+                
+                self.client = Client(
+                    TWILIO_ACCOUNT_SID,
+                    TWILIO_AUTH_TOKEN,
+                    http_client=TwilioHttpClient(timeout=WHATSAPP_TIMEOUT_SEGUNDOS)
+                )
+                if url_api:
+                    self.client.api.base_url = url_api.rstrip("/")
                 self.from_number = TWILIO_WHATSAPP_NUMBER
             except Exception as e:
                 print(f"Erro ao inicializar WhatsApp Service: {e}")
                 self.enabled = False
     
+    def _enviar(self, numero_formatado: str, mensagem: str):
+        """
+        Envia uma mensagem respeitando o limite de taxa, com novas tentativas
+        
+        Erros temporários são repetidos até WHATSAPP_TENTATIVAS vezes, com
+        espera exponencial e variação aleatória ("full jitter") para que várias
+        threads não voltem à API ao mesmo tempo. Cada erro temporário conta
+        para o disjuntor; com ele aberto, nenhuma chamada é feita.
+        
+        Returns:
+            Mensagem criada pelo Twilio
+        
+        Raises:
+            EnvioSuspensoError: Disjuntor aberto
+            Exception: Último erro recebido da API
+        """
+        for tentativa in range(WHATSAPP_TENTATIVAS):
+            if not self.disjuntor.permitir():
+                raise EnvioSuspensoError(
+                    "Envios suspensos após falhas seguidas da API Twilio. "
+                    f"Nova tentativa em {math.ceil(self.disjuntor.segundos_para_liberar())}s."
+                )
+            
+            self.limitador.aguardar()
+            
+            try:
+                message = self.client.messages.create(
+                    from_=self.from_number,
+                    body=mensagem,
+                    to=numero_formatado
+                )
+            except Exception as e:
+                if not erro_temporario(e):
+                    # Erro definitivo: a API respondeu, então não é falha do serviço
+                    self.disjuntor.registrar_sucesso()
+                    raise
+                
+                self.disjuntor.registrar_falha()
+                if tentativa == WHATSAPP_TENTATIVAS - 1:
+                    raise
+                
+                limite = min(WHATSAPP_ESPERA_MAXIMA_SEGUNDOS, WHATSAPP_ESPERA_BASE_SEGUNDOS * (2 ** tentativa))
+                time.sleep(random.uniform(0, limite))
+                continue
+            
+            self.disjuntor.registrar_sucesso()
+            return message
+    
     def formatar_numero_whatsapp(self, telefone: str) -> str:
         """
         Formata o número de telefone para o padrão WhatsApp internacional
@@ -74,8 +274,37 @@ class WhatsAppService:
         # Retorna no formato WhatsApp
         return f"whatsapp:+{numeros}"
     
+    def enviar_confirmacao(self, telefone: str, nome: str, valor_centavos: int,
+                           categoria: str, data: str) -> str:
+        """
+        Envia a confirmação de contribuição, mantendo o tipo do erro
+        
+        Para quem decide o que fazer com cada falha (outbox): use
+        erro_temporario para separar erros temporários de definitivos.
+        
+        Returns:
+            Mensagem de retorno com o SID do Twilio
+        
+        Raises:
+            EnvioSuspensoError: Disjuntor aberto (nenhuma chamada feita)
+            Exception: Serviço desabilitado ou último erro recebido da API
+        """
+        if not self.enabled:
+            raise RuntimeError("Serviço WhatsApp não habilitado. Configure as credenciais Twilio.")
+        
+        # Formata número para padrão WhatsApp
+        numero_formatado = self.formatar_numero_whatsapp(telefone)
+        
+        # Monta mensagem personalizada
+        mensagem = self._montar_mensagem_contribuicao(nome, valor_centavos, categoria, data)
+        
+        # Envia mensagem via Twilio (limite de taxa, novas tentativas e disjuntor)
+        message = self._enviar(numero_formatado, mensagem)
+        
+        return f"Mensagem enviada com sucesso! SID: {message.sid}"
+    
     def enviar_confirmacao_contribuicao(self, telefone: str, nome: str, 
-                                       valor: float, categoria: str, 
+                                       valor_centavos: int, categoria: str, 
                                        data: str) -> tuple[bool, str]:
         """
         Envia mensagem de confirmação de contribuição via WhatsApp
@@ -83,7 +312,7 @@ class WhatsAppService:
         Args:
             telefone: Número de telefone do contribuinte
             nome: Nome do contribuinte
-            valor: Valor da contribuição
+            valor_centavos: Valor da contribuição em centavos
             categoria: Categoria (Dízimo, Oferta, Visitante)
             data: Data da contribuição
         
@@ -94,41 +323,27 @@ class WhatsAppService:
         1. Verifica se o serviço está habilitado
         2. Formata o número para padrão internacional
         3. Cria mensagem personalizada
-        4. Envia via Twilio API
+        4. Envia via Twilio API (ver _enviar: taxa, novas tentativas, disjuntor)
         5. Retorna resultado
         """
         if not self.enabled:
             return False, "Serviço WhatsApp não habilitado. Configure as credenciais Twilio."
         
         try:
-            # Formata número para padrão WhatsApp
-            numero_formatado = self.formatar_numero_whatsapp(telefone)
-            
-            # Monta mensagem personalizada
-            mensagem = self._montar_mensagem_contribuicao(nome, valor, categoria, data)
-            
-            # Envia mensagem via Twilio
-            message = self.client.messages.create(
-                from_=self.from_number,
-                body=mensagem,
-                to=numero_formatado
-            )
-            
-            return True, f"Mensagem enviada com sucesso! SID: {message.sid}"
-            
+            return True, self.enviar_confirmacao(telefone, nome, valor_centavos, categoria, data)
         except Exception as e:
             erro = f"Erro ao enviar mensagem WhatsApp: {str(e)}"
             print(erro)
             return False, erro
     
-    def _montar_mensagem_contribuicao(self, nome: str, valor: float, 
+    def _montar_mensagem_contribuicao(self, nome: str, valor_centavos: int, 
                                      categoria: str, data: str) -> str:
         """
         Monta mensagem personalizada de confirmação
         
         Args:
             nome: Nome do contribuinte
-            valor: Valor da contribuição
+            valor_centavos: Valor da contribuição em centavos
             categoria: Categoria da contribuição
             data: Data da contribuição
         
@@ -144,7 +359,7 @@ Olá {nome}!
 
 📋 *Detalhes:*
 • Categoria: {categoria}
-• Valor: R$ {valor:.2f}
+• Valor: {formatar_valor(valor_centavos)}
 • Data: {data}
 
 Que Deus abençoe abundantemente sua vida!
@@ -170,11 +385,7 @@ _Esta é uma mensagem automática de confirmação._
         try:
             numero_formatado = self.formatar_numero_whatsapp(telefone)
             
-            message = self.client.messages.create(
-                from_=self.from_number,
-                body=mensagem,
-                to=numero_formatado
-            )
+            message = self._enviar(numero_formatado, mensagem)
             
             return True, f"Mensagem enviada! SID: {message.sid}"
             
@@ -182,11 +393,30 @@ _Esta é uma mensagem automática de confirmação._
             return False, f"Erro ao enviar: {str(e)}"
 
 
-# Instância global do serviço
-whatsapp_service = WhatsAppService()
+# Instância global do serviço - criada no primeiro uso (ver obter_whatsapp_service)
+_whatsapp_service: Optional[WhatsAppService] = None
+_lock_whatsapp_service = threading.Lock()
+
+
+def obter_whatsapp_service() -> WhatsAppService:
+    """Retorna a instância global do serviço, criando-a na primeira chamada"""
+    global _whatsapp_service
+    
+    if _whatsapp_service is None:
+        with _lock_whatsapp_service:
+            if _whatsapp_service is None:
+                _whatsapp_service = WhatsAppService()
+    return _whatsapp_service
+
+
+def __getattr__(nome: str):
+    """Compatibilidade: `from whatsapp_service import whatsapp_service` cria a instância sob demanda"""
+    if nome == "whatsapp_service":
+        return obter_whatsapp_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
 
 
-def enviar_whatsapp_contribuicao(telefone: str, nome: str, valor: float, 
+def enviar_whatsapp_contribuicao(telefone: str, nome: str, valor_centavos: int, 
                                 categoria: str, data: str) -> tuple[bool, str]:
     """
     Função auxiliar para enviar confirmação de contribuição
@@ -194,13 +424,13 @@ def enviar_whatsapp_contribuicao(telefone: str, nome: str, valor: float,
     Args:
         telefone: Número de telefone
         nome: Nome do contribuinte
-        valor: Valor da contribuição
+        valor_centavos: Valor da contribuição em centavos
         categoria: Categoria
         data: Data da contribuição
     
     Returns:
         (sucesso, mensagem)
     """
-    return whatsapp_service.enviar_confirmacao_contribuicao(
-        telefone, nome, valor, categoria, data
+    return obter_whatsapp_service().enviar_confirmacao_contribuicao(
+        telefone, nome, valor_centavos, categoria, data
     )